@@ -0,0 +1,135 @@
+"""
+Benchmarks for the idempotency key middleware.
+
+Each module can be run from the root of the repository, i.e:
+
+    python -m benchmarks.serializers
+
+The benchmarks use the test project's settings unless DJANGO_SETTINGS_MODULE is set.
+"""
+
+import atexit
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import time
+
+
+def setup_django():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "tests.settings")
+
+    import django
+
+    django.setup()
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_port(port, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+# Serves fakeredis on the port given as the first argument. Nagle's algorithm is
+# disabled because fakeredis writes each reply of a pipeline separately and the delayed
+# acknowledgement of the first reply would add 40ms to every pipeline.
+FAKEREDIS_SERVER = """
+import sys
+from fakeredis import TcpFakeServer
+server = TcpFakeServer(("127.0.0.1", int(sys.argv[1])), server_type="redis")
+server.RequestHandlerClass.disable_nagle_algorithm = True
+server.serve_forever()
+"""
+
+
+def start_redis():
+    """
+    Start a local Redis server for the benchmarks so that no external service is
+    needed. A redis-server binary on the PATH is used if there is one, otherwise a
+    fakeredis server is run in another process. The server is stopped when the
+    benchmark exits.
+    :return: the Redis URL of the server
+    """
+    port = str(_free_port())
+    binary = shutil.which("redis-server")
+    if binary is not None:
+        command = [binary, "--port", port, "--save", "", "--appendonly", "no"]
+    else:
+        try:
+            import fakeredis  # noqa: F401
+        except ImportError:
+            raise RuntimeError(
+                "Install redis-server or fakeredis to run the Redis benchmarks."
+            )
+        command = [sys.executable, "-c", FAKEREDIS_SERVER, port]
+
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    atexit.register(process.terminate)
+    _wait_for_port(int(port))
+    location = "redis://127.0.0.1:{}/0".format(port)
+    if binary is None:
+        _load_scripts(location)
+    return location
+
+
+def _load_scripts(location):
+    # fakeredis closes the connection after an error reply, including the one returned
+    # when a script is first run by its hash, so the Lua scripts are loaded up front.
+    from redis import Redis
+    from redis.lock import Lock
+
+    from idempotency_key.storage import _RESERVE_SCRIPT
+
+    client = Redis.from_url(location)
+    for script in (
+        Lock.LUA_RELEASE_SCRIPT,
+        Lock.LUA_EXTEND_SCRIPT,
+        Lock.LUA_REACQUIRE_SCRIPT,
+        _RESERVE_SCRIPT,
+    ):
+        client.script_load(script)
+    client.close()
+
+
+def print_results(results, as_json=False):
+    """
+    Print a list of result dictionaries either as a table or as JSON so that the
+    output can be compared between runs.
+    """
+    if as_json:
+        print(json.dumps(results, indent=2))
+        return
+
+    if not results:
+        return
+
+    columns = list(results[0].keys())
+    rows = [[_format(result[column]) for column in columns] for result in results]
+    widths = [
+        max(len(column), *(len(row[i]) for row in rows))
+        for i, column in enumerate(columns)
+    ]
+    print("  ".join(column.ljust(width) for column, width in zip(columns, widths)))
+    print("  ".join("-" * width for width in widths))
+    for row in rows:
+        print("  ".join(value.ljust(width) for value, width in zip(row, widths)))
+
+
+def _format(value):
+    if isinstance(value, float):
+        return "{:.2f}".format(value)
+    return str(value)
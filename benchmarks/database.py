@@ -0,0 +1,109 @@
+"""
+Measure the insert and lookup throughput of DatabaseKeyStorage.
+
+    python -m benchmarks.database [--number 2000] [--postgres] [--json]
+
+SQLite is always benchmarked using a temporary database file. With --postgres the
+benchmark is also run against the PostgreSQL database given by the standard PGHOST,
+PGPORT, PGUSER, PGPASSWORD and PGDATABASE environment variables (psycopg must be
+installed). The idempotency_key table is created in each database if needed.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import uuid
+
+from benchmarks import print_results, setup_django
+
+
+def get_databases(postgres):
+    databases = {
+        "sqlite": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.path.join(tempfile.mkdtemp(), "benchmark.sqlite3"),
+        }
+    }
+    if postgres:
+        databases["postgres"] = {
+            "ENGINE": "django.db.backends.postgresql",
+            "HOST": os.environ.get("PGHOST", "localhost"),
+            "PORT": os.environ.get("PGPORT", "5432"),
+            "USER": os.environ.get("PGUSER", "postgres"),
+            "PASSWORD": os.environ.get("PGPASSWORD", ""),
+            "NAME": os.environ.get("PGDATABASE", "idempotency-key"),
+        }
+    return databases
+
+
+def make_response():
+    from django.http import HttpResponse
+
+    return HttpResponse(b'{"id": 1, "name": "voucher"}', status=201)
+
+
+def time_operation(func, keys):
+    start = time.perf_counter()
+    for key in keys:
+        func("default", key)
+    return time.perf_counter() - start
+
+
+def run(databases, number):
+    from django.core.management import call_command
+    from django.test import override_settings
+
+    from idempotency_key.storage import DatabaseKeyStorage
+
+    response = make_response()
+    results = []
+    for alias in databases:
+        call_command("migrate", "idempotency_key", database=alias, verbosity=0)
+        with override_settings(IDEMPOTENCY_KEY={"STORAGE": {"DATABASE": alias}}):
+            storage = DatabaseKeyStorage()
+
+        stored_keys = [uuid.uuid4().hex for _ in range(number)]
+        reserved_keys = [uuid.uuid4().hex for _ in range(number)]
+        missing_keys = [uuid.uuid4().hex for _ in range(number)]
+        operations = [
+            ("store", lambda c, k: storage.store_data(c, k, response), stored_keys),
+            ("reserve", storage.reserve_data, reserved_keys),
+            ("retrieve hit", storage.retrieve_data, stored_keys),
+            ("retrieve miss", storage.retrieve_data, missing_keys),
+            ("reserve existing", storage.reserve_data, stored_keys),
+            ("delete", storage.delete_data, stored_keys + reserved_keys),
+        ]
+        for name, func, keys in operations:
+            elapsed = time_operation(func, keys)
+            results.append(
+                {
+                    "database": alias,
+                    "operation": name,
+                    "ops_per_sec": len(keys) / elapsed,
+                    "us_per_op": elapsed / len(keys) * 1e6,
+                }
+            )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=2000)
+    parser.add_argument("--postgres", action="store_true", help="include PostgreSQL")
+    parser.add_argument("--json", action="store_true", help="output results as JSON")
+    args = parser.parse_args()
+
+    # The benchmark databases are added to the settings before django is set up so
+    # that their connections are configured along with the others.
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "tests.settings")
+    from django.conf import settings
+
+    databases = get_databases(args.postgres)
+    settings.DATABASES.update(databases)
+    setup_django()
+    print_results(run(databases, args.number), as_json=args.json)
+
+
+if __name__ == "__main__":
+    main()
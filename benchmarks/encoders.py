@@ -0,0 +1,98 @@
+"""
+Compare the speed of the key encoders and hash algorithms on request bodies of
+different sizes.
+
+    python -m benchmarks.encoders [--sizes 0 1024 65536 1048576] [--number 2000] [--json]
+"""
+
+import argparse
+import time
+
+from benchmarks import print_results, setup_django
+
+# (name, ENCODER settings) pairs for each hash algorithm and output format.
+HASH_SETTINGS = [
+    ("sha256", {}),
+    ("sha256/base64", {"OUTPUT": "base64"}),
+    ("blake2b-16", {"HASH_ALGORITHM": "blake2b", "DIGEST_SIZE": 16}),
+    ("md5", {"HASH_ALGORITHM": "md5"}),
+]
+
+
+def get_hash_settings():
+    found = list(HASH_SETTINGS)
+    try:
+        import xxhash  # noqa: F401
+    except ImportError:
+        pass
+    else:
+        found.append(("xxh3_128", {"HASH_ALGORITHM": "xxhash.xxh3_128"}))
+    return found
+
+
+def get_encoders():
+    from idempotency_key import encoders
+
+    return {
+        "basic": encoders.BasicKeyEncoder,
+        "streaming": encoders.StreamingKeyEncoder,
+    }
+
+
+def make_request(body):
+    from django.test.client import RequestFactory
+
+    return RequestFactory().post("/views/create/", body, "application/octet-stream")
+
+
+def time_encoder(encoder, body, number):
+    elapsed = 0.0
+    for _ in range(number):
+        # A request body can only be read from the stream once so a new request is
+        # made each time and only the time taken to encode the key is measured.
+        request = make_request(body)
+        start = time.perf_counter()
+        encoder.encode_key(request, "7495e32b-709b-4fae-bfd4-2497094bf3fd")
+        elapsed += time.perf_counter() - start
+    return elapsed
+
+
+def run(sizes, number):
+    from django.test import override_settings
+
+    results = []
+    for size in sizes:
+        body = b"x" * size
+        for hash_name, encoder_settings in get_hash_settings():
+            with override_settings(IDEMPOTENCY_KEY={"ENCODER": encoder_settings}):
+                for encoder_name, encoder_class in get_encoders().items():
+                    encoder = encoder_class()
+                    key = encoder.encode_key(make_request(body), "key")
+                    elapsed = time_encoder(encoder, body, number)
+                    results.append(
+                        {
+                            "encoder": encoder_name,
+                            "hash": hash_name,
+                            "body_bytes": size,
+                            "key_length": len(key),
+                            "encode_us": elapsed / number * 1e6,
+                        }
+                    )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[0, 1024, 64 * 1024, 1024 * 1024]
+    )
+    parser.add_argument("--number", type=int, default=2000)
+    parser.add_argument("--json", action="store_true", help="output results as JSON")
+    args = parser.parse_args()
+
+    setup_django()
+    print_results(run(args.sizes, args.number), as_json=args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""
+Load test the lock classes with several processes posting the same idempotency keys at
+the same time.
+
+    python -m benchmarks.load [--processes 4] [--threads 4] [--number 200]
+        [--duplicates 0.5] [--hot-keys 20] [--view-ms 5] [--locks thread redis]
+        [--lock-modes global] [--lock-timeout 0.1] [--reservation] [--redis LOCATION]
+        [--json]
+
+Each process runs the middleware of the test project behind a WSGI handler and each of
+its threads posts --number requests. A --duplicates fraction of the requests use one of
+--hot-keys shared keys so that duplicate requests arrive at the same time in different
+threads and processes, the others use a new key. The view sleeps for --view-ms and
+counts its executions in Redis.
+
+Responses are stored with RedisKeyStorage so that every process shares them. With
+ThreadLock each process has its own lock, MultiProcessRedisLock is shared by every
+process. Either lock is only held while the stored response is looked up so a duplicate
+request that arrives while the view is running runs it again. With --reservation the
+in-flight marker prevents this and the lock is not used because RedisKeyStorage
+reserves keys atomically.
+
+A local Redis server is started unless --redis is given (see benchmarks.start_redis).
+
+The results show the rate of HTTP_423_LOCKED responses, the number of times the view
+was run more than once for a key, the time taken to acquire the lock (recorded with
+the middleware's metrics), request latencies in milliseconds and the throughput.
+"""
+
+import argparse
+import multiprocessing
+import random
+import threading
+import time
+import uuid
+
+from django.http import HttpResponse
+from django.urls import path
+
+from benchmarks import print_results, setup_django, start_redis
+from idempotency_key import connections, metrics
+from idempotency_key.decorators import idempotency_key
+from idempotency_key.metrics import InMemoryMetrics
+
+LOCK_CLASSES = {
+    "thread": "idempotency_key.locks.basic.ThreadLock",
+    "redis": "idempotency_key.locks.redis.MultiProcessRedisLock",
+}
+
+
+@idempotency_key
+def load_view(request):
+    from django.conf import settings
+
+    conf = settings.LOAD_TEST
+    redis = connections.get_redis(conf["LOCATION"])
+    redis.hincrby(conf["RUN_ID"], request.META["HTTP_IDEMPOTENCY_KEY"], 1)
+    time.sleep(conf["VIEW_SECONDS"])
+    return HttpResponse(b'{"id": 1}', status=201, content_type="application/json")
+
+
+# The URLconf used by the worker processes.
+urlpatterns = [path("load/", load_view)]
+
+
+class LoadMetrics(InMemoryMetrics):
+    """
+    Keeps a reference to each instance so that a worker process can read the metrics
+    of the middleware created by its WSGI handler.
+    """
+
+    instances = []
+
+    def __init__(self):
+        super().__init__()
+        self.instances.append(self)
+
+
+def make_schedules(args, run_id):
+    """
+    Returns the keys posted by each thread of each process.
+    """
+    rng = random.Random(args.seed)
+    hot_keys = ["{}-hot-{}".format(run_id, i) for i in range(args.hot_keys)]
+
+    def make_key():
+        if rng.random() < args.duplicates:
+            return rng.choice(hot_keys)
+        return "{}-{:032x}".format(run_id, rng.getrandbits(128))
+
+    return [
+        [[make_key() for _ in range(args.number)] for _ in range(args.threads)]
+        for _ in range(args.processes)
+    ]
+
+
+def get_settings(args, lock, lock_mode, redis_location, run_id):
+    conf = {
+        "STORAGE": {
+            "CLASS": "idempotency_key.storage.RedisKeyStorage",
+            "LOCATION": redis_location,
+        },
+        "LOCK": {
+            "CLASS": LOCK_CLASSES[lock],
+            "LOCATION": redis_location,
+            "MODE": lock_mode,
+            "TIMEOUT": args.lock_timeout,
+        },
+        "RESERVATION": {"ENABLE": args.reservation},
+        "METRICS_CLASS": "benchmarks.load.LoadMetrics",
+    }
+    return dict(
+        IDEMPOTENCY_KEY=conf,
+        ROOT_URLCONF="benchmarks.load",
+        MIDDLEWARE=["idempotency_key.middleware.IdempotencyKeyMiddleware"],
+        ALLOWED_HOSTS=["*"],
+        DEBUG=False,
+        LOAD_TEST={
+            "LOCATION": redis_location,
+            "RUN_ID": run_id,
+            "VIEW_SECONDS": args.view_ms / 1000,
+        },
+    )
+
+
+def run_worker(django_settings, schedule, barrier, results):
+    """
+    Runs in each worker process. Every thread posts its keys once all the processes
+    are ready and the statuses, latencies and lock waits are put on the results queue.
+    """
+    setup_django()
+    from django.test import override_settings
+
+    from benchmarks import load
+    from benchmarks.middleware import WSGIDriver
+
+    override_settings(**django_settings).enable()
+    driver = WSGIDriver("/load/")
+    body = b'{"amount": 1}'
+    timings = []
+
+    def post(keys):
+        for key in keys:
+            start = time.perf_counter()
+            status = driver(body, key)
+            timings.append((time.perf_counter() - start, status))
+
+    threads = [threading.Thread(target=post, args=(keys,)) for keys in schedule]
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    lock_waits = [
+        value
+        for instance in load.LoadMetrics.instances
+        for value in instance.get_values(metrics.LOCK_WAIT_SECONDS)
+    ]
+    results.put((timings, lock_waits, elapsed))
+
+
+def percentile_ms(values, fraction):
+    from benchmarks.middleware import percentile
+
+    if not values:
+        return "-"
+    return percentile(sorted(values), fraction) * 1000
+
+
+def run(args, lock, lock_mode, redis_location):
+    from benchmarks.middleware import format_statuses
+
+    run_id = "load-{}".format(uuid.uuid4().hex)
+    django_settings = get_settings(args, lock, lock_mode, redis_location, run_id)
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(args.processes)
+    results = context.Queue()
+    processes = [
+        context.Process(
+            target=run_worker, args=(django_settings, schedule, barrier, results)
+        )
+        for schedule in make_schedules(args, run_id)
+    ]
+    for process in processes:
+        process.start()
+    # The results are read before joining so that no process blocks on a full queue.
+    outputs = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    timings = [timing for output in outputs for timing in output[0]]
+    lock_waits = [wait for output in outputs for wait in output[1]]
+    elapsed = max(output[2] for output in outputs)
+
+    redis = connections.get_redis(redis_location)
+    executions = [int(count) for count in redis.hvals(run_id)]
+    redis.delete(run_id)
+
+    statuses = [status for _, status in timings]
+    latencies = [latency for latency, _ in timings]
+    return {
+        "lock": lock,
+        "lock_mode": lock_mode,
+        "reservation": args.reservation,
+        "processes": args.processes,
+        "threads": args.threads,
+        "requests": len(timings),
+        "statuses": format_statuses(timings),
+        "rate_423": statuses.count(423) / len(statuses) * 100,
+        "duplicate_executions": sum(count - 1 for count in executions),
+        "lock_wait_p50_ms": percentile_ms(lock_waits, 0.5),
+        "lock_wait_p99_ms": percentile_ms(lock_waits, 0.99),
+        "p50_ms": percentile_ms(latencies, 0.5),
+        "p99_ms": percentile_ms(latencies, 0.99),
+        "req_per_sec": len(timings) / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument(
+        "--number", type=int, default=200, help="requests posted by each thread"
+    )
+    parser.add_argument(
+        "--duplicates",
+        type=float,
+        default=0.5,
+        help="the fraction of requests that use a shared key (default 0.5)",
+    )
+    parser.add_argument("--hot-keys", type=int, default=20)
+    parser.add_argument(
+        "--view-ms", type=float, default=5.0, help="the time taken by the view"
+    )
+    parser.add_argument(
+        "--locks", nargs="+", choices=list(LOCK_CLASSES), default=list(LOCK_CLASSES)
+    )
+    parser.add_argument(
+        "--lock-modes",
+        nargs="+",
+        choices=["global", "cache_name", "key"],
+        default=["global"],
+    )
+    parser.add_argument("--lock-timeout", type=float, default=0.1)
+    parser.add_argument("--reservation", action="store_true")
+    parser.add_argument("--redis", metavar="LOCATION", help="a Redis server to use")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="output results as JSON")
+    args = parser.parse_args()
+
+    setup_django()
+    redis_location = args.redis or start_redis()
+    results = [
+        run(args, lock, lock_mode, redis_location)
+        for lock in args.locks
+        for lock_mode in args.lock_modes
+    ]
+    print_results(results, as_json=args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,420 @@
+"""
+Measure the overhead of the middleware classes on the request path of the test project.
+
+    python -m benchmarks.middleware [--drivers client wsgi asgi] [--storages memory locmem]
+        [--redis [LOCATION]] [--lock-modes global] [--sizes 0 16384]
+        [--concurrency 1 8] [--number 500] [--json] [--baseline FILE]
+
+Requests are posted to /views/create/ through the Django test client, by calling the
+WSGI handler directly and by calling the ASGI handler directly. Each request either
+uses a new idempotency key ("unique") or repeats a key whose response is already
+stored ("replay"). Requests made without the middleware are included as a baseline.
+
+--redis adds RedisKeyStorage and MultiProcessRedisLock using the Redis server at
+LOCATION, or a local server started for the benchmark if no location is given (see
+benchmarks.start_redis).
+
+Latencies are in microseconds. peak_kib is the mean of the peak memory allocated by
+each request, measured with tracemalloc in a separate single threaded run.
+
+Pass --json to save the results and --baseline with a previous JSON output to report
+the change in p50 latency of each scenario. The exit status is 1 if any scenario is
+slower than the baseline by more than --tolerance percent.
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import sys
+import time
+import tracemalloc
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import print_results, setup_django, start_redis
+
+PATH = "/views/create/"
+
+MIDDLEWARE = {
+    "none": [],
+    "key": ["idempotency_key.middleware.IdempotencyKeyMiddleware"],
+    "exempt": ["idempotency_key.middleware.ExemptIdempotencyKeyMiddleware"],
+}
+
+# The cache used by the locmem storage, added to the test project's caches.
+LOCMEM_CACHE = {
+    "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    "LOCATION": "benchmark",
+}
+
+# The fields that identify a scenario when comparing results with a baseline.
+SCENARIO_FIELDS = (
+    "middleware",
+    "driver",
+    "storage",
+    "lock_mode",
+    "keys",
+    "body_bytes",
+    "concurrency",
+)
+
+
+def get_idempotency_key_settings(storage, lock_mode, redis_location):
+    conf = {"LOCK": {"MODE": lock_mode}}
+    if storage == "memory":
+        conf["STORAGE"] = {"CLASS": "idempotency_key.storage.MemoryKeyStorage"}
+    elif storage == "locmem":
+        conf["STORAGE"] = {
+            "CLASS": "idempotency_key.storage.CacheKeyStorage",
+            "CACHE_NAME": "benchmark",
+        }
+    elif storage == "redis":
+        conf["STORAGE"] = {
+            "CLASS": "idempotency_key.storage.RedisKeyStorage",
+            "LOCATION": redis_location,
+        }
+        conf["LOCK"].update(
+            CLASS="idempotency_key.locks.redis.MultiProcessRedisLock",
+            LOCATION=redis_location,
+        )
+    return conf
+
+
+def make_body(size):
+    # A JSON object padded to the requested size
+    padding = max(size - len(b'{"data": ""}'), 0)
+    return b'{"data": "' + b"x" * padding + b'"}'
+
+
+class ClientDriver:
+    """
+    Posts requests with the Django test client. A single client is shared by every
+    thread so that all requests go through the same middleware instance.
+    """
+
+    def __init__(self):
+        from django.test import Client
+
+        self.client = Client()
+
+    def __call__(self, body, key):
+        return self.client.post(
+            PATH, body, content_type="application/json", HTTP_IDEMPOTENCY_KEY=key
+        ).status_code
+
+
+class WSGIDriver:
+    def __init__(self, path=PATH):
+        from django.core.handlers.wsgi import WSGIHandler
+
+        self.handler = WSGIHandler()
+        self.path = path
+
+    def __call__(self, body, key):
+        environ = {
+            "REQUEST_METHOD": "POST",
+            "PATH_INFO": self.path,
+            "QUERY_STRING": "",
+            "SERVER_NAME": "localhost",
+            "SERVER_PORT": "80",
+            "SERVER_PROTOCOL": "HTTP/1.1",
+            "CONTENT_TYPE": "application/json",
+            "CONTENT_LENGTH": str(len(body)),
+            "HTTP_IDEMPOTENCY_KEY": key,
+            "wsgi.url_scheme": "http",
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.errors": sys.stderr,
+        }
+        statuses = []
+        response = self.handler(
+            environ, lambda status, headers: statuses.append(status)
+        )
+        for _ in response:
+            pass
+        response.close()
+        return int(statuses[0].split(" ", 1)[0])
+
+
+class ASGIDriver:
+    """
+    Calls the ASGI handler. Every request is run in the same event loop because the
+    asynchronous Redis clients cannot be used from another loop.
+    """
+
+    def __init__(self):
+        from django.core.handlers.asgi import ASGIHandler
+
+        self.handler = ASGIHandler()
+        self.loop = asyncio.new_event_loop()
+
+    def __call__(self, body, key):
+        return self.loop.run_until_complete(self.request(body, key))
+
+    async def request(self, body, key):
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "POST",
+            "scheme": "http",
+            "path": PATH,
+            "raw_path": PATH.encode(),
+            "query_string": b"",
+            "root_path": "",
+            "headers": [
+                (b"host", b"localhost"),
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"idempotency-key", key.encode()),
+            ],
+            "client": ("127.0.0.1", 50000),
+            "server": ("localhost", 80),
+        }
+        messages = [{"type": "http.request", "body": body, "more_body": False}]
+        disconnected = asyncio.Event()
+        statuses = []
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            # The client stays connected until the response has been sent.
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                statuses.append(message["status"])
+
+        await self.handler(scope, receive, send)
+        disconnected.set()
+        return statuses[0]
+
+
+DRIVERS = {"client": ClientDriver, "wsgi": WSGIDriver, "asgi": ASGIDriver}
+
+
+def make_keys(keys, number, replay_key):
+    if keys == "replay":
+        return [replay_key] * number
+    return [str(uuid.uuid4()) for _ in range(number)]
+
+
+def run_threads(driver, body, keys, concurrency):
+    def worker(chunk):
+        timings = []
+        for key in chunk:
+            start = time.perf_counter()
+            status = driver(body, key)
+            timings.append((time.perf_counter() - start, status))
+        return timings
+
+    chunks = [keys[i::concurrency] for i in range(concurrency)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        timings = [t for result in executor.map(worker, chunks) for t in result]
+    return timings, time.perf_counter() - start
+
+
+def run_tasks(driver, body, keys, concurrency):
+    async def worker(remaining, timings):
+        for key in remaining:
+            start = time.perf_counter()
+            status = await driver.request(body, key)
+            timings.append((time.perf_counter() - start, status))
+
+    async def run():
+        # The tasks share one iterator so each key is posted once.
+        remaining = iter(keys)
+        timings = []
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(remaining, timings) for _ in range(concurrency)))
+        return timings, time.perf_counter() - start
+
+    return driver.loop.run_until_complete(run())
+
+
+def run_driver(driver, body, keys, concurrency):
+    if isinstance(driver, ASGIDriver):
+        return run_tasks(driver, body, keys, concurrency)
+    return run_threads(driver, body, keys, concurrency)
+
+
+def measure_allocations(driver, body, keys):
+    """
+    Returns the mean of the peak memory allocated by each request in KiB.
+    """
+    peaks = []
+    tracemalloc.start()
+    try:
+        for key in keys:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            driver(body, key)
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+    return sum(peaks) / len(peaks) / 1024
+
+
+def percentile(sorted_values, fraction):
+    index = round(fraction * (len(sorted_values) - 1))
+    return sorted_values[index]
+
+
+def format_statuses(timings):
+    counts = {}
+    for _, status in timings:
+        counts[status] = counts.get(status, 0) + 1
+    return " ".join("{}:{}".format(s, counts[s]) for s in sorted(counts))
+
+
+def run_scenario(scenario, redis_location, number, alloc_number):
+    from django.test import override_settings
+
+    body = make_body(scenario["body_bytes"])
+    conf = get_idempotency_key_settings(
+        scenario["storage"], scenario["lock_mode"], redis_location
+    )
+    with override_settings(
+        MIDDLEWARE=MIDDLEWARE[scenario["middleware"]],
+        IDEMPOTENCY_KEY=conf,
+        ALLOWED_HOSTS=["*"],
+        DEBUG=False,
+    ):
+        driver = DRIVERS[scenario["driver"]]()
+        # Warm up the middleware and store the response of the replayed key.
+        replay_key = str(uuid.uuid4())
+        run_driver(driver, body, [replay_key] * 10, 1)
+
+        keys = make_keys(scenario["keys"], number, replay_key)
+        timings, elapsed = run_driver(driver, body, keys, scenario["concurrency"])
+        alloc_keys = make_keys(scenario["keys"], alloc_number, replay_key)
+        peak_kib = measure_allocations(driver, body, alloc_keys)
+
+    latencies = sorted(latency for latency, _ in timings)
+    return dict(
+        scenario,
+        statuses=format_statuses(timings),
+        p50_us=percentile(latencies, 0.5) * 1e6,
+        p99_us=percentile(latencies, 0.99) * 1e6,
+        req_per_sec=len(timings) / elapsed,
+        peak_kib=peak_kib,
+    )
+
+
+def iter_scenarios(args, storages):
+    for driver in args.drivers:
+        for size in args.sizes:
+            for concurrency in args.concurrency:
+                common = dict(driver=driver, body_bytes=size, concurrency=concurrency)
+                yield dict(
+                    middleware="none", storage="-", lock_mode="-", keys="-", **common
+                )
+                for middleware in ("key", "exempt"):
+                    for storage in storages:
+                        for lock_mode in args.lock_modes:
+                            for keys in ("unique", "replay"):
+                                yield dict(
+                                    middleware=middleware,
+                                    storage=storage,
+                                    lock_mode=lock_mode,
+                                    keys=keys,
+                                    **common
+                                )
+
+
+def order_fields(result):
+    # Keep the scenario fields first so that the table is easy to read.
+    ordered = {field: result[field] for field in SCENARIO_FIELDS}
+    ordered.update(result)
+    return ordered
+
+
+def compare_with_baseline(results, baseline_path, tolerance):
+    """
+    Adds the change in p50 latency from the baseline to each result.
+    :return: True if any scenario is slower than the baseline by more than tolerance
+    """
+    with open(baseline_path) as baseline_file:
+        baseline = {
+            tuple(result[field] for field in SCENARIO_FIELDS): result
+            for result in json.load(baseline_file)
+        }
+    regressed = False
+    for result in results:
+        previous = baseline.get(tuple(result[field] for field in SCENARIO_FIELDS))
+        if previous is None:
+            result["p50_change"] = "-"
+            continue
+        change = (result["p50_us"] / previous["p50_us"] - 1) * 100
+        result["p50_change"] = change
+        regressed = regressed or change > tolerance
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--drivers", nargs="+", choices=list(DRIVERS), default=list(DRIVERS)
+    )
+    parser.add_argument(
+        "--storages", nargs="+", choices=["memory", "locmem"], default=["memory"]
+    )
+    parser.add_argument(
+        "--redis",
+        nargs="?",
+        const="local",
+        default=None,
+        metavar="LOCATION",
+        help="include RedisKeyStorage, starting a local server if LOCATION is omitted",
+    )
+    parser.add_argument(
+        "--lock-modes",
+        nargs="+",
+        choices=["global", "cache_name", "key"],
+        default=["global"],
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=[0, 16 * 1024])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--number", type=int, default=500)
+    parser.add_argument("--alloc-number", type=int, default=50)
+    parser.add_argument("--json", action="store_true", help="output results as JSON")
+    parser.add_argument("--baseline", help="a previous JSON output to compare with")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=20.0,
+        help="the allowed p50 slowdown from the baseline in percent (default 20)",
+    )
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+
+    settings.CACHES["benchmark"] = LOCMEM_CACHE
+
+    storages = list(args.storages)
+    redis_location = None
+    if args.redis is not None:
+        redis_location = start_redis() if args.redis == "local" else args.redis
+        storages.append("redis")
+
+    results = [
+        order_fields(
+            run_scenario(scenario, redis_location, args.number, args.alloc_number)
+        )
+        for scenario in iter_scenarios(args, storages)
+    ]
+    regressed = False
+    if args.baseline:
+        regressed = compare_with_baseline(results, args.baseline, args.tolerance)
+    print_results(results, as_json=args.json)
+    if regressed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Compare the size and speed of the storage serializers on DRF responses of different
+sizes, with each of the compression algorithms that is installed.
+
+    python -m benchmarks.serializers [--items 1 10 100 1000] [--number 2000]
+        [--compressions none zlib zstd lz4] [--level LEVEL] [--min-bytes 0] [--json]
+
+saved_pct is the size of the stored data compared with the same serializer without
+compression. dumps_us and loads_us include the time taken to compress and decompress.
+Data that is smaller than --min-bytes or does not compress is stored uncompressed.
+"""
+
+import argparse
+import importlib
+import random
+import timeit
+import uuid
+
+from benchmarks import print_results, setup_django
+
+# The package needed by each compression algorithm.
+COMPRESSION_PACKAGES = {"none": None, "zlib": None, "zstd": "zstandard", "lz4": "lz4"}
+
+
+def make_response(items):
+    from rest_framework.renderers import JSONRenderer
+    from rest_framework.response import Response
+
+    # Unique identifiers are included because they compress far less than the
+    # repeated field names.
+    rng = random.Random(0)
+    data = [
+        {
+            "id": i,
+            "uuid": str(uuid.UUID(int=rng.getrandbits(128))),
+            "name": "voucher{}".format(i),
+            "internal_name": "voucher",
+            "amount": "{}.00".format(i % 50),
+        }
+        for i in range(items)
+    ]
+    response = Response(status=201, data=data)
+    response.accepted_renderer = JSONRenderer()
+    response.accepted_media_type = "application/json"
+    response.renderer_context = {}
+    return response.render()
+
+
+def is_installed(compression):
+    package = COMPRESSION_PACKAGES[compression]
+    if package is None:
+        return True
+    try:
+        importlib.import_module(package)
+    except ImportError:
+        return False
+    return True
+
+
+def get_serializers(compression, level, min_bytes):
+    from django.test import override_settings
+
+    from idempotency_key import serializers
+
+    storage = {
+        "COMPRESSION": None if compression == "none" else compression,
+        "COMPRESSION_LEVEL": level,
+        "COMPRESSION_MIN_BYTES": min_bytes,
+    }
+    with override_settings(IDEMPOTENCY_KEY={"STORAGE": storage}):
+        found = {
+            "pickle": serializers.PickleSerializer(),
+            "compact": serializers.CompactSerializer(),
+        }
+        if serializers.msgpack is not None:
+            found["msgpack"] = serializers.MsgpackSerializer()
+    return found
+
+
+def run(item_counts, number, compressions, level, min_bytes):
+    results = []
+    for items in item_counts:
+        response = make_response(items)
+        uncompressed = {}
+        for compression in compressions:
+            for name, serializer in get_serializers(
+                compression, level, min_bytes
+            ).items():
+                data = serializer.dumps(response)
+                uncompressed.setdefault(name, len(data))
+                dumps = timeit.timeit(lambda: serializer.dumps(response), number=number)
+                loads = timeit.timeit(lambda: serializer.loads(data), number=number)
+                results.append(
+                    {
+                        "serializer": name,
+                        "compression": compression,
+                        "items": items,
+                        "content_bytes": len(response.content),
+                        "stored_bytes": len(data),
+                        "saved_pct": (1 - len(data) / uncompressed[name]) * 100,
+                        "dumps_us": dumps / number * 1e6,
+                        "loads_us": loads / number * 1e6,
+                    }
+                )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--items", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--number", type=int, default=2000)
+    parser.add_argument(
+        "--compressions",
+        nargs="+",
+        choices=list(COMPRESSION_PACKAGES),
+        default=list(COMPRESSION_PACKAGES),
+        help="algorithms whose package is not installed are skipped",
+    )
+    parser.add_argument(
+        "--level", type=int, help="the compression level (default: the library's)"
+    )
+    parser.add_argument(
+        "--min-bytes",
+        type=int,
+        default=0,
+        help="the STORAGE.COMPRESSION_MIN_BYTES setting (default 0)",
+    )
+    parser.add_argument("--json", action="store_true", help="output results as JSON")
+    args = parser.parse_args()
+
+    # "none" is run first so that the sizes are compared with uncompressed data.
+    compressions = ["none"] + [
+        compression
+        for compression in args.compressions
+        if compression != "none" and is_installed(compression)
+    ]
+    setup_django()
+    results = run(args.items, args.number, compressions, args.level, args.min_bytes)
+    print_results(results, as_json=args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,4 @@
+import django
+
+if django.VERSION < (3, 2):  # pragma: no cover
+    default_app_config = "idempotency_key.apps.IdempotencyKeyConfig"
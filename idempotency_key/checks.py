@@ -0,0 +1,172 @@
+"""
+System checks run by `manage.py check` (and before most other management commands)
+when "idempotency_key" is in INSTALLED_APPS.
+"""
+
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+from django.utils import module_loading
+
+from idempotency_key import policies, utils
+from idempotency_key.exceptions import DecoratorsMutuallyExclusiveError
+from idempotency_key.middleware import IdempotencyKeyMiddleware
+
+
+def _import_error(setting, e):
+    return Error(
+        "IDEMPOTENCY_KEY{} cannot be imported: {}".format(setting, e),
+        id="idempotency_key.E002",
+    )
+
+
+def _validate_storage(storage_class, cache_name, obj=None):
+    try:
+        storage_class.validate_storage(cache_name)
+    except Exception as e:
+        return [
+            Error(
+                "Storage cache name '{}' is not valid: {!r}".format(cache_name, e),
+                hint="Add the cache to the CACHES setting.",
+                obj=obj,
+                id="idempotency_key.E003",
+            )
+        ]
+    return []
+
+
+def get_middleware_classes():
+    """
+    Returns the idempotency key middleware classes in the MIDDLEWARE setting.
+    """
+    found = []
+    for path in getattr(settings, "MIDDLEWARE", None) or []:
+        try:
+            middleware_class = module_loading.import_string(path)
+        except ImportError:
+            # Django's own checks report middleware that cannot be imported
+            continue
+        if isinstance(middleware_class, type) and issubclass(
+            middleware_class, IdempotencyKeyMiddleware
+        ):
+            found.append(middleware_class)
+    return found
+
+
+@register()
+def check_settings(app_configs, **kwargs):
+    errors = []
+
+    if utils.get_lock_mode() not in utils.LOCK_MODES:
+        errors.append(
+            Error(
+                "IDEMPOTENCY_KEY['LOCK']['MODE'] must be one of: {}".format(
+                    ", ".join(utils.LOCK_MODES)
+                ),
+                id="idempotency_key.E001",
+            )
+        )
+
+    if utils.get_storage_oversize() not in utils.OVERSIZE_ACTIONS:
+        errors.append(
+            Error(
+                "IDEMPOTENCY_KEY['STORAGE']['OVERSIZE'] must be one of: {}".format(
+                    ", ".join(utils.OVERSIZE_ACTIONS)
+                ),
+                id="idempotency_key.E006",
+            )
+        )
+
+    classes = [
+        ("['ENCODER_CLASS']", utils.get_encoder_class),
+        ("['STORAGE']['CLASS']", utils.get_storage_class),
+        ("['STORAGE']['SERIALIZER_CLASS']", utils.get_storage_serializer_class),
+        ("['LOCK']['CLASS']", utils.get_lock_class),
+        ("['LOCK']['ASYNC_CLASS']", utils.get_async_lock_class),
+    ]
+    loaded = {}
+    for setting, get_class in classes:
+        try:
+            loaded[setting] = get_class()
+        except ImportError as e:
+            errors.append(_import_error(setting, e))
+
+    # Create the objects whose settings are validated when they are created. None of
+    # these connect to a server.
+    for setting in (
+        "['ENCODER_CLASS']",
+        "['STORAGE']['SERIALIZER_CLASS']",
+        "['LOCK']['CLASS']",
+    ):
+        if setting not in loaded:
+            continue
+        try:
+            loaded[setting]()
+        except Exception as e:
+            errors.append(
+                Error(
+                    "IDEMPOTENCY_KEY{} is not configured correctly: {}".format(
+                        setting, e
+                    ),
+                    id="idempotency_key.E004",
+                )
+            )
+
+    storage_class = loaded.get("['STORAGE']['CLASS']")
+    if storage_class is not None:
+        errors.extend(_validate_storage(storage_class, utils.get_storage_cache_name()))
+
+    return errors
+
+
+@register(Tags.urls)
+def check_views(app_configs, **kwargs):
+    """
+    Resolves the policy of every view function in the URLconf (including DRF router
+    URLs) for each idempotency key middleware class. Misconfigured decorators and
+    cache names are reported and the policies are kept so that the first requests do
+    not need to resolve them.
+    """
+    middleware_classes = get_middleware_classes()
+    if not middleware_classes:
+        return []
+
+    try:
+        storage_class = utils.get_storage_class()
+    except ImportError:
+        # Reported by check_settings
+        storage_class = None
+
+    errors = []
+    checked_cache_names = {utils.get_storage_cache_name()}
+    checked_callbacks = set()
+    for callback in policies.iter_callbacks():
+        # A view function may be used by more than one URL pattern
+        if callback in checked_callbacks:
+            continue
+        checked_callbacks.add(callback)
+
+        # The same problem is found for each method of a plain view function and by
+        # each middleware class so each message is only reported once.
+        messages = set()
+        for middleware_class in middleware_classes:
+            for method in policies.get_callback_methods(callback):
+                try:
+                    policy = middleware_class.get_policy(callback, method)
+                except DecoratorsMutuallyExclusiveError as e:
+                    if str(e) not in messages:
+                        messages.add(str(e))
+                        errors.append(
+                            Error(str(e), obj=callback, id="idempotency_key.E005")
+                        )
+                    continue
+
+                if (
+                    storage_class is not None
+                    and policy.cache_name not in checked_cache_names
+                ):
+                    checked_cache_names.add(policy.cache_name)
+                    errors.extend(
+                        _validate_storage(storage_class, policy.cache_name, callback)
+                    )
+
+    return errors
@@ -0,0 +1,25 @@
+"""
+Compatibility with the range of Django and asgiref versions supported by this package.
+"""
+
+import asyncio
+
+import django
+
+try:
+    from asgiref.sync import sync_to_async
+except ImportError:  # pragma: no cover - asgiref is not a dependency of Django < 3.0
+    sync_to_async = None
+
+try:
+    from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+except ImportError:  # pragma: no cover - asgiref < 3.6
+    iscoroutinefunction = asyncio.iscoroutinefunction
+
+    def markcoroutinefunction(func):
+        func._is_coroutine = asyncio.coroutines._is_coroutine
+        return func
+
+
+# StreamingHttpResponse accepts asynchronous iterators from Django 4.2
+ASYNC_STREAMING_CONTENT = django.VERSION >= (4, 2)
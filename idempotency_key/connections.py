@@ -0,0 +1,113 @@
+"""
+Redis connections shared by the lock and storage classes.
+"""
+
+import os
+import threading
+
+from redis import BlockingConnectionPool, ConnectionPool, Redis
+from redis.asyncio import BlockingConnectionPool as AsyncBlockingConnectionPool
+from redis.asyncio import ConnectionPool as AsyncConnectionPool
+from redis.asyncio import Redis as AsyncRedis
+
+from idempotency_key import utils
+
+# Connection pools keyed by the location and the pool arguments. Only pools created
+# by the current process (_pools_pid) are kept.
+_pools = {}
+_pools_pid = None
+_pools_lock = threading.Lock()
+
+
+def get_pool_kwargs() -> dict:
+    """
+    Returns the connection pool arguments given by the REDIS settings.
+    """
+    kwargs = {
+        "socket_timeout": utils.get_redis_socket_timeout(),
+        "socket_connect_timeout": utils.get_redis_socket_connect_timeout(),
+        "health_check_interval": utils.get_redis_health_check_interval(),
+    }
+    max_connections = utils.get_redis_max_connections()
+    if max_connections is not None:
+        kwargs["max_connections"] = max_connections
+        # Wait this long for a connection to be returned to the pool.
+        kwargs["timeout"] = utils.get_redis_pool_timeout()
+    return kwargs
+
+
+def _create_pool(location, kwargs, pool_class, blocking_pool_class):
+    # When the number of connections is bounded a request waits for a free connection
+    # rather than failing as soon as the pool is exhausted.
+    if "max_connections" in kwargs:
+        pool_class = blocking_pool_class
+    return pool_class.from_url(location, **kwargs)
+
+
+def get_connection_pool(location: str, subscribe: bool = False) -> ConnectionPool:
+    """
+    Returns the connection pool for the Redis server at location. A single pool is
+    created for each location in each process so that every lock and storage object
+    using the same server shares its connections. A forked process creates its own
+    pools rather than using the connections of its parent.
+    :param location: The Redis URL
+    :param subscribe: Return the pool used for subscriptions. A subscribed connection
+                      is held for as long as the subscriber waits, so these connections
+                      are not taken from the shared pool and are not limited by
+                      REDIS.MAX_CONNECTIONS. Otherwise waiting requests could take
+                      every connection that the other commands need.
+    :return: the connection pool
+    """
+    global _pools_pid
+    kwargs = get_pool_kwargs()
+    if subscribe:
+        kwargs.pop("max_connections", None)
+        kwargs.pop("timeout", None)
+    key = (location, subscribe, tuple(sorted(kwargs.items())))
+    with _pools_lock:
+        if _pools_pid != os.getpid():
+            _pools.clear()
+            _pools_pid = os.getpid()
+
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _create_pool(
+                location, kwargs, ConnectionPool, BlockingConnectionPool
+            )
+            _pools[key] = pool
+        return pool
+
+
+def get_redis(location: str, subscribe: bool = False) -> Redis:
+    """
+    Returns a Redis client for the server at location that uses the shared connection
+    pool, see get_connection_pool.
+    """
+    return Redis(connection_pool=get_connection_pool(location, subscribe))
+
+
+def get_async_redis(location: str) -> AsyncRedis:
+    """
+    Returns an asyncio Redis client for the server at location configured by the REDIS
+    settings. asyncio connections belong to the event loop that opened them so each
+    client has its own pool.
+    """
+    return AsyncRedis(
+        connection_pool=_create_pool(
+            location,
+            get_pool_kwargs(),
+            AsyncConnectionPool,
+            AsyncBlockingConnectionPool,
+        )
+    )
+
+
+def close_connection_pools():
+    """
+    Disconnect and forget the connection pools created by this process.
+    """
+    with _pools_lock:
+        if _pools_pid == os.getpid():
+            for pool in _pools.values():
+                pool.disconnect()
+        _pools.clear()
@@ -1,6 +1,7 @@
 from functools import wraps
 
 from idempotency_key import utils
+from idempotency_key.compat import iscoroutinefunction
 
 # NOTE:
 # The following decorators must be specified BEFORE the @api_view decorator or the
@@ -14,7 +15,32 @@ from idempotency_key import utils
 #   ...
 
 
-def idempotency_key(*args, optional=False, cache_name=None):
+def _wrap(view_func):
+    """
+    Returns a wrapper of the view function that the decorators mark. The wrapper of an
+    asynchronous view function is also asynchronous so that django awaits it.
+    """
+    if iscoroutinefunction(view_func):
+
+        async def wrapped_view(*args, **kwargs):
+            return await view_func(*args, **kwargs)
+
+    else:
+
+        def wrapped_view(*args, **kwargs):
+            return view_func(*args, **kwargs)
+
+    return wraps(view_func)(wrapped_view)
+
+
+def idempotency_key(
+    *args,
+    optional=False,
+    cache_name=None,
+    ttl=None,
+    max_response_bytes=None,
+    oversize=None
+):
     """
     Allows an optional cache name to be specified so that different cache settings can
     be used on a per-view function basis.
@@ -23,19 +49,26 @@ def idempotency_key(*args, optional=False, cache_name=None):
     :param optional: Mark idempotency key header as optional
     :param cache_name: The name of the cache to use from the settings file under
                        CACHES={...}
+    :param ttl: The number of seconds the response is stored for. This overrides the
+                IDEMPOTENCY_KEY['STORAGE']['TTL'] setting.
+    :param max_response_bytes: The largest response content that is stored. This
+                overrides the IDEMPOTENCY_KEY['STORAGE']['MAX_RESPONSE_BYTES'] setting.
+    :param oversize: What is stored for a larger response, one of "skip", "marker" or
+                "chunk". This overrides the IDEMPOTENCY_KEY['STORAGE']['OVERSIZE']
+                setting.
     :return: wrapped function
     """
+    if oversize is not None and oversize not in utils.OVERSIZE_ACTIONS:
+        raise ValueError(
+            "oversize must be one of: {}".format(", ".join(utils.OVERSIZE_ACTIONS))
+        )
 
     def _idempotency_key(view_func):
         """
         Mark a view function as requiring idempotency key protection but the view
         should control the response.
         """
-
-        @wraps(view_func)
-        def wrapped_view(*args, **kwargs):
-            return view_func(*args, **kwargs)
-
+        wrapped_view = _wrap(view_func)
         wrapped_view.idempotency_key = True
         wrapped_view.idempotency_key_optional = optional
 
@@ -43,6 +76,15 @@ def idempotency_key(*args, optional=False, cache_name=None):
             wrapped_view.idempotency_key_cache_name = cache_name
             utils.get_storage_class().validate_storage(cache_name)
 
+        if ttl is not None:
+            wrapped_view.idempotency_key_ttl = ttl
+
+        if max_response_bytes is not None:
+            wrapped_view.idempotency_key_max_response_bytes = max_response_bytes
+
+        if oversize is not None:
+            wrapped_view.idempotency_key_oversize = oversize
+
         return wrapped_view
 
     # if there is an argument passed and it is a callable then this will be the view
@@ -58,12 +100,9 @@ def idempotency_key_exempt(view_func):
     """
     Mark a view function as being exempt from the idempotency key protection.
     """
-
-    def wrapped_view(*args, **kwargs):
-        return view_func(*args, **kwargs)
-
+    wrapped_view = _wrap(view_func)
     wrapped_view.idempotency_key_exempt = True
-    return wraps(view_func)(wrapped_view)
+    return wrapped_view
 
 
 def idempotency_key_manual(view_func):
@@ -71,9 +110,6 @@ def idempotency_key_manual(view_func):
     Mark a view function as requiring idempotency key protection but the view should
     control the response.
     """
-
-    def wrapped_view(*args, **kwargs):
-        return view_func(*args, **kwargs)
-
+    wrapped_view = _wrap(view_func)
     wrapped_view.idempotency_key_manual = True
-    return wraps(view_func)(wrapped_view)
+    return wrapped_view
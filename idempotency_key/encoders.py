@@ -1,8 +1,16 @@
 import abc
+import base64
+import functools
 import hashlib
+import io
+import tempfile
 
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 from django.http.request import HttpRequest
+from django.utils import module_loading
 
+from idempotency_key import utils
 from idempotency_key.exceptions import MissingIdempotencyKeyError
 
 
@@ -12,17 +20,179 @@ class IdempotencyKeyEncoder(object):
         raise NotImplementedError
 
 
+def get_hash_function():
+    """
+    Returns a function that creates a new hash object for the ENCODER.HASH_ALGORITHM
+    setting. This is either the name of a hashlib algorithm or the dotted path to a
+    function, i.e. 'xxhash.xxh3_128'.
+    """
+    algorithm = utils.get_encoder_hash_algorithm()
+    if "." in algorithm:
+        hash_function = module_loading.import_string(algorithm)
+    elif algorithm in hashlib.algorithms_guaranteed:
+        # The named constructors are faster than hashlib.new
+        hash_function = getattr(hashlib, algorithm)
+    else:
+        hash_function = functools.partial(hashlib.new, algorithm)
+
+    digest_size = utils.get_encoder_digest_size()
+    if digest_size is not None:
+        hash_function = functools.partial(hash_function, digest_size=digest_size)
+
+    try:
+        hash_function()
+    except (TypeError, ValueError) as e:
+        raise ImproperlyConfigured(
+            "IDEMPOTENCY_KEY['ENCODER'] hash algorithm '{}' cannot be used: {}".format(
+                algorithm, e
+            )
+        )
+    return hash_function
+
+
 class BasicKeyEncoder(IdempotencyKeyEncoder):
+    def __init__(self):
+        self.hash_function = get_hash_function()
+        self.output = utils.get_encoder_output()
+        if self.output not in utils.ENCODER_OUTPUTS:
+            raise ImproperlyConfigured(
+                "IDEMPOTENCY_KEY['ENCODER']['OUTPUT'] must be one of: {}".format(
+                    ", ".join(utils.ENCODER_OUTPUTS)
+                )
+            )
+
     def encode_key(self, request: HttpRequest, key):
         if key is None:
             raise MissingIdempotencyKeyError()
         # Basic method for generating an encoded key
-        m = hashlib.sha256()
+        m = self.hash_function()
         m.update(key.encode("UTF-8"))
         m.update(request.path_info.encode("UTF-8"))
         m.update(request.method.encode("UTF-8"))
-        m.update(request.body)
+        self.update_body(m, request)
         if request.META.get("HTTP_AUTHORIZATION"):
             m.update(request.META.get("HTTP_AUTHORIZATION").encode("UTF-8"))
 
+        if self.output == utils.ENCODER_OUTPUT_BASE64:
+            return base64.urlsafe_b64encode(m.digest()).rstrip(b"=").decode("ascii")
         return m.hexdigest()
+
+    def update_body(self, m, request: HttpRequest):
+        """
+        Add the request body to the hash.
+        :param m: The hash object
+        :param request: The request whose body is hashed
+        """
+        m.update(request.body)
+
+
+class _ReplayStream(io.IOBase):
+    """
+    Returns the bytes that have already been read from a stream followed by the rest of
+    the stream.
+    """
+
+    def __init__(self, head: bytes, stream):
+        self.head = io.BytesIO(head)
+        self.stream = stream
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        data = self.head.read(size)
+        if size is None or size < 0:
+            return data + self.stream.read()
+        if len(data) < size:
+            data += self.stream.read(size - len(data))
+        return data
+
+
+class StreamingKeyEncoder(BasicKeyEncoder):
+    """
+    Hashes the request body in chunks as it is read from the request stream instead of
+    loading all of it into memory with request.body. The request stream is replaced so
+    that the view function can still read the body:
+
+    * By default the whole body is hashed and copied to a temporary file that is kept in
+      memory until it is larger than FILE_UPLOAD_MAX_MEMORY_SIZE.
+    * If ENCODER.BODY_LIMIT is set then only the first BODY_LIMIT bytes of the body
+      (and the content length) are hashed and the rest of the body is not read.
+
+    Without a BODY_LIMIT the encoded key is the same as the one BasicKeyEncoder gives.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.chunk_size = utils.get_encoder_chunk_size()
+        self.body_limit = utils.get_encoder_body_limit()
+
+    def update_body(self, m, request: HttpRequest):
+        # If the body has already been read then it is either in memory already or it
+        # cannot be read again, in which case request.body raises the usual error.
+        if hasattr(request, "_body") or request._read_started:
+            if self.body_limit is None:
+                m.update(request.body)
+            else:
+                self.update_content_length(m, request, request.body[: self.body_limit])
+            return
+
+        # Streams that can be rewound (ASGI requests are already spooled to a file)
+        # are read again from the same position by the view function.
+        stream = request._stream
+        seekable = getattr(stream, "seekable", lambda: False)()
+        if seekable:
+            position = stream.tell()
+
+        if self.body_limit is None:
+            new_stream = self._read_body(m, request, spool=not seekable)
+        else:
+            head = self._read_head(request)
+            self.update_content_length(m, request, head)
+            new_stream = _ReplayStream(head, stream)
+
+        if seekable:
+            stream.seek(position)
+            new_stream = stream
+
+        request._stream = new_stream
+        # Allow the body to be read from the new stream by the view function.
+        request._read_started = False
+
+    @staticmethod
+    def update_content_length(m, request, head):
+        """
+        Add the start of the body and its content length to the hash.
+        """
+        m.update(head)
+        m.update(str(request.META.get("CONTENT_LENGTH") or "").encode("UTF-8"))
+
+    def _read_body(self, m, request, spool=True):
+        body_file = None
+        if spool:
+            body_file = tempfile.SpooledTemporaryFile(
+                max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE, mode="w+b"
+            )
+
+        while True:
+            chunk = request.read(self.chunk_size)
+            if not chunk:
+                break
+            m.update(chunk)
+            if body_file is not None:
+                body_file.write(chunk)
+
+        if body_file is not None:
+            body_file.seek(0)
+        return body_file
+
+    def _read_head(self, request):
+        chunks = []
+        remaining = self.body_limit
+        while remaining > 0:
+            chunk = request.read(min(self.chunk_size, remaining))
+            if not chunk:
+                break
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        return b"".join(chunks)
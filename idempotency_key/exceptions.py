@@ -19,6 +19,16 @@ class DecoratorsMutuallyExclusiveError(Exception):
     pass
 
 
+class ChunkExpiredError(Exception):
+    """
+    Raised while a stored streaming response is replayed if one of its chunks is no
+    longer in the storage. Part of the response has already been sent so the
+    connection is closed.
+    """
+
+    pass
+
+
 def bad_request(request, exception, *args, **kwargs):
     """
     Generic 400 error handler.
@@ -33,3 +43,14 @@ def resource_locked(request, exception, *args, **kwargs):
     """
     data = {"error": "Resource Locked (423)"}
     return JsonResponse(data, status=status.HTTP_423_LOCKED)
+
+
+def request_in_flight(
+    request, exception, *args, status_code=status.HTTP_409_CONFLICT, **kwargs
+):
+    """
+    Generic error handler used when a request with the same idempotency key is still
+    being processed.
+    """
+    data = {"error": "Request In Flight ({})".format(status_code)}
+    return JsonResponse(data, status=status_code)
@@ -1,16 +1,22 @@
 import abc
+import asyncio
 import threading
 
 from idempotency_key import utils
+from idempotency_key.compat import sync_to_async
 
 
 class IdempotencyKeyLock(abc.ABC):
+    # The lock class used when the middleware is running asynchronously, unless the
+    # LOCK.ASYNC_CLASS setting is specified.
+    async_class = "idempotency_key.locks.basic.SyncToAsyncLock"
+
     @abc.abstractmethod
     def acquire(self, *args, **kwargs) -> bool:
         raise NotImplementedError()
 
     @abc.abstractmethod
-    def release(self):
+    def release(self, *args, **kwargs):
         raise NotImplementedError()
 
 
@@ -18,14 +24,124 @@ class ThreadLock(IdempotencyKeyLock):
     """
     Should be used only when there is one process sharing the storage class resource.
     This uses the built-in python threading module to protect a resource.
+    When a name is passed to acquire/release a lock is used for that name only so that
+    requests with different names never contend with each other.
     """
 
+    async_class = "idempotency_key.locks.basic.AsyncioLock"
+
     storage_lock = threading.Lock()
 
-    def acquire(self, *args, **kwargs) -> bool:
-        return self.storage_lock.acquire(
-            blocking=True, timeout=utils.get_lock_timeout()
-        )
+    # Named locks are created on demand and discarded once no thread holds or is
+    # waiting for them. Each entry is a [lock, reference count] pair.
+    named_locks = {}
+    named_locks_guard = threading.Lock()
+
+    def acquire(self, name=None, *args, **kwargs) -> bool:
+        if name is None:
+            return self.storage_lock.acquire(
+                blocking=True, timeout=utils.get_settings().lock_timeout
+            )
+
+        with self.named_locks_guard:
+            entry = self.named_locks.setdefault(name, [threading.Lock(), 0])
+            entry[1] += 1
+
+        if entry[0].acquire(blocking=True, timeout=utils.get_settings().lock_timeout):
+            return True
+
+        self._discard(name)
+        return False
+
+    def release(self, name=None, *args, **kwargs):
+        if name is None:
+            self.storage_lock.release()
+            return
+
+        self.named_locks[name][0].release()
+        self._discard(name)
+
+    def _discard(self, name):
+        with self.named_locks_guard:
+            entry = self.named_locks[name]
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self.named_locks[name]
+
+
+class AsyncIdempotencyKeyLock(abc.ABC):
+    @abc.abstractmethod
+    async def acquire(self, *args, **kwargs) -> bool:
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    async def release(self, *args, **kwargs):
+        raise NotImplementedError()
+
+
+class AsyncioLock(AsyncIdempotencyKeyLock):
+    """
+    The asyncio equivalent of ThreadLock used when the middleware is running
+    asynchronously. Should be used only when there is one process sharing the storage
+    class resource.
+    """
+
+    def __init__(self):
+        # asyncio locks are created when they are first used so that they belong to
+        # the running event loop.
+        self.storage_lock = None
+        # Each entry is a [lock, reference count] pair, see ThreadLock.named_locks
+        self.named_locks = {}
+
+    @staticmethod
+    async def _acquire(lock) -> bool:
+        try:
+            await asyncio.wait_for(lock.acquire(), utils.get_settings().lock_timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def acquire(self, name=None, *args, **kwargs) -> bool:
+        if name is None:
+            if self.storage_lock is None:
+                self.storage_lock = asyncio.Lock()
+            return await self._acquire(self.storage_lock)
+
+        entry = self.named_locks.setdefault(name, [asyncio.Lock(), 0])
+        entry[1] += 1
+        if await self._acquire(entry[0]):
+            return True
+
+        self._discard(name)
+        return False
+
+    async def release(self, name=None, *args, **kwargs):
+        if name is None:
+            self.storage_lock.release()
+            return
+
+        self.named_locks[name][0].release()
+        self._discard(name)
+
+    def _discard(self, name):
+        entry = self.named_locks[name]
+        entry[1] -= 1
+        if entry[1] == 0:
+            del self.named_locks[name]
+
+
+class SyncToAsyncLock(AsyncIdempotencyKeyLock):
+    """
+    Runs the lock class specified by the LOCK.CLASS setting in a thread. This is used
+    when the middleware is running asynchronously and the lock class does not have an
+    asynchronous equivalent.
+    """
+
+    def __init__(self):
+        self.lock = utils.get_lock_class()()
+
+    async def acquire(self, *args, **kwargs) -> bool:
+        return await sync_to_async(self.lock.acquire)(*args, **kwargs)
 
-    def release(self):
-        self.storage_lock.release()
+    async def release(self, *args, **kwargs):
+        await sync_to_async(self.lock.release)(*args, **kwargs)
@@ -1,13 +1,65 @@
-from redis import Redis
+import threading
 
-from idempotency_key import utils
-from idempotency_key.locks.basic import IdempotencyKeyLock
+from idempotency_key import connections, utils
+from idempotency_key.locks.basic import AsyncIdempotencyKeyLock, IdempotencyKeyLock
+
+
+class _HeldLocks(threading.local):
+    def __init__(self):
+        self.locks = {}
 
 
 class MultiProcessRedisLock(IdempotencyKeyLock):
     """
     Should be used if a lock is required across processes. Note that this class uses
     Redis in order to perform the lock.
+    When a name is passed to acquire/release the Redis lock is named after it so that
+    requests with different names never contend with each other.
+    """
+
+    async_class = "idempotency_key.locks.redis.AsyncMultiProcessRedisLock"
+
+    def __init__(self):
+        location = utils.get_lock_location()
+        if location is None or location == "":
+            raise ValueError("Redis server location must be set in the settings file.")
+
+        self.redis_obj = connections.get_redis(location)
+        self.storage_lock = self._create_lock(utils.get_lock_name())
+        # Named locks that are currently held by this thread.
+        self.held_locks = _HeldLocks()
+
+    def _create_lock(self, name):
+        return self.redis_obj.lock(
+            name=name,
+            # Time before lock is forcefully released.
+            timeout=utils.get_settings().lock_ttl,
+            blocking_timeout=utils.get_settings().lock_timeout,
+        )
+
+    def acquire(self, name=None, *args, **kwargs) -> bool:
+        if name is None:
+            return self.storage_lock.acquire()
+
+        lock = self._create_lock("{}:{}".format(utils.get_settings().lock_name, name))
+        if not lock.acquire():
+            return False
+
+        self.held_locks.locks[name] = lock
+        return True
+
+    def release(self, name=None, *args, **kwargs):
+        if name is None:
+            self.storage_lock.release()
+            return
+
+        self.held_locks.locks.pop(name).release()
+
+
+class AsyncMultiProcessRedisLock(AsyncIdempotencyKeyLock):
+    """
+    The asyncio equivalent of MultiProcessRedisLock used when the middleware is running
+    asynchronously.
     """
 
     def __init__(self):
@@ -15,16 +67,34 @@ class MultiProcessRedisLock(IdempotencyKeyLock):
         if location is None or location == "":
             raise ValueError("Redis server location must be set in the settings file.")
 
-        self.redis_obj = Redis.from_url(location)
-        self.storage_lock = self.redis_obj.lock(
-            name=utils.get_lock_name(),
+        self.redis_obj = connections.get_async_redis(location)
+        self.storage_lock = self._create_lock(utils.get_lock_name())
+        # Named locks that are currently held. Only one task can hold a named lock at
+        # a time so there is no need to keep them per task.
+        self.held_locks = {}
+
+    def _create_lock(self, name):
+        return self.redis_obj.lock(
+            name=name,
             # Time before lock is forcefully released.
-            timeout=utils.get_lock_time_to_live(),
-            blocking_timeout=utils.get_lock_timeout(),
+            timeout=utils.get_settings().lock_ttl,
+            blocking_timeout=utils.get_settings().lock_timeout,
         )
 
-    def acquire(self, *args, **kwargs) -> bool:
-        return self.storage_lock.acquire()
+    async def acquire(self, name=None, *args, **kwargs) -> bool:
+        if name is None:
+            return await self.storage_lock.acquire()
+
+        lock = self._create_lock("{}:{}".format(utils.get_settings().lock_name, name))
+        if not await lock.acquire():
+            return False
+
+        self.held_locks[name] = lock
+        return True
+
+    async def release(self, name=None, *args, **kwargs):
+        if name is None:
+            await self.storage_lock.release()
+            return
 
-    def release(self):
-        self.storage_lock.release()
+        await self.held_locks.pop(name).release()
@@ -0,0 +1,85 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from idempotency_key import utils
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired idempotency keys from the storage class in bounded batches. "
+        "Only storage classes that keep expired responses, such as "
+        "DatabaseKeyStorage, need to be purged."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="The maximum number of keys deleted by each query (default 1000).",
+        )
+        parser.add_argument(
+            "--rate",
+            type=float,
+            default=None,
+            help="The maximum number of keys deleted per second (default unlimited).",
+        )
+        parser.add_argument(
+            "--cache-name",
+            default=None,
+            help="Only delete the keys stored under this cache name.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Count the expired keys without deleting them.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        rate = options["rate"]
+        cache_name = options["cache_name"]
+        if batch_size < 1:
+            raise CommandError("--batch-size must be greater than 0.")
+        if rate is not None and rate <= 0:
+            raise CommandError("--rate must be greater than 0.")
+
+        storage = utils.get_storage_class()()
+        if not hasattr(storage, "delete_expired"):
+            raise CommandError(
+                "{} does not keep expired idempotency keys.".format(
+                    type(storage).__name__
+                )
+            )
+
+        # Keys that expire while the command is running are left for the next run so
+        # that the command always finishes.
+        expired_before = timezone.now()
+        total = storage.count_expired(cache_name, expired_before)
+        if options["dry_run"]:
+            self.stdout.write(
+                "{} expired idempotency keys would be deleted.".format(total)
+            )
+            return
+
+        deleted = 0
+        while True:
+            started = time.monotonic()
+            count = storage.delete_expired(cache_name, batch_size, expired_before)
+            deleted += count
+            if count:
+                self.stdout.write(
+                    "Deleted {} of {} expired idempotency keys.".format(deleted, total)
+                )
+            if count < batch_size:
+                break
+
+            # Spread the batches out so that the deletes do not exceed the rate.
+            if rate is not None:
+                time.sleep(max(count / rate - (time.monotonic() - started), 0))
+
+        self.stdout.write(
+            self.style.SUCCESS("Deleted {} expired idempotency keys.".format(deleted))
+        )
@@ -0,0 +1,186 @@
+"""
+Metrics recorded by the idempotency key middleware. The class used is given by the
+METRICS_CLASS setting.
+"""
+
+import abc
+import contextlib
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List
+
+# Metric names. Durations are in seconds and sizes in bytes.
+# Time taken to encode the idempotency key.
+ENCODE_SECONDS = "encode_seconds"
+# Time taken by the storage class, the operation label is "retrieve", "reserve",
+# "store", "wait" or "chunks".
+STORAGE_SECONDS = "storage_seconds"
+# Time spent acquiring the lock and the number of times it could not be acquired
+# (HTTP_423_LOCKED responses).
+LOCK_WAIT_SECONDS = "lock_wait_seconds"
+LOCK_TIMEOUTS = "lock_timeouts"
+# Requests whose stored response was replayed, requests that found no stored response
+# and requests that found the key in flight.
+HITS = "hits"
+MISSES = "misses"
+IN_FLIGHT = "in_flight"
+# The size of the content of each response to be stored and the number of responses
+# larger than STORAGE.MAX_RESPONSE_BYTES, the action label is the STORAGE.OVERSIZE
+# setting used.
+STORED_RESPONSE_BYTES = "stored_response_bytes"
+OVERSIZED = "oversized"
+# Requests rejected because the idempotency key was missing (HTTP_400_BAD_REQUEST).
+REJECTED = "rejected"
+
+# Returned by NullMetrics.timer. nullcontext can be entered any number of times.
+_NULL_TIMER = contextlib.nullcontext()
+
+
+class _Timer:
+    __slots__ = ("metrics", "name", "labels", "started")
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.name, time.perf_counter() - self.started, self.labels)
+
+
+class IdempotencyKeyMetrics(object):
+    """
+    Receives the metrics recorded by the middleware. Subclasses send them on to a
+    monitoring system (i.e. Prometheus or StatsD) by implementing increment and
+    observe. Every metric is labelled with the cache name and the view.
+    """
+
+    # The middleware skips measurements that have a cost of their own (i.e. the size
+    # of a response) when this is False.
+    enabled = True
+
+    @abc.abstractmethod
+    def increment(self, name: str, labels: Dict[str, str]) -> None:
+        """
+        Add one to a counter.
+        :param name: The name of the metric, one of the names defined in this module
+        :param labels: The labels of the metric
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def observe(self, name: str, value: float, labels: Dict[str, str]) -> None:
+        """
+        Record a duration or size.
+        :param name: The name of the metric, one of the names defined in this module
+        :param value: The duration in seconds or the size in bytes
+        :param labels: The labels of the metric
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def get_labels(request, **labels) -> Dict[str, str]:
+        labels["cache_name"] = getattr(request, "idempotency_key_cache_name", "")
+        labels["view"] = getattr(request, "idempotency_key_view_name", "")
+        return labels
+
+    # The functions below are called by the middleware.
+
+    def count(self, request, name: str, **labels) -> None:
+        self.increment(name, self.get_labels(request, **labels))
+
+    def record(self, request, name: str, value: float, **labels) -> None:
+        self.observe(name, value, self.get_labels(request, **labels))
+
+    def timer(self, request, name: str, **labels):
+        """
+        Returns a context manager that records how long its block took.
+        """
+        return _Timer(self, name, self.get_labels(request, **labels))
+
+
+class NullMetrics(IdempotencyKeyMetrics):
+    """
+    Discards all metrics. This is the default. Nothing is measured so there is no cost
+    to the middleware.
+    """
+
+    enabled = False
+
+    def increment(self, name: str, labels: Dict[str, str]) -> None:
+        pass
+
+    def observe(self, name: str, value: float, labels: Dict[str, str]) -> None:
+        pass
+
+    def count(self, request, name: str, **labels) -> None:
+        pass
+
+    def record(self, request, name: str, value: float, **labels) -> None:
+        pass
+
+    def timer(self, request, name: str, **labels):
+        return _NULL_TIMER
+
+
+class InMemoryMetrics(IdempotencyKeyMetrics):
+    """
+    Keeps the metrics in memory, i.e. for tests or to be exported by the application.
+    """
+
+    def __init__(self):
+        self.counters = Counter()
+        self.observations = defaultdict(list)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def increment(self, name: str, labels: Dict[str, str]) -> None:
+        with self._lock:
+            self.counters[self._key(name, labels)] += 1
+
+    def observe(self, name: str, value: float, labels: Dict[str, str]) -> None:
+        with self._lock:
+            self.observations[self._key(name, labels)].append(value)
+
+    @staticmethod
+    def _matches(key, name, labels):
+        key_name, key_labels = key
+        return key_name == name and labels.items() <= dict(key_labels).items()
+
+    def get_count(self, name: str, **labels) -> int:
+        """
+        Returns the total of a counter for every set of labels that includes the
+        given labels.
+        """
+        with self._lock:
+            return sum(
+                value
+                for key, value in self.counters.items()
+                if self._matches(key, name, labels)
+            )
+
+    def get_values(self, name: str, **labels) -> List[float]:
+        """
+        Returns the values observed for every set of labels that includes the given
+        labels.
+        """
+        with self._lock:
+            return [
+                value
+                for key, values in self.observations.items()
+                if self._matches(key, name, labels)
+                for value in values
+            ]
+
+    def clear(self):
+        with self._lock:
+            self.counters.clear()
+            self.observations.clear()
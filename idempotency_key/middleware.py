@@ -1,16 +1,43 @@
 import logging
 
 from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
 
-from idempotency_key import status, utils
+from idempotency_key import metrics, policies, status, streaming, utils
+from idempotency_key.compat import iscoroutinefunction, markcoroutinefunction
 from idempotency_key.exceptions import (
     DecoratorsMutuallyExclusiveError,
     bad_request,
+    request_in_flight,
     resource_locked,
 )
+from idempotency_key.policies import ViewPolicy
+from idempotency_key.storage import (
+    ChunkedResponse,
+    InFlight,
+    ProcessedResponse,
+    get_response_size,
+)
 
 logger = logging.getLogger("django-idempotency-key.idempotency_key.middleware")
 
+# Responses outside of these statuses are never stored.
+SUCCESS_STATUSES = frozenset(
+    [
+        status.HTTP_200_OK,
+        status.HTTP_201_CREATED,
+        status.HTTP_202_ACCEPTED,
+        status.HTTP_203_NON_AUTHORITATIVE_INFORMATION,
+        status.HTTP_204_NO_CONTENT,
+        status.HTTP_205_RESET_CONTENT,
+        status.HTTP_206_PARTIAL_CONTENT,
+        status.HTTP_207_MULTI_STATUS,
+    ]
+)
+
+# Methods defined as safe by RFC7231 are exempt.
+SAFE_METHODS = frozenset(["GET", "HEAD", "OPTIONS", "TRACE"])
+
 
 class IdempotencyKeyMiddleware:
     """
@@ -19,20 +46,80 @@ class IdempotencyKeyMiddleware:
     View functions can opt-out using the @idempotency_key_exempt decorator
     """
 
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response=None):
         self.get_response = get_response
         self.storage = utils.get_storage_class()()
         self.encoder = utils.get_encoder_class()()
-        self.storage_lock = utils.get_lock_class()()
+        self.metrics = utils.get_metrics_class()()
+
+        # When the middleware chain is asynchronous the storage class and lock are
+        # accessed without blocking the event loop.
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            self.process_view = self.aprocess_view
+            self.storage_lock = utils.get_async_lock_class()()
+        else:
+            self.storage_lock = utils.get_lock_class()()
+
+        if utils.get_lock_mode() not in utils.LOCK_MODES:
+            raise ImproperlyConfigured(
+                "IDEMPOTENCY_KEY['LOCK']['MODE'] must be one of: {}".format(
+                    ", ".join(utils.LOCK_MODES)
+                )
+            )
+
+        if utils.get_warm_policies():
+            self.warm_policies()
 
     def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        if request.method in SAFE_METHODS:
+            return self._call(request)
+
+        with self.storage.atomic():
+            response = self._call(request)
+            # django turns an exception raised by the view function into an error
+            # response so the transaction would otherwise be committed.
+            if self._should_roll_back(request, response):
+                self.storage.set_rollback()
+            return response
+
+    @staticmethod
+    def _should_roll_back(request, response):
+        """
+        Returns True if the changes made while handling a request that uses an
+        idempotency key should be rolled back because its response is not stored, so
+        that running the view function again with the same key does not repeat them.
+        """
+        if getattr(request, "idempotency_key_exempt", True):
+            return False
+        if getattr(request, "idempotency_key_store_skipped", False):
+            return True
+        return not (
+            response.status_code in SUCCESS_STATUSES
+            and response.status_code in utils.get_settings().storage_store_on_statuses
+        )
+
+    def _call(self, request):
         self.process_request(request)
         response = self.get_response(request)
         response = self.process_response(request, response)
         return response
 
-    @staticmethod
-    def _reject(request, reason):
+    async def __acall__(self, request):
+        self.process_request(request)
+        response = await self.get_response(request)
+        response = await self.aprocess_response(request, response)
+        return response
+
+    def _reject(self, request, reason):
+        self.metrics.count(request, metrics.REJECTED)
         response = bad_request(request, None)
         logger.debug(
             "Bad Request (%s): %s",
@@ -42,88 +129,428 @@ class IdempotencyKeyMiddleware:
         )
         return response
 
-    def _set_flags_from_callback(self, request, callback):
-        # If there is an actions attribute then the function is wrapped in a DRF viewset
-        func_name = callback.__name__
-        if hasattr(callback, "actions"):
-            func_name = callback.actions[request.method.lower()]
-            # get a reference to the function to access any attributes we might be
-            # interested in.
-            callback = getattr(callback.cls, func_name, callback)
-
-        idempotency_key = getattr(callback, "idempotency_key", None)
-        idempotency_key_optional = getattr(callback, "idempotency_key_optional", False)
-        idempotency_key_exempt = getattr(callback, "idempotency_key_exempt", False)
-        idempotency_key_manual = getattr(callback, "idempotency_key_manual", False)
-        idempotency_key_cache_name = getattr(
-            callback, "idempotency_key_cache_name", utils.get_storage_cache_name()
-        )
+    @classmethod
+    def get_policy(cls, callback, method) -> ViewPolicy:
+        """
+        Returns the policy for a view function and HTTP method. Policies are resolved
+        once and shared by every instance of the middleware class until the settings
+        change.
+        """
+        return policies.get_registry(cls).get(callback, method, cls.resolve_policy)
+
+    @classmethod
+    def warm_policies(cls, urlconf=None):
+        """
+        Resolve the policies for every view function in the URLconf so that
+        misconfigured view functions are found before any requests are handled.
+        :param urlconf: The URLconf module or its name. Defaults to ROOT_URLCONF
+        """
+        for callback in policies.iter_callbacks(urlconf):
+            for method in policies.get_callback_methods(callback):
+                cls.get_policy(callback, method)
 
-        if idempotency_key and idempotency_key_exempt:
+    @staticmethod
+    def _check_decorators(func_name, idempotency_key, exempt, manual):
+        if idempotency_key and exempt:
             raise DecoratorsMutuallyExclusiveError(
                 "@idempotency_key and @idempotency_key_exempt decorators are mutually "
                 'exclusive for function "{}"'.format(func_name)
             )
 
-        if idempotency_key_manual and idempotency_key_exempt:
+        if manual and exempt:
             raise DecoratorsMutuallyExclusiveError(
                 "@idempotency_key_manual and @idempotency_key_exempt decorators are "
                 'mutually exclusive for function "{}"'.format(func_name)
             )
 
-        request.idempotency_key_optional = idempotency_key_optional
-        request.idempotency_key_exempt = idempotency_key_exempt
-        request.idempotency_key_manual = idempotency_key_manual
-        request.idempotency_key_cache_name = idempotency_key_cache_name
+    @staticmethod
+    def _is_exempt(callback) -> bool:
+        """
+        Returns True if the view function is exempt from idempotency key protection.
+        View functions are protected unless they use @idempotency_key_exempt.
+        """
+        return getattr(callback, "idempotency_key_exempt", False)
+
+    @classmethod
+    def resolve_policy(cls, callback, method) -> ViewPolicy:
+        func_name = policies.get_view_name(callback)
+        view_name = policies.get_view_label(callback)
+        # If there is an actions attribute then the function is wrapped in a DRF viewset
+        if hasattr(callback, "actions"):
+            actual_func_name = callback.actions.get(method.lower())
+            # if for some reason the method is not available in the viewset then just
+            # proceed as normal and let the framework handle the problem.
+            if actual_func_name is not None:
+                func_name = actual_func_name
+                view_name = policies.get_view_label(callback, func_name)
 
-    def perform_generate_response(self, request, encoded_key):
-        # Check if a response already exists for the encoded key
-        key_exists, response = self.storage.retrieve_data(
-            request.idempotency_key_cache_name, encoded_key
+                # get a reference to the function to access any attributes we might be
+                # interested in.
+                callback = getattr(callback.cls, func_name, callback)
+
+        idempotency_key_manual = getattr(callback, "idempotency_key_manual", False)
+        cls._check_decorators(
+            func_name,
+            getattr(callback, "idempotency_key", False),
+            getattr(callback, "idempotency_key_exempt", False),
+            idempotency_key_manual,
         )
 
-        # add the key exists result and the original request if it exists
-        request.idempotency_key_exists = key_exists
+        conf = utils.get_settings()
+        return ViewPolicy(
+            optional=getattr(callback, "idempotency_key_optional", False),
+            exempt=cls._is_exempt(callback),
+            manual=idempotency_key_manual,
+            cache_name=getattr(
+                callback, "idempotency_key_cache_name", conf.storage_cache_name
+            ),
+            ttl=getattr(callback, "idempotency_key_ttl", conf.storage_ttl),
+            max_response_bytes=getattr(
+                callback,
+                "idempotency_key_max_response_bytes",
+                conf.storage_max_response_bytes,
+            ),
+            oversize=getattr(
+                callback, "idempotency_key_oversize", conf.storage_oversize
+            ),
+            view_name=view_name,
+        )
+
+    def _set_flags_from_callback(self, request, callback):
+        policy = self.get_policy(callback, request.method)
+        request.idempotency_key_optional = policy.optional
+        request.idempotency_key_exempt = policy.exempt
+        request.idempotency_key_manual = policy.manual
+        request.idempotency_key_cache_name = policy.cache_name
+        request.idempotency_key_ttl = policy.ttl
+        request.idempotency_key_max_response_bytes = policy.max_response_bytes
+        request.idempotency_key_oversize = policy.oversize
+        request.idempotency_key_view_name = policy.view_name
+
+    def _replay_response(self, request, response):
+        self.metrics.count(request, metrics.HITS)
+
+        # Only a marker was stored because the response was too large
+        if isinstance(response, ProcessedResponse):
+            response = response.to_response()
+
+        # add the key exists result and the original request
+        request.idempotency_key_exists = True
         request.idempotency_key_response = response
 
-        # If not manual override and the key already exists
-        if not request.idempotency_key_manual and key_exists:
-            # Get the required return status code from settings
-            status_code = utils.get_conflict_code()
-            # if None then return whatever the status code was originally otherwise use
-            # the specified status code
-            if status_code is not None:
-                response.status_code = status_code
-            return response
+        # If manual override then the view function decides what to do
+        if request.idempotency_key_manual:
+            return None
+
+        # Get the required return status code from settings
+        status_code = utils.get_settings().conflict_code
+        # if None then return whatever the status code was originally otherwise use
+        # the specified status code
+        if status_code is not None:
+            response.status_code = status_code
+        return response
+
+    def _use_stored_data(self, request, response):
+        # Another request with the same key is still being processed. Waiting for it
+        # is done by the caller once any lock has been released.
+        if isinstance(response, InFlight):
+            self.metrics.count(request, metrics.IN_FLIGHT)
+            request.idempotency_key_in_flight = True
+            return None
+
+        return self._replay_response(request, response)
 
+    @staticmethod
+    def _get_reservation_ttl(request):
+        ttl = utils.get_settings().reservation_ttl
+        return request.idempotency_key_ttl if ttl is None else ttl
+
+    def _use_retrieved_data(self, request, key_exists, response, reserved):
+        if key_exists:
+            return self._use_stored_data(request, response)
+
+        self.metrics.count(request, metrics.MISSES)
+        request.idempotency_key_exists = False
+        request.idempotency_key_response = None
+        request.idempotency_key_reserved = reserved
         return None
 
+    def perform_generate_response(self, request, encoded_key):
+        # Check if a response already exists for the encoded key. If reservations are
+        # enabled then the key is also reserved if it does not exist so that concurrent
+        # requests using the same key do not run the view function while this one is
+        # being processed.
+        reserve = utils.get_settings().reservation_enable
+        if reserve:
+            with self.metrics.timer(
+                request, metrics.STORAGE_SECONDS, operation="reserve"
+            ):
+                key_exists, response = self.storage.reserve_data(
+                    request.idempotency_key_cache_name,
+                    encoded_key,
+                    self._get_reservation_ttl(request),
+                )
+        else:
+            with self.metrics.timer(
+                request, metrics.STORAGE_SECONDS, operation="retrieve"
+            ):
+                key_exists, response = self.storage.retrieve_data(
+                    request.idempotency_key_cache_name, encoded_key
+                )
+        key_exists, response = self._load_chunks(
+            request, encoded_key, key_exists, response
+        )
+        return self._use_retrieved_data(request, key_exists, response, reserve)
+
+    async def aperform_generate_response(self, request, encoded_key):
+        reserve = utils.get_settings().reservation_enable
+        if reserve:
+            with self.metrics.timer(
+                request, metrics.STORAGE_SECONDS, operation="reserve"
+            ):
+                key_exists, response = await self.storage.areserve_data(
+                    request.idempotency_key_cache_name,
+                    encoded_key,
+                    self._get_reservation_ttl(request),
+                )
+        else:
+            with self.metrics.timer(
+                request, metrics.STORAGE_SECONDS, operation="retrieve"
+            ):
+                key_exists, response = await self.storage.aretrieve_data(
+                    request.idempotency_key_cache_name, encoded_key
+                )
+        key_exists, response = await self._aload_chunks(
+            request, encoded_key, key_exists, response
+        )
+        return self._use_retrieved_data(request, key_exists, response, reserve)
+
+    def _load_chunks(self, request, encoded_key, key_exists, response):
+        """
+        Rebuild a response whose content was stored in chunks because it was too
+        large. If any of the chunks has expired then the key is treated as missing.
+        """
+        if not isinstance(response, ChunkedResponse):
+            return key_exists, response
+
+        # A streaming response is streamed back from the storage class
+        if response.streaming:
+            with self.metrics.timer(
+                request, metrics.STORAGE_SECONDS, operation="chunks"
+            ):
+                return streaming.load_stream(
+                    self.storage,
+                    request.idempotency_key_cache_name,
+                    encoded_key,
+                    response,
+                )
+
+        with self.metrics.timer(request, metrics.STORAGE_SECONDS, operation="chunks"):
+            chunks = self.storage.retrieve_many(
+                request.idempotency_key_cache_name,
+                response.get_chunk_keys(encoded_key),
+            )
+        response = response.to_response(encoded_key, chunks)
+        return response is not None, response
+
+    async def _aload_chunks(self, request, encoded_key, key_exists, response):
+        if not isinstance(response, ChunkedResponse):
+            return key_exists, response
+
+        if response.streaming:
+            with self.metrics.timer(
+                request, metrics.STORAGE_SECONDS, operation="chunks"
+            ):
+                return await streaming.aload_stream(
+                    self.storage,
+                    request.idempotency_key_cache_name,
+                    encoded_key,
+                    response,
+                )
+
+        with self.metrics.timer(request, metrics.STORAGE_SECONDS, operation="chunks"):
+            chunks = await self.storage.aretrieve_many(
+                request.idempotency_key_cache_name,
+                response.get_chunk_keys(encoded_key),
+            )
+        response = response.to_response(encoded_key, chunks)
+        return response is not None, response
+
+    def _store_data(self, request, encoded_key, data, ttl):
+        # The TTL is only passed when it has been set so that storage classes written
+        # before TTLs were supported continue to work.
+        kwargs = {} if ttl is None else {"ttl": ttl}
+        with self.metrics.timer(request, metrics.STORAGE_SECONDS, operation="store"):
+            self.storage.store_data(
+                request.idempotency_key_cache_name, encoded_key, data, **kwargs
+            )
+
+    async def _astore_data(self, request, encoded_key, data, ttl):
+        with self.metrics.timer(request, metrics.STORAGE_SECONDS, operation="store"):
+            await self.storage.astore_data(
+                request.idempotency_key_cache_name, encoded_key, data, ttl
+            )
+
+    def _waited_response(self, request, key_exists, response):
+        if key_exists and not isinstance(response, InFlight):
+            request.idempotency_key_in_flight = False
+            return self._replay_response(request, response)
+
+        # Either the first request did not store a response or it was not stored in
+        # time.
+        return request_in_flight(
+            request, None, status_code=utils.get_settings().reservation_status_code
+        )
+
+    def wait_for_response(self, request, encoded_key):
+        """
+        Wait (for a bounded amount of time) for the request that reserved the encoded
+        key to store its response. The storage class wakes the request up as soon as
+        the response is stored, see IdempotencyKeyStorage.wait_for_data. If no response
+        is stored in time then an in-flight error response is returned so that the view
+        function is never run twice.
+        """
+        timeout = utils.get_settings().reservation_wait_timeout
+        if timeout <= 0:
+            return self._waited_response(request, True, InFlight())
+
+        with self.metrics.timer(request, metrics.STORAGE_SECONDS, operation="wait"):
+            key_exists, response = self.storage.wait_for_data(
+                request.idempotency_key_cache_name, encoded_key, timeout
+            )
+        key_exists, response = self._load_chunks(
+            request, encoded_key, key_exists, response
+        )
+        return self._waited_response(request, key_exists, response)
+
+    async def await_for_response(self, request, encoded_key):
+        """
+        Asynchronous version of wait_for_response.
+        """
+        timeout = utils.get_settings().reservation_wait_timeout
+        if timeout <= 0:
+            return self._waited_response(request, True, InFlight())
+
+        with self.metrics.timer(request, metrics.STORAGE_SECONDS, operation="wait"):
+            key_exists, response = await self.storage.await_for_data(
+                request.idempotency_key_cache_name, encoded_key, timeout
+            )
+        key_exists, response = await self._aload_chunks(
+            request, encoded_key, key_exists, response
+        )
+        return self._waited_response(request, key_exists, response)
+
+    def _release_reservation(self, request):
+        """
+        Remove the in-flight marker stored by this request if the response is not
+        going to replace it.
+        """
+        if getattr(request, "idempotency_key_reserved", False):
+            self.storage.delete_data(
+                request.idempotency_key_cache_name, request.idempotency_key_encoded_key
+            )
+            request.idempotency_key_reserved = False
+
+    async def _arelease_reservation(self, request):
+        if getattr(request, "idempotency_key_reserved", False):
+            await self.storage.adelete_data(
+                request.idempotency_key_cache_name, request.idempotency_key_encoded_key
+            )
+            request.idempotency_key_reserved = False
+
+    @staticmethod
+    def _get_lock_args(request, encoded_key):
+        """
+        Returns the arguments passed to the lock's acquire/release functions so that
+        only requests that share the same lock name contend with each other.
+        """
+        mode = utils.get_settings().lock_mode
+        if mode == utils.LOCK_MODE_CACHE_NAME:
+            return (request.idempotency_key_cache_name,)
+        if mode == utils.LOCK_MODE_KEY:
+            return ("{}:{}".format(request.idempotency_key_cache_name, encoded_key),)
+        return ()
+
+    def _use_lock(self, request):
+        conf = utils.get_settings()
+        if not conf.lock_enable:
+            return False
+
+        # A key reserved atomically by the storage class cannot be reserved by a
+        # concurrent request so the lock would only add a round trip.
+        return not (
+            conf.reservation_enable
+            and self.storage.reserves_atomically(request.idempotency_key_cache_name)
+        )
+
     def generate_response(self, request, encoded_key, lock=None):
         if lock is None:
-            lock = utils.get_lock_enable()
+            lock = self._use_lock(request)
+
+        request.idempotency_key_in_flight = False
 
         if not lock:
-            return self.perform_generate_response(request, encoded_key)
+            response = self.perform_generate_response(request, encoded_key)
+        else:
+            # If there was a timeout for a lock on the storage object then return a
+            # HTTP_423_LOCKED
+            lock_args = self._get_lock_args(request, encoded_key)
+            with self.metrics.timer(request, metrics.LOCK_WAIT_SECONDS):
+                acquired = self.storage_lock.acquire(*lock_args)
+            if not acquired:
+                self.metrics.count(request, metrics.LOCK_TIMEOUTS)
+                return resource_locked(request, None)
+
+            try:
+                response = self.perform_generate_response(request, encoded_key)
+            finally:
+                self.storage_lock.release(*lock_args)
+
+        if request.idempotency_key_in_flight:
+            return self.wait_for_response(request, encoded_key)
 
-        # If there was a timeout for a lock on the storage object then return a
-        # HTTP_423_LOCKED
-        if not self.storage_lock.acquire():
-            return resource_locked(request, None)
+        return response
+
+    async def agenerate_response(self, request, encoded_key, lock=None):
+        if lock is None:
+            lock = self._use_lock(request)
 
-        try:
-            return self.perform_generate_response(request, encoded_key)
-        finally:
-            self.storage_lock.release()
+        request.idempotency_key_in_flight = False
+
+        if not lock:
+            response = await self.aperform_generate_response(request, encoded_key)
+        else:
+            lock_args = self._get_lock_args(request, encoded_key)
+            with self.metrics.timer(request, metrics.LOCK_WAIT_SECONDS):
+                acquired = await self.storage_lock.acquire(*lock_args)
+            if not acquired:
+                self.metrics.count(request, metrics.LOCK_TIMEOUTS)
+                return resource_locked(request, None)
+
+            try:
+                response = await self.aperform_generate_response(request, encoded_key)
+            finally:
+                await self.storage_lock.release(*lock_args)
+
+        if request.idempotency_key_in_flight:
+            return await self.await_for_response(request, encoded_key)
+
+        return response
 
     def process_request(self, request):
-        key = request.META.get(utils.get_header_name())
+        key = request.META.get(utils.get_settings().header_name)
         if key is not None:
             request.META["IDEMPOTENCY_KEY"] = key
 
         # Use this attribute to check that process_view has been called.
         request.idempotency_key_done = False
 
-    def process_view(self, request, callback, _callback_args, _callback_kwargs):
+    def _check_view(self, request, callback):
+        """
+        Sets the idempotency key flags on the request.
+        :return: a tuple of the response to return straight away and the encoded key.
+        If the encoded key is None then no response needs to be generated.
+        """
         self._set_flags_from_callback(request, callback)
 
         # signal the process_view has been called
@@ -131,14 +558,9 @@ class IdempotencyKeyMiddleware:
 
         # Assume that anything defined as 'safe' by RFC7231 is exempt or if exempt is
         # specified directly
-        if request.idempotency_key_exempt or request.method in (
-            "GET",
-            "HEAD",
-            "OPTIONS",
-            "TRACE",
-        ):
+        if request.idempotency_key_exempt or request.method in SAFE_METHODS:
             request.idempotency_key_exempt = True
-            return None
+            return None, None
 
         # At this point the view function is not exempt so mark it as such
         request.idempotency_key_exempt = False
@@ -147,34 +569,42 @@ class IdempotencyKeyMiddleware:
         if key is None:
             if request.idempotency_key_optional:
                 request.idempotency_key_exempt = True
-                return None
-            return self._reject(
+                return None, None
+            response = self._reject(
                 request,
                 "Idempotency key is required and was not specified in the header.",
             )
+            return response, None
 
         # encode the key and add it to the request
-        encoded_key = request.idempotency_key_encoded_key = self.encoder.encode_key(
-            request, key
-        )
+        with self.metrics.timer(request, metrics.ENCODE_SECONDS):
+            encoded_key = self.encoder.encode_key(request, key)
+        request.idempotency_key_encoded_key = encoded_key
+        return None, encoded_key
+
+    def process_view(self, request, callback, _callback_args, _callback_kwargs):
+        response, encoded_key = self._check_view(request, callback)
+        if encoded_key is None:
+            return response
 
         # Generate the response
         return self.generate_response(request, encoded_key)
 
-    def process_response(self, request, response):
+    async def aprocess_view(self, request, callback, _callback_args, _callback_kwargs):
+        response, encoded_key = self._check_view(request, callback)
+        if encoded_key is None:
+            return response
+
+        return await self.agenerate_response(request, encoded_key)
+
+    def _should_store(self, request, response):
+        """
+        Returns True if the response should be stored against the idempotency key.
+        """
         # If the response is not in the 20X range then return the response because at
         # this point protecting it with an idempotency key is meaningless.
-        if response and response.status_code not in [
-            status.HTTP_200_OK,
-            status.HTTP_201_CREATED,
-            status.HTTP_202_ACCEPTED,
-            status.HTTP_203_NON_AUTHORITATIVE_INFORMATION,
-            status.HTTP_204_NO_CONTENT,
-            status.HTTP_205_RESET_CONTENT,
-            status.HTTP_206_PARTIAL_CONTENT,
-            status.HTTP_207_MULTI_STATUS,
-        ]:
-            return response
+        if response and response.status_code not in SUCCESS_STATUSES:
+            return False
 
         # Make sure that process_view is called otherwise the use of idempotency keys
         # will be overridden without us knowing about it.
@@ -187,17 +617,112 @@ class IdempotencyKeyMiddleware:
             )
 
         if getattr(request, "idempotency_key_exempt", True):
-            return response
+            return False
 
-        if request.method not in ("GET", "HEAD", "OPTIONS", "TRACE"):
-            # If the response matches that given by the store_on_statuses function then
-            # store the data
-            if response.status_code in utils.get_storage_store_on_statuses():
-                self.storage.store_data(
-                    request.idempotency_key_cache_name,
+        if request.method in SAFE_METHODS:
+            return False
+
+        # A replayed response is already stored. Storing it again would write another
+        # copy of a streamed or chunked response. A view function using
+        # @idempotency_key_manual that returns a new response still has it stored.
+        if (
+            getattr(request, "idempotency_key_exists", False)
+            and request.idempotency_key_response is response
+        ):
+            return False
+
+        # If the response matches that given by the store_on_statuses function then
+        # store the data
+        return response.status_code in utils.get_settings().storage_store_on_statuses
+
+    def _prepare_stored_data(self, request, response):
+        """
+        Returns the data to store against the encoded key for the response and any
+        chunks that must be stored before it, see the STORAGE.MAX_RESPONSE_BYTES
+        setting. None is returned if nothing is stored.
+        """
+        max_bytes = request.idempotency_key_max_response_bytes
+        # Measuring the response is only worth doing if it is compared with the limit
+        # or the metric is kept
+        if max_bytes is None and not self.metrics.enabled:
+            return response, {}
+
+        size = get_response_size(response)
+        self.metrics.record(request, metrics.STORED_RESPONSE_BYTES, size)
+        if max_bytes is None or size <= max_bytes:
+            return response, {}
+
+        oversize = request.idempotency_key_oversize
+        self.metrics.count(request, metrics.OVERSIZED, action=oversize)
+        # Only the content of an HttpResponse can be hashed or split
+        if isinstance(response, HttpResponse):
+            if oversize == utils.OVERSIZE_MARKER:
+                return ProcessedResponse.from_response(response), {}
+            if oversize == utils.OVERSIZE_CHUNK:
+                return ChunkedResponse.split(
+                    response, request.idempotency_key_encoded_key, max_bytes
+                )
+
+        # The changes made by the view function are rolled back when requests are
+        # atomic, see _should_roll_back.
+        request.idempotency_key_store_skipped = True
+        return None, {}
+
+    def _record_stream(self, request, response):
+        """
+        The content of a streaming response is stored while it is sent to the client,
+        see idempotency_key.streaming. The in-flight marker is replaced or removed
+        once the stream has ended.
+        """
+        streaming.record_stream(self.storage, self.metrics, request, response)
+
+    def process_response(self, request, response):
+        if self._should_store(request, response):
+            if getattr(response, "streaming", False):
+                self._record_stream(request, response)
+                return response
+
+            data, chunks = self._prepare_stored_data(request, response)
+            if data is not None:
+                # The chunks are stored first so that they exist once the response
+                # can be retrieved.
+                for chunk_key, chunk in chunks.items():
+                    self._store_data(
+                        request, chunk_key, chunk, request.idempotency_key_ttl
+                    )
+                self._store_data(
+                    request,
                     request.idempotency_key_encoded_key,
-                    response,
+                    data,
+                    request.idempotency_key_ttl,
                 )
+                request.idempotency_key_reserved = False
+
+        self._release_reservation(request)
+
+        return response
+
+    async def aprocess_response(self, request, response):
+        if self._should_store(request, response):
+            if getattr(response, "streaming", False):
+                self._record_stream(request, response)
+                return response
+
+            data, chunks = self._prepare_stored_data(request, response)
+            if data is not None:
+                for chunk_key, chunk in chunks.items():
+                    await self._astore_data(
+                        request, chunk_key, chunk, request.idempotency_key_ttl
+                    )
+                await self._astore_data(
+                    request,
+                    request.idempotency_key_encoded_key,
+                    data,
+                    request.idempotency_key_ttl,
+                )
+                request.idempotency_key_reserved = False
+
+        await self._arelease_reservation(request)
 
         return response
 
@@ -210,45 +735,16 @@ class ExemptIdempotencyKeyMiddleware(IdempotencyKeyMiddleware):
     decorators.
     """
 
-    def _set_flags_from_callback(self, request, callback):
-        func_name = callback.__name__
-        # If there is an actions attribute then the function is wrapped in a DRF viewset
-        if hasattr(callback, "actions"):
-            actual_func_name = callback.actions.get(request.method.lower())
-            # if for some reason the method is not available in the viewset then just
-            # proceed as normal and let the framework handle the problem.
-            if actual_func_name is not None:
-                func_name = actual_func_name
-
-                # get a reference to the function to access any attributes we might be
-                # interested in.
-                callback = getattr(callback.cls, func_name, callback)
-
-        idempotency_key = getattr(callback, "idempotency_key", False)
-        idempotency_key_optional = getattr(callback, "idempotency_key_optional", False)
-        idempotency_key_exempt = getattr(callback, "idempotency_key_exempt", None)
-        idempotency_key_manual = getattr(callback, "idempotency_key_manual", False)
-        idempotency_key_cache_name = getattr(
-            callback, "idempotency_key_cache_name", utils.get_storage_cache_name()
-        )
-
-        if idempotency_key and idempotency_key_exempt:
-            raise DecoratorsMutuallyExclusiveError(
-                "@idempotency_key and @idempotency_key_exempt decorators are mutually "
-                'exclusive for function "{}"'.format(func_name)
-            )
-
-        if idempotency_key_manual and idempotency_key_exempt:
-            raise DecoratorsMutuallyExclusiveError(
-                "@idempotency_key_manual and @idempotency_key_exempt decorators are "
-                'mutually exclusive for function "{}"'.format(func_name)
-            )
-
-        request.idempotency_key_optional = idempotency_key_optional
-        request.idempotency_key_exempt = idempotency_key_exempt or (
-            idempotency_key_exempt is None
-            and not idempotency_key_manual
-            and not idempotency_key
+    @staticmethod
+    def _is_exempt(callback) -> bool:
+        """
+        View functions are exempt unless they use @idempotency_key or
+        @idempotency_key_manual.
+        """
+        exempt = getattr(callback, "idempotency_key_exempt", None)
+        if exempt is not None:
+            return exempt
+        return not (
+            getattr(callback, "idempotency_key", False)
+            or getattr(callback, "idempotency_key_manual", False)
         )
-        request.idempotency_key_manual = idempotency_key_manual
-        request.idempotency_key_cache_name = idempotency_key_cache_name
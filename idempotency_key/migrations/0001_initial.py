@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:47
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="IdempotencyKey",
+            fields=[
+                (
+                    "key",
+                    models.CharField(max_length=255, primary_key=True, serialize=False),
+                ),
+                ("cache_name", models.CharField(max_length=255)),
+                (
+                    "status",
+                    models.PositiveSmallIntegerField(
+                        choices=[(0, "In flight"), (1, "Stored")], default=1
+                    ),
+                ),
+                ("response", models.BinaryField(null=True)),
+                ("created", models.DateTimeField(default=django.utils.timezone.now)),
+                ("expires", models.DateTimeField(blank=True, db_index=True, null=True)),
+            ],
+            options={
+                "verbose_name": "idempotency key",
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+from django.db import models
+from django.utils import timezone
+
+
+class IdempotencyKey(models.Model):
+    """
+    A response stored by DatabaseKeyStorage, or the in-flight marker stored while the
+    first request using the key is being processed.
+    """
+
+    STATUS_IN_FLIGHT = 0
+    STATUS_STORED = 1
+    STATUS_CHOICES = (
+        (STATUS_IN_FLIGHT, "In flight"),
+        (STATUS_STORED, "Stored"),
+    )
+
+    # The cache name and the encoded key separated by a colon. Reserving a key relies
+    # on the primary key being unique.
+    key = models.CharField(max_length=255, primary_key=True)
+    cache_name = models.CharField(max_length=255)
+    status = models.PositiveSmallIntegerField(
+        choices=STATUS_CHOICES, default=STATUS_STORED
+    )
+    # The serialized response, None while the key is in flight.
+    response = models.BinaryField(null=True)
+    created = models.DateTimeField(default=timezone.now)
+    # None if the response never expires.
+    expires = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        verbose_name = "idempotency key"
+
+    def __str__(self):
+        return self.key
@@ -0,0 +1,118 @@
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+from django.urls import URLResolver, get_resolver
+
+from idempotency_key import utils
+
+# Methods that a view function's policy is resolved for when warming up the
+# middleware. Safe methods are always exempt so they do not need a policy.
+WARM_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+
+
+@dataclass(frozen=True)
+class ViewPolicy:
+    """
+    How the idempotency key middleware handles requests for a view function and HTTP
+    method. This is resolved from the view function's decorators once and then reused
+    for every request.
+    """
+
+    optional: bool
+    exempt: bool
+    manual: bool
+    cache_name: str
+    ttl: Optional[float]
+    # The size limit of a stored response and what is stored when it is exceeded
+    max_response_bytes: Optional[int] = None
+    oversize: str = utils.OVERSIZE_SKIP
+    # The name of the view function used to label metrics
+    view_name: str = ""
+
+
+class PolicyRegistry:
+    """
+    Keeps the policy of each (view function, HTTP method) pair so that it is only
+    resolved once. The policies are discarded when the settings change.
+    """
+
+    def __init__(self):
+        self.policies = {}
+        self.settings = None
+
+    def get(self, callback, method, resolve) -> ViewPolicy:
+        """
+        Returns the policy for a view function and HTTP method.
+        :param callback: The view function
+        :param method: The HTTP method
+        :param resolve: Function called with the callback and method to resolve the
+                        policy if it is not already known
+        """
+        conf = utils.get_settings()
+        if self.settings is not conf:
+            self.clear()
+            self.settings = conf
+
+        try:
+            return self.policies[(callback, method)]
+        except KeyError:
+            policy = self.policies[(callback, method)] = resolve(callback, method)
+            return policy
+
+    def clear(self):
+        self.policies = {}
+
+
+# The policy registry of each middleware class
+_registries = {}
+
+
+def get_registry(middleware_class) -> PolicyRegistry:
+    try:
+        return _registries[middleware_class]
+    except KeyError:
+        return _registries.setdefault(middleware_class, PolicyRegistry())
+
+
+def get_view_name(callback) -> str:
+    return getattr(callback, "__name__", repr(callback))
+
+
+def get_view_label(callback, action=None) -> str:
+    """
+    Returns the name of a view function used to label metrics. Class based views are
+    named after their class and DRF viewsets after the viewset and the action.
+    """
+    view_class = getattr(callback, "cls", None) or getattr(callback, "view_class", None)
+    if view_class is None:
+        return get_view_name(callback)
+    if action is not None:
+        return "{}.{}".format(view_class.__name__, action)
+    return view_class.__name__
+
+
+def iter_callbacks(urlconf=None) -> Iterator[object]:
+    """
+    Yields the view function of every URL pattern in the URLconf.
+    :param urlconf: The URLconf module or its name. Defaults to ROOT_URLCONF
+    """
+    yield from _iter_pattern_callbacks(get_resolver(urlconf).url_patterns)
+
+
+def _iter_pattern_callbacks(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from _iter_pattern_callbacks(pattern.url_patterns)
+        else:
+            yield pattern.callback
+
+
+def get_callback_methods(callback):
+    """
+    Returns the HTTP methods that a policy needs to be resolved for when warming up.
+    """
+    # DRF viewsets map each HTTP method to a different function
+    actions = getattr(callback, "actions", None)
+    if actions:
+        return [method.upper() for method in actions]
+    return WARM_METHODS
@@ -0,0 +1,264 @@
+import abc
+import json
+import pickle
+import struct
+import zlib
+from collections import namedtuple
+
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
+
+from idempotency_key import utils
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # pragma: no cover
+    lz4_frame = None
+
+# The first byte of the serialized data identifies the format that was used to write
+# it so that data written by one serializer can be read by any other. This allows the
+# serializer to be changed without flushing the storage. Anything that does not start
+# with one of the bytes below is a pickle.
+COMPACT_FORMAT = b"C"
+MSGPACK_FORMAT = b"M"
+# Compressed data is one of the bytes below followed by the compressed data of one of
+# the formats above.
+ZLIB_FORMAT = b"Z"
+ZSTD_FORMAT = b"S"
+LZ4_FORMAT = b"L"
+
+# Status code and length of the encoded headers that follow the format byte.
+_COMPACT_HEADER = struct.Struct("!HI")
+
+
+Codec = namedtuple(
+    "Codec", ["name", "data_format", "package", "compress", "decompress"]
+)
+
+
+def _zlib_compress(data, level):
+    return zlib.compress(data, -1 if level is None else level)
+
+
+def _zstd_compress(data, level):
+    return zstandard.ZstdCompressor(level=3 if level is None else level).compress(data)
+
+
+def _zstd_decompress(data):
+    return zstandard.ZstdDecompressor().decompress(data)
+
+
+def _lz4_compress(data, level):
+    return lz4_frame.compress(data, compression_level=level or 0)
+
+
+def _lz4_decompress(data):
+    return lz4_frame.decompress(data)
+
+
+_CODECS = {
+    utils.COMPRESSION_ZLIB: Codec(
+        utils.COMPRESSION_ZLIB,
+        ZLIB_FORMAT,
+        None,
+        _zlib_compress,
+        zlib.decompress,
+    ),
+    utils.COMPRESSION_ZSTD: Codec(
+        utils.COMPRESSION_ZSTD,
+        ZSTD_FORMAT,
+        "zstandard",
+        _zstd_compress,
+        _zstd_decompress,
+    ),
+    utils.COMPRESSION_LZ4: Codec(
+        utils.COMPRESSION_LZ4, LZ4_FORMAT, "lz4", _lz4_compress, _lz4_decompress
+    ),
+}
+
+_CODECS_BY_FORMAT = {codec.data_format: codec for codec in _CODECS.values()}
+
+
+def _is_installed(codec):
+    if codec.data_format == ZSTD_FORMAT:
+        return zstandard is not None
+    if codec.data_format == LZ4_FORMAT:
+        return lz4_frame is not None
+    return True
+
+
+class IdempotencyKeySerializer(object):
+    """
+    Subclasses implement serialize. The data it returns is compressed when the
+    STORAGE.COMPRESSION setting is used and the data is at least
+    STORAGE.COMPRESSION_MIN_BYTES long.
+    """
+
+    def __init__(self):
+        self.compression = utils.get_storage_compression()
+        self.compression_min_bytes = utils.get_storage_compression_min_bytes()
+        self.compression_level = utils.get_storage_compression_level()
+        self.codec = None
+        if self.compression is not None:
+            self.codec = _CODECS.get(self.compression)
+            if self.codec is None:
+                raise ImproperlyConfigured(
+                    "IDEMPOTENCY_KEY['STORAGE']['COMPRESSION'] must be one of: "
+                    "{}".format(", ".join(utils.COMPRESSIONS))
+                )
+            if not _is_installed(self.codec):
+                raise ImproperlyConfigured(
+                    "The {} package must be installed to use {} compression.".format(
+                        self.codec.package, self.compression
+                    )
+                )
+
+    def dumps(self, response: object) -> bytes:
+        """
+        Convert a response into bytes so that it can be stored.
+        :param response: The response to convert
+        :return: the serialized and possibly compressed response
+        """
+        return self.compress(self.serialize(response))
+
+    @abc.abstractmethod
+    def serialize(self, response: object) -> bytes:
+        """
+        Convert a response into bytes in one of the formats of this module.
+        :param response: The response to convert
+        :return: the serialized response
+        """
+        raise NotImplementedError
+
+    def compress(self, data: bytes) -> bytes:
+        if self.codec is None or len(data) < self.compression_min_bytes:
+            return data
+        compressed = self.codec.compress(data, self.compression_level)
+        # Data that does not compress is stored as it is
+        if len(compressed) + 1 >= len(data):
+            return data
+        return self.codec.data_format + compressed
+
+    def loads(self, data: bytes) -> object:
+        """
+        Convert stored bytes back into a response. Data written by any of the
+        serializers in this module can be read.
+        :param data: The serialized response
+        :return: the response
+        """
+        return loads(data)
+
+
+class PickleSerializer(IdempotencyKeySerializer):
+    """
+    Pickles the whole response object.
+    """
+
+    def serialize(self, response: object) -> bytes:
+        return pickle.dumps(response)
+
+
+def get_stored_headers(response: HttpResponse) -> list:
+    """
+    Returns the names and values of the headers of a response that are listed in the
+    STORAGE.STORE_HEADERS setting.
+    """
+    return [
+        [name, response[name]]
+        for name in utils.get_settings().storage_store_headers
+        if response.has_header(name)
+    ]
+
+
+class CompactSerializer(IdempotencyKeySerializer):
+    """
+    Stores only the status code, the headers listed in the STORE_HEADERS setting and
+    the rendered content of a response. An HttpResponse is rebuilt from these when the
+    data is loaded. Anything that is not an HttpResponse is pickled.
+    """
+
+    def serialize(self, response: object) -> bytes:
+        if not isinstance(response, HttpResponse):
+            return pickle.dumps(response)
+
+        headers = json.dumps(get_stored_headers(response)).encode("UTF-8")
+        return b"".join(
+            [
+                COMPACT_FORMAT,
+                _COMPACT_HEADER.pack(response.status_code, len(headers)),
+                headers,
+                response.content,
+            ]
+        )
+
+
+class MsgpackSerializer(CompactSerializer):
+    """
+    Stores the same information as the CompactSerializer using msgpack's binary
+    encoding. Requires the msgpack package to be installed.
+    """
+
+    def __init__(self):
+        if msgpack is None:
+            raise ImproperlyConfigured(
+                "The msgpack package must be installed to use MsgpackSerializer."
+            )
+        super().__init__()
+
+    def serialize(self, response: object) -> bytes:
+        if not isinstance(response, HttpResponse):
+            return pickle.dumps(response)
+
+        return MSGPACK_FORMAT + msgpack.packb(
+            [response.status_code, get_stored_headers(response), response.content],
+            use_bin_type=True,
+        )
+
+
+def _build_response(status_code, headers, content):
+    response = HttpResponse(content, status=status_code)
+    for name, value in headers:
+        response[name] = value
+    return response
+
+
+def loads(data: bytes) -> object:
+    """
+    Load data written by any of the serializers in this module.
+    """
+    data_format = data[:1]
+
+    codec = _CODECS_BY_FORMAT.get(data_format)
+    if codec is not None:
+        if not _is_installed(codec):
+            raise ImproperlyConfigured(
+                "The {} package must be installed to load data stored with {} "
+                "compression.".format(codec.package, codec.name)
+            )
+        return loads(codec.decompress(data[1:]))
+
+    if data_format == COMPACT_FORMAT:
+        status_code, headers_length = _COMPACT_HEADER.unpack_from(data, 1)
+        start = 1 + _COMPACT_HEADER.size
+        end = start + headers_length
+        return _build_response(status_code, json.loads(data[start:end]), data[end:])
+
+    if data_format == MSGPACK_FORMAT:
+        if msgpack is None:
+            raise ImproperlyConfigured(
+                "The msgpack package must be installed to load data stored by "
+                "MsgpackSerializer."
+            )
+        return _build_response(*msgpack.unpackb(data[1:], raw=False))
+
+    return pickle.loads(data)
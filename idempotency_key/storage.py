@@ -1,19 +1,247 @@
 import abc
-import pickle
-from collections import defaultdict
-from typing import Tuple
+import asyncio
+import base64
+import contextlib
+import functools
+import hashlib
+import logging
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict, defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional, Tuple
 
 from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.memcached import BaseMemcachedCache
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+
+from idempotency_key import connections, utils
+from idempotency_key.compat import sync_to_async
+from idempotency_key.serializers import get_stored_headers
+
+# Returned by the cache when a key does not exist so that a stored value can be told
+# apart from a missing one with a single lookup.
+_MISSING = object()
+
+# Stored by TieredKeyStorage in its local cache to remember that a key does not exist.
+_NOT_FOUND = object()
+
+# The number of times CacheKeyStorage tries to add the in-flight marker when the key
+# exists but cannot be read. If the cache keeps failing (i.e. when the server is down
+# and django-redis's IGNORE_EXCEPTIONS option is set) the key is treated as missing.
+_RESERVE_ATTEMPTS = 2
+
+logger = logging.getLogger("django-idempotency-key.idempotency_key.storage")
+
+
+def get_response_size(response: object) -> int:
+    """
+    Returns the size of a response in bytes. The content length is used for responses
+    otherwise the size of the object itself.
+    """
+    if isinstance(response, (bytes, str)):
+        return len(response)
+    if isinstance(response, HttpResponse):
+        return len(response.content)
+    return sys.getsizeof(response)
+
+
+@functools.lru_cache(maxsize=None)
+def get_atomic_add_backends() -> tuple:
+    """
+    Returns the django cache backend classes whose add function is atomic across
+    processes (or, for LocMemCache, across the threads of the only process that can
+    see the data).
+    """
+    backends = [LocMemCache, BaseMemcachedCache]
+    try:
+        from django.core.cache.backends.redis import RedisCache
+    except ImportError:  # pragma: no cover - django < 4.0
+        pass
+    else:
+        backends.append(RedisCache)
+    try:
+        from django_redis.cache import RedisCache as DjangoRedisCache
+    except ImportError:  # pragma: no cover
+        pass
+    else:
+        backends.append(DjangoRedisCache)
+    return tuple(backends)
+
+
+class InFlight(object):
+    """
+    Stored against an encoded key while the first request using that key is being
+    processed. It is replaced by the response once the request has finished.
+    """
+
+    def __eq__(self, other):
+        return isinstance(other, InFlight)
+
+    def __hash__(self):
+        return hash(InFlight)
+
+
+class ProcessedResponse(object):
+    """
+    Stored in place of a response that was too large to store when the
+    STORAGE.OVERSIZE setting is "marker". A repeated request is told that the original
+    request was processed by a response with the original status code, no content and
+    a hash of the original content in the Idempotency-Key-Digest header.
+    """
+
+    DIGEST_HEADER = "Idempotency-Key-Digest"
+
+    def __init__(self, status_code: int, digest: str):
+        self.status_code = status_code
+        self.digest = digest
+
+    @classmethod
+    def from_response(cls, response: HttpResponse) -> "ProcessedResponse":
+        return cls.from_digest(response.status_code, hashlib.sha256(response.content))
+
+    @classmethod
+    def from_digest(cls, status_code: int, digest) -> "ProcessedResponse":
+        """
+        :param digest: a hashlib sha256 object that the content has been added to
+        """
+        value = base64.b64encode(digest.digest()).decode()
+        return cls(status_code, "sha-256=:{}:".format(value))
+
+    def to_response(self) -> HttpResponse:
+        response = HttpResponse(status=self.status_code)
+        response[self.DIGEST_HEADER] = self.digest
+        return response
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, ProcessedResponse)
+            and self.status_code == other.status_code
+            and self.digest == other.digest
+        )
+
+    def __hash__(self):
+        return hash((self.status_code, self.digest))
+
+
+class ChunkedResponse(object):
+    """
+    Stored in place of a response that was too large to store when the
+    STORAGE.OVERSIZE setting is "chunk". The content is stored in chunks of at most
+    STORAGE.MAX_RESPONSE_BYTES, this object keeps the status code, the headers listed
+    in STORAGE.STORE_HEADERS and the number of chunks.
+
+    The chunk keys start with a key prefix that is unique to the request that stored
+    them so that two requests with the same key (when reservations are not enabled)
+    cannot mix their chunks.
+
+    Streaming responses are always stored in chunks (see idempotency_key.streaming) and
+    are streamed from the storage class when they are replayed.
+    """
+
+    # Defaults for objects stored before these attributes were added
+    key_prefix = None
+    streaming = False
+
+    def __init__(
+        self,
+        status_code: int,
+        headers: list,
+        chunk_count: int,
+        key_prefix: Optional[str] = None,
+        streaming: bool = False,
+    ):
+        self.status_code = status_code
+        self.headers = headers
+        self.chunk_count = chunk_count
+        self.key_prefix = key_prefix
+        self.streaming = streaming
+
+    @staticmethod
+    def new_key_prefix(encoded_key: str) -> str:
+        return "{}:{}".format(encoded_key, uuid.uuid4().hex)
+
+    @staticmethod
+    def get_chunk_key(encoded_key: str, index: int) -> str:
+        return "{}:chunk:{}".format(encoded_key, index)
+
+    def get_chunk_keys(self, encoded_key: str) -> list:
+        # Objects stored before key_prefix was added use the encoded key
+        prefix = encoded_key if self.key_prefix is None else self.key_prefix
+        return [self.get_chunk_key(prefix, i) for i in range(self.chunk_count)]
+
+    @classmethod
+    def split(
+        cls, response: HttpResponse, encoded_key: str, chunk_size: int
+    ) -> Tuple["ChunkedResponse", Dict[str, bytes]]:
+        """
+        Split the content of a response into chunks.
+        :return: the object to store against the encoded key and the chunks to store
+                 against each chunk key
+        """
+        content = response.content
+        key_prefix = cls.new_key_prefix(encoded_key)
+        chunks = {
+            cls.get_chunk_key(key_prefix, i): content[start : start + chunk_size]
+            for i, start in enumerate(range(0, len(content), chunk_size))
+        }
+        headers = get_stored_headers(response)
+        chunked_response = cls(
+            response.status_code, headers, len(chunks), key_prefix=key_prefix
+        )
+        return chunked_response, chunks
+
+    def to_response(
+        self, encoded_key: str, chunks: Dict[str, bytes]
+    ) -> Optional[HttpResponse]:
+        """
+        Rebuild the response from the chunks returned by retrieve_many.
+        :return: the response or None if any of the chunks has expired
+        """
+        try:
+            content = b"".join(chunks[key] for key in self.get_chunk_keys(encoded_key))
+        except KeyError:
+            return None
+
+        return self._set_headers(HttpResponse(content, status=self.status_code))
+
+    def to_streaming_response(self, streaming_content) -> StreamingHttpResponse:
+        """
+        :param streaming_content: an iterator or asynchronous iterator of the chunks
+        """
+        return self._set_headers(
+            StreamingHttpResponse(streaming_content, status=self.status_code)
+        )
+
+    def _set_headers(self, response):
+        for name, value in self.headers:
+            response[name] = value
+        return response
 
 
 class IdempotencyKeyStorage(object):
     @abc.abstractmethod
-    def store_data(self, cache_name: str, encoded_key: str, response: object) -> None:
+    def store_data(
+        self,
+        cache_name: str,
+        encoded_key: str,
+        response: object,
+        ttl: Optional[float] = None,
+    ) -> None:
         """
         called when data should be stored in the storage medium
         :param cache_name: The name of the cache to use defined in settings under CACHES
         :param encoded_key: the key used to store the response data under
         :param response: The response data to store
+        :param ttl: The number of seconds the data should be kept for. If None then the
+                    storage medium's default is used. This argument is only passed when
+                    a TTL has been configured.
         :return: None
         """
         raise NotImplementedError
@@ -28,6 +256,203 @@ class IdempotencyKeyStorage(object):
         """
         raise NotImplementedError
 
+    def retrieve_many(
+        self, cache_name: str, encoded_keys: Iterable[str]
+    ) -> Dict[str, object]:
+        """
+        Retrieve data from the store for several keys at once. Storage classes that
+        can fetch several keys in one operation should override this function.
+        :param cache_name: The name of the cache to use defined in settings under CACHES
+        :param encoded_keys: The keys that were used to store the response data
+        :return: a dictionary of the response data for each key that exists
+        """
+        found = dict()
+        for encoded_key in encoded_keys:
+            key_exists, response = self.retrieve_data(cache_name, encoded_key)
+            if key_exists:
+                found[encoded_key] = response
+        return found
+
+    def reserve_data(
+        self, cache_name: str, encoded_key: str, ttl: Optional[float] = None
+    ) -> Tuple[bool, object]:
+        """
+        Retrieve the data stored against the key and, if there is none, store an
+        in-flight marker in its place. Storage classes that can do this atomically in a
+        single operation should override this function.
+        :param cache_name: The name of the cache to use defined in settings under CACHES
+        :param encoded_key: The key to reserve
+        :param ttl: The number of seconds the in-flight marker should be kept for
+        :return: the same as retrieve_data. If the key did not exist then it has been
+                 reserved.
+        """
+        key_exists, response = self.retrieve_data(cache_name, encoded_key)
+        if not key_exists:
+            kwargs = {} if ttl is None else {"ttl": ttl}
+            self.store_data(cache_name, encoded_key, InFlight(), **kwargs)
+        return key_exists, response
+
+    def wait_for_data(
+        self, cache_name: str, encoded_key: str, timeout: float
+    ) -> Tuple[bool, object]:
+        """
+        Wait until the in-flight marker stored against the key is replaced or removed.
+        This polls retrieve_data every RESERVATION.POLL_INTERVAL seconds. Storage
+        classes that can be told when data is stored should override this function so
+        that waiting requests wake up as soon as the response is stored.
+        :param cache_name: The name of the cache to use defined in settings under CACHES
+        :param encoded_key: The key to wait for
+        :param timeout: The maximum number of seconds to wait
+        :return: the same as retrieve_data. The in-flight marker is returned if it is
+                 still stored when the timeout passes.
+        """
+        poll_interval = utils.get_settings().reservation_poll_interval
+        deadline = time.monotonic() + timeout
+        remaining = timeout
+        while remaining > 0:
+            time.sleep(min(poll_interval, remaining))
+            key_exists, response = self.retrieve_data(cache_name, encoded_key)
+            if not key_exists or not isinstance(response, InFlight):
+                return key_exists, response
+            remaining = deadline - time.monotonic()
+        return True, InFlight()
+
+    def get_ttl(self, cache_name: str, encoded_key: str) -> Optional[float]:
+        """
+        Returns the number of seconds until the data stored against the key expires.
+        TieredKeyStorage uses this so that L1 does not keep a response for longer than
+        the storage class it is in front of. Storage classes that cannot tell return
+        None.
+        :param cache_name: The name of the cache to use defined in settings under CACHES
+        :param encoded_key: The key that was used to store the data
+        :return: the number of seconds, 0 if the key does not exist or None if the data
+                 does not expire or the time is not known
+        """
+        return None
+
+    @abc.abstractmethod
+    def delete_data(self, cache_name: str, encoded_key: str) -> None:
+        """
+        Remove data from the store. This is used to remove an in-flight marker when
+        the request that stored it did not produce a response that can be stored.
+        :param cache_name: The name of the cache to use defined in settings under CACHES
+        :param encoded_key: The key that was used to store the data
+        :return: None
+        """
+        raise NotImplementedError
+
+    async def aretrieve_data(
+        self, cache_name: str, encoded_key: str
+    ) -> Tuple[bool, object]:
+        """
+        Asynchronous version of retrieve_data used when the middleware is running
+        asynchronously. By default retrieve_data is run in a thread, storage classes
+        that can retrieve data without blocking should override this function.
+        """
+        return await sync_to_async(self.retrieve_data)(cache_name, encoded_key)
+
+    async def aretrieve_many(
+        self, cache_name: str, encoded_keys: Iterable[str]
+    ) -> Dict[str, object]:
+        """
+        Asynchronous version of retrieve_many, see aretrieve_data.
+        """
+        return await sync_to_async(self.retrieve_many)(cache_name, encoded_keys)
+
+    async def astore_data(
+        self,
+        cache_name: str,
+        encoded_key: str,
+        response: object,
+        ttl: Optional[float] = None,
+    ) -> None:
+        """
+        Asynchronous version of store_data, see aretrieve_data.
+        """
+        kwargs = {} if ttl is None else {"ttl": ttl}
+        await sync_to_async(self.store_data)(
+            cache_name, encoded_key, response, **kwargs
+        )
+
+    async def areserve_data(
+        self, cache_name: str, encoded_key: str, ttl: Optional[float] = None
+    ) -> Tuple[bool, object]:
+        """
+        Asynchronous version of reserve_data, see aretrieve_data.
+        """
+        key_exists, response = await self.aretrieve_data(cache_name, encoded_key)
+        if not key_exists:
+            await self.astore_data(cache_name, encoded_key, InFlight(), ttl)
+        return key_exists, response
+
+    async def await_for_data(
+        self, cache_name: str, encoded_key: str, timeout: float
+    ) -> Tuple[bool, object]:
+        """
+        Asynchronous version of wait_for_data. By default wait_for_data is run in a
+        thread of its own so that neither the event loop nor the thread used for
+        synchronous code is blocked while waiting. Storage classes that can retrieve
+        data without blocking can override this function to call _apoll_for_data.
+        """
+        return await sync_to_async(self.wait_for_data, thread_sensitive=False)(
+            cache_name, encoded_key, timeout
+        )
+
+    async def _apoll_for_data(
+        self, cache_name: str, encoded_key: str, timeout: float
+    ) -> Tuple[bool, object]:
+        """
+        Polls aretrieve_data every RESERVATION.POLL_INTERVAL seconds, see
+        wait_for_data.
+        """
+        poll_interval = utils.get_settings().reservation_poll_interval
+        deadline = time.monotonic() + timeout
+        remaining = timeout
+        while remaining > 0:
+            await asyncio.sleep(min(poll_interval, remaining))
+            key_exists, response = await self.aretrieve_data(cache_name, encoded_key)
+            if not key_exists or not isinstance(response, InFlight):
+                return key_exists, response
+            remaining = deadline - time.monotonic()
+        return True, InFlight()
+
+    async def aget_ttl(self, cache_name: str, encoded_key: str) -> Optional[float]:
+        """
+        Asynchronous version of get_ttl, see aretrieve_data.
+        """
+        return await sync_to_async(self.get_ttl)(cache_name, encoded_key)
+
+    async def adelete_data(self, cache_name: str, encoded_key: str) -> None:
+        """
+        Asynchronous version of delete_data, see aretrieve_data.
+        """
+        await sync_to_async(self.delete_data)(cache_name, encoded_key)
+
+    def reserves_atomically(self, cache_name: str) -> bool:
+        """
+        Returns True if reserve_data checks for and stores the in-flight marker in a
+        single atomic operation for the given cache name. The middleware does not use
+        the lock while reserving keys with a storage class that does.
+        :param cache_name: The name of the cache to use defined in settings under CACHES
+        """
+        return False
+
+    def atomic(self):
+        """
+        Returns the context manager that the middleware handles each request with an
+        unsafe HTTP method in. Storage classes that keep responses in a database can
+        use this to store the response in the same transaction as the changes made by
+        the view function.
+        """
+        return contextlib.nullcontext()
+
+    def set_rollback(self) -> None:
+        """
+        Called inside the atomic context when the response is not going to be stored
+        so that the changes made by the view function are rolled back.
+        """
+        pass
+
     @staticmethod
     @abc.abstractmethod
     def validate_storage(name: str):
@@ -42,39 +467,998 @@ class IdempotencyKeyStorage(object):
 
 
 class MemoryKeyStorage(IdempotencyKeyStorage):
-    def __init__(self):
-        self.idempotency_key_cache_data = defaultdict(dict)
+    """
+    Stores responses in the memory of the current process. The number of entries and
+    the number of response content bytes kept for each cache name can be limited using
+    the MAX_ENTRIES and MAX_BYTES settings, in which case the least recently used
+    entries are evicted first.
+    """
+
+    def __init__(
+        self, max_entries: Optional[int] = None, max_bytes: Optional[int] = None
+    ):
+        self.max_entries = (
+            utils.get_storage_max_entries() if max_entries is None else max_entries
+        )
+        self.max_bytes = (
+            utils.get_storage_max_bytes() if max_bytes is None else max_bytes
+        )
+
+        # Entries are kept in least recently used order
+        self.idempotency_key_cache_data = defaultdict(OrderedDict)
+        # The time (from time.monotonic) at which each key with a TTL expires
+        self.idempotency_key_expiry = defaultdict(dict)
+        # The size of each entry and the total size of each cache when MAX_BYTES is set
+        self.idempotency_key_sizes = defaultdict(dict)
+        self.idempotency_key_bytes = Counter()
+
+        # The number of entries removed from each cache to keep within the limits and
+        # because their TTL had passed.
+        self.evictions = Counter()
+        self.expirations = Counter()
+
+        self._lock = threading.RLock()
+        # Conditions that requests waiting for a key are notified on, and the number of
+        # requests waiting for each key.
+        self._conditions = {}
+        self._waiting = Counter()
 
-    def store_data(self, cache_name: str, encoded_key: str, response: object) -> None:
-        self.idempotency_key_cache_data[cache_name][encoded_key] = response
+    def store_data(
+        self,
+        cache_name: str,
+        encoded_key: str,
+        response: object,
+        ttl: Optional[float] = None,
+    ) -> None:
+        # Only pay for measuring the response when there is a limit on the size
+        size = 0 if self.max_bytes is None else get_response_size(response)
+
+        with self._lock:
+            self._remove(cache_name, encoded_key)
+            self.idempotency_key_cache_data[cache_name][encoded_key] = response
+            if ttl is not None:
+                self.idempotency_key_expiry[cache_name][encoded_key] = (
+                    time.monotonic() + ttl
+                )
+            if size:
+                self.idempotency_key_sizes[cache_name][encoded_key] = size
+                self.idempotency_key_bytes[cache_name] += size
+            self._evict(cache_name)
+            if not isinstance(response, InFlight):
+                self._notify(cache_name, encoded_key)
 
     def retrieve_data(self, cache_name: str, encoded_key: str) -> Tuple[bool, object]:
-        the_cache = self.idempotency_key_cache_data.get(cache_name)
-        if the_cache and encoded_key in the_cache.keys():
-            return True, the_cache[encoded_key]
+        with self._lock:
+            the_cache = self.idempotency_key_cache_data.get(cache_name)
+            if the_cache and encoded_key in the_cache.keys():
+                if self._expired(cache_name, encoded_key, time.monotonic()):
+                    self._remove(cache_name, encoded_key)
+                    self.expirations[cache_name] += 1
+                    return False, None
+
+                the_cache.move_to_end(encoded_key)
+                return True, the_cache[encoded_key]
 
         return False, None
 
+    def reserve_data(
+        self, cache_name: str, encoded_key: str, ttl: Optional[float] = None
+    ) -> Tuple[bool, object]:
+        # The lock makes retrieving and storing the marker atomic for this process.
+        with self._lock:
+            return super().reserve_data(cache_name, encoded_key, ttl)
+
+    def reserves_atomically(self, cache_name: str) -> bool:
+        # The data is only shared by the threads of this process.
+        return True
+
+    def get_ttl(self, cache_name: str, encoded_key: str) -> Optional[float]:
+        with self._lock:
+            if encoded_key not in self.idempotency_key_cache_data.get(cache_name, ()):
+                return 0
+            expires = self.idempotency_key_expiry[cache_name].get(encoded_key)
+        return None if expires is None else max(expires - time.monotonic(), 0)
+
+    def delete_data(self, cache_name: str, encoded_key: str) -> None:
+        with self._lock:
+            self._remove(cache_name, encoded_key)
+            self._notify(cache_name, encoded_key)
+
+    def _notify(self, cache_name, encoded_key):
+        # Must be called with the lock held
+        condition = self._conditions.get((cache_name, encoded_key))
+        if condition is not None:
+            condition.notify_all()
+
+    def wait_for_data(
+        self, cache_name: str, encoded_key: str, timeout: float
+    ) -> Tuple[bool, object]:
+        # Waiting requests are woken up by store_data and delete_data rather than
+        # polling.
+        key = (cache_name, encoded_key)
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            condition = self._conditions.get(key)
+            if condition is None:
+                condition = self._conditions[key] = threading.Condition(self._lock)
+            self._waiting[key] += 1
+            try:
+                while True:
+                    key_exists, response = self.retrieve_data(cache_name, encoded_key)
+                    remaining = deadline - time.monotonic()
+                    if not isinstance(response, InFlight) or remaining <= 0:
+                        return key_exists, response
+                    condition.wait(remaining)
+            finally:
+                self._waiting[key] -= 1
+                if not self._waiting[key]:
+                    del self._waiting[key]
+                    del self._conditions[key]
+
+    # Data is held in memory so there is no need to use a thread when running
+    # asynchronously.
+    async def aretrieve_data(
+        self, cache_name: str, encoded_key: str
+    ) -> Tuple[bool, object]:
+        return self.retrieve_data(cache_name, encoded_key)
+
+    async def astore_data(
+        self,
+        cache_name: str,
+        encoded_key: str,
+        response: object,
+        ttl: Optional[float] = None,
+    ) -> None:
+        self.store_data(cache_name, encoded_key, response, ttl)
+
+    async def areserve_data(
+        self, cache_name: str, encoded_key: str, ttl: Optional[float] = None
+    ) -> Tuple[bool, object]:
+        return self.reserve_data(cache_name, encoded_key, ttl)
+
+    async def adelete_data(self, cache_name: str, encoded_key: str) -> None:
+        self.delete_data(cache_name, encoded_key)
+
+    async def aget_ttl(self, cache_name: str, encoded_key: str) -> Optional[float]:
+        return self.get_ttl(cache_name, encoded_key)
+
+    def stats(self, cache_name: str) -> Dict[str, int]:
+        """
+        Returns the number of entries, bytes, evictions and expirations for a cache.
+        """
+        return {
+            "entries": len(self.idempotency_key_cache_data.get(cache_name, ())),
+            "bytes": self.idempotency_key_bytes[cache_name],
+            "evictions": self.evictions[cache_name],
+            "expirations": self.expirations[cache_name],
+        }
+
+    def _expired(self, cache_name, encoded_key, now):
+        expires = self.idempotency_key_expiry[cache_name].get(encoded_key)
+        return expires is not None and expires <= now
+
+    def _remove(self, cache_name, encoded_key):
+        the_cache = self.idempotency_key_cache_data.get(cache_name)
+        if the_cache is None or the_cache.pop(encoded_key, _MISSING) is _MISSING:
+            return
+
+        self.idempotency_key_expiry[cache_name].pop(encoded_key, None)
+        size = self.idempotency_key_sizes[cache_name].pop(encoded_key, 0)
+        if size:
+            self.idempotency_key_bytes[cache_name] -= size
+
+    def _over_limit(self, cache_name):
+        return (
+            self.max_entries is not None
+            and len(self.idempotency_key_cache_data[cache_name]) > self.max_entries
+        ) or (
+            self.max_bytes is not None
+            and self.idempotency_key_bytes[cache_name] > self.max_bytes
+        )
+
+    def _evict(self, cache_name):
+        # Remove least recently used entries until the cache is within its limits.
+        # Expired entries found on the way are removed as well.
+        the_cache = self.idempotency_key_cache_data[cache_name]
+        now = time.monotonic()
+        kept = 0
+        while len(the_cache) > kept:
+            oldest = next(iter(the_cache))
+            if self._expired(cache_name, oldest, now):
+                self.expirations[cache_name] += 1
+            elif not self._over_limit(cache_name):
+                break
+            elif isinstance(the_cache[oldest], InFlight):
+                # The request that stored the marker is still running, evicting it
+                # would let a concurrent request with the same key run the view
+                # function again.
+                the_cache.move_to_end(oldest)
+                kept += 1
+                continue
+            else:
+                self.evictions[cache_name] += 1
+            self._remove(cache_name, oldest)
+
     @staticmethod
     def validate_storage(name: str):
         pass
 
 
 class CacheKeyStorage(IdempotencyKeyStorage):
-    def store_data(self, cache_name: str, encoded_key: str, response: object) -> None:
-        str_response = pickle.dumps(response)
-        caches[cache_name].set(encoded_key, str_response)
+    def __init__(self):
+        self.serializer = utils.get_storage_serializer_class()()
+
+    def store_data(
+        self,
+        cache_name: str,
+        encoded_key: str,
+        response: object,
+        ttl: Optional[float] = None,
+    ) -> None:
+        str_response = self.serializer.dumps(response)
+        timeout = DEFAULT_TIMEOUT if ttl is None else ttl
+        caches[cache_name].set(encoded_key, str_response, timeout=timeout)
 
     def retrieve_data(self, cache_name: str, encoded_key: str) -> Tuple[bool, object]:
-        if encoded_key in caches[cache_name]:
-            str_response = caches[cache_name].get(encoded_key)
-            return True, pickle.loads(str_response)
+        str_response = caches[cache_name].get(encoded_key, _MISSING)
+        if str_response is _MISSING:
+            return False, None
 
+        return True, self.serializer.loads(str_response)
+
+    def retrieve_many(
+        self, cache_name: str, encoded_keys: Iterable[str]
+    ) -> Dict[str, object]:
+        # get_many only returns the keys that exist and fetches them in one operation
+        str_responses = caches[cache_name].get_many(encoded_keys)
+        loads = self.serializer.loads
+        return {key: loads(value) for key, value in str_responses.items()}
+
+    def reserve_data(
+        self, cache_name: str, encoded_key: str, ttl: Optional[float] = None
+    ) -> Tuple[bool, object]:
+        cache = caches[cache_name]
+        marker = self.serializer.dumps(InFlight())
+        timeout = DEFAULT_TIMEOUT if ttl is None else ttl
+        for _ in range(_RESERVE_ATTEMPTS):
+            # add only stores the marker if the key does not exist
+            if cache.add(encoded_key, marker, timeout=timeout):
+                return False, None
+
+            str_response = cache.get(encoded_key, _MISSING)
+            if str_response is not _MISSING:
+                return True, self.serializer.loads(str_response)
+            # The key expired or was deleted after add was called so try again.
+
+        return self._reserve_failed(cache_name, encoded_key)
+
+    @staticmethod
+    def _reserve_failed(cache_name, encoded_key):
+        logger.warning(
+            "Idempotency key could not be reserved or read, treating it as missing: "
+            "%s:%s",
+            cache_name,
+            encoded_key,
+        )
         return False, None
 
+    def reserves_atomically(self, cache_name: str) -> bool:
+        return isinstance(caches[cache_name], get_atomic_add_backends())
+
+    async def aget_ttl(self, cache_name: str, encoded_key: str) -> Optional[float]:
+        # django's cache framework cannot tell when a key expires
+        return None
+
+    def delete_data(self, cache_name: str, encoded_key: str) -> None:
+        caches[cache_name].delete(encoded_key)
+
+    # The asynchronous functions use django's asynchronous cache API which is
+    # available from django 4.0.
+
+    async def aretrieve_data(
+        self, cache_name: str, encoded_key: str
+    ) -> Tuple[bool, object]:
+        cache = caches[cache_name]
+        if not hasattr(cache, "aget"):
+            return await super().aretrieve_data(cache_name, encoded_key)
+
+        str_response = await cache.aget(encoded_key, _MISSING)
+        if str_response is _MISSING:
+            return False, None
+
+        return True, self.serializer.loads(str_response)
+
+    async def astore_data(
+        self,
+        cache_name: str,
+        encoded_key: str,
+        response: object,
+        ttl: Optional[float] = None,
+    ) -> None:
+        cache = caches[cache_name]
+        if not hasattr(cache, "aset"):
+            return await super().astore_data(cache_name, encoded_key, response, ttl)
+
+        str_response = self.serializer.dumps(response)
+        timeout = DEFAULT_TIMEOUT if ttl is None else ttl
+        await cache.aset(encoded_key, str_response, timeout=timeout)
+
+    async def areserve_data(
+        self, cache_name: str, encoded_key: str, ttl: Optional[float] = None
+    ) -> Tuple[bool, object]:
+        cache = caches[cache_name]
+        if not hasattr(cache, "aadd"):
+            return await super().areserve_data(cache_name, encoded_key, ttl)
+
+        marker = self.serializer.dumps(InFlight())
+        timeout = DEFAULT_TIMEOUT if ttl is None else ttl
+        for _ in range(_RESERVE_ATTEMPTS):
+            if await cache.aadd(encoded_key, marker, timeout=timeout):
+                return False, None
+
+            str_response = await cache.aget(encoded_key, _MISSING)
+            if str_response is not _MISSING:
+                return True, self.serializer.loads(str_response)
+
+        return self._reserve_failed(cache_name, encoded_key)
+
+    async def adelete_data(self, cache_name: str, encoded_key: str) -> None:
+        cache = caches[cache_name]
+        if not hasattr(cache, "adelete"):
+            return await super().adelete_data(cache_name, encoded_key)
+
+        await cache.adelete(encoded_key)
+
+    async def await_for_data(
+        self, cache_name: str, encoded_key: str, timeout: float
+    ) -> Tuple[bool, object]:
+        # Polling with the asynchronous cache API does not need a thread.
+        if not hasattr(caches[cache_name], "aget"):
+            return await super().await_for_data(cache_name, encoded_key, timeout)
+
+        return await self._apoll_for_data(cache_name, encoded_key, timeout)
+
     @staticmethod
     def validate_storage(name: str):
         # Check that the cache exists. If the cache is not found then an
         # InvalidCacheBackendError is raised. Note that there is no get function on the
         # caches object, so we cannot perform a normal check.
         caches[name]
+
+
+class TieredKeyStorage(IdempotencyKeyStorage):
+    """
+    Keeps recently used responses in a bounded MemoryKeyStorage (L1) in front of
+    another storage class (L2), i.e. CacheKeyStorage, that is shared between processes.
+    Reads try L1 before L2 and responses read from L2 are added to L1. Writes go to
+    both. In-flight markers and the chunks of large or streaming responses are only
+    stored in L2, the first so that every process sees when a reservation ends and the
+    second so that L1 stays small.
+
+    L1 keeps a response for at most TIERED.L1_TTL seconds and never for longer than L2
+    has left to keep it (see get_ttl), or STORAGE.TTL when L2 cannot tell.
+
+    Caching that a key does not exist (negative caching) is disabled by default because
+    another process may store a response for the key while it is cached as missing.
+    """
+
+    def __init__(
+        self,
+        local: Optional[IdempotencyKeyStorage] = None,
+        remote: Optional[IdempotencyKeyStorage] = None,
+    ):
+        self.local = local or MemoryKeyStorage(
+            max_entries=utils.get_storage_tiered_l1_max_entries(),
+            max_bytes=utils.get_storage_tiered_l1_max_bytes(),
+        )
+        self.remote = remote or utils.get_storage_tiered_l2_class()()
+        self.local_ttl = utils.get_storage_tiered_l1_ttl()
+        self.negative_ttl = utils.get_storage_tiered_negative_ttl()
+
+        # Hits and misses counted for each tier, "l1" and "l2"
+        self.hits = Counter()
+        self.misses = Counter()
+
+    def _local_ttl(self, ttl):
+        if ttl is None:
+            ttl = utils.get_settings().storage_ttl
+        if ttl is None or self.local_ttl is None:
+            return self.local_ttl if ttl is None else ttl
+        return min(ttl, self.local_ttl)
+
+    def _store_local(self, cache_name, encoded_key, response, ttl):
+        """
+        :param ttl: the number of seconds L2 keeps the response for, None if unknown
+        """
+        if isinstance(response, (InFlight, bytes)):
+            return
+        ttl = self._local_ttl(ttl)
+        if ttl is None:
+            self.local.store_data(cache_name, encoded_key, response)
+        elif ttl > 0:
+            self.local.store_data(cache_name, encoded_key, response, ttl=ttl)
+
+    def _fill_local(self, cache_name, encoded_key, response):
+        # Add a response read from L2 to L1
+        if not isinstance(response, (InFlight, bytes)):
+            ttl = self.remote.get_ttl(cache_name, encoded_key)
+            self._store_local(cache_name, encoded_key, response, ttl)
+
+    async def _afill_local(self, cache_name, encoded_key, response):
+        if not isinstance(response, (InFlight, bytes)):
+            ttl = await self.remote.aget_ttl(cache_name, encoded_key)
+            self._store_local(cache_name, encoded_key, response, ttl)
+
+    def store_data(
+        self,
+        cache_name: str,
+        encoded_key: str,
+        response: object,
+        ttl: Optional[float] = None,
+    ) -> None:
+        if ttl is None:
+            self.remote.store_data(cache_name, encoded_key, response)
+        else:
+            self.remote.store_data(cache_name, encoded_key, response, ttl=ttl)
+
+        if isinstance(response, InFlight):
+            self.local.delete_data(cache_name, encoded_key)
+        else:
+            self._store_local(cache_name, encoded_key, response, ttl)
+
+    def _retrieve_local(self, cache_name, encoded_key):
+        key_exists, response = self.local.retrieve_data(cache_name, encoded_key)
+        if key_exists:
+            self.hits["l1"] += 1
+        else:
+            self.misses["l1"] += 1
+        return key_exists, response
+
+    def retrieve_data(self, cache_name: str, encoded_key: str) -> Tuple[bool, object]:
+        key_exists, response = self._retrieve_local(cache_name, encoded_key)
+        if key_exists:
+            if response is _NOT_FOUND:
+                return False, None
+            return True, response
+
+        key_exists, response = self.remote.retrieve_data(cache_name, encoded_key)
+        if key_exists:
+            self.hits["l2"] += 1
+            self._fill_local(cache_name, encoded_key, response)
+            return True, response
+
+        self.misses["l2"] += 1
+        if self.negative_ttl:
+            self.local.store_data(
+                cache_name, encoded_key, _NOT_FOUND, ttl=self.negative_ttl
+            )
+        return False, None
+
+    def retrieve_many(
+        self, cache_name: str, encoded_keys: Iterable[str]
+    ) -> Dict[str, object]:
+        found = dict()
+        missing = []
+        for encoded_key in encoded_keys:
+            key_exists, response = self._retrieve_local(cache_name, encoded_key)
+            if key_exists:
+                if response is not _NOT_FOUND:
+                    found[encoded_key] = response
+            else:
+                missing.append(encoded_key)
+
+        if missing:
+            remote_found = self.remote.retrieve_many(cache_name, missing)
+            self.hits["l2"] += len(remote_found)
+            self.misses["l2"] += len(missing) - len(remote_found)
+            for encoded_key, response in remote_found.items():
+                self._fill_local(cache_name, encoded_key, response)
+            found.update(remote_found)
+
+        return found
+
+    def _reserved_remote(self, cache_name, encoded_key, key_exists, response):
+        if key_exists:
+            self.hits["l2"] += 1
+        else:
+            self.misses["l2"] += 1
+            # Forget that the key was not found now that it has been reserved.
+            self.local.delete_data(cache_name, encoded_key)
+        return key_exists, response
+
+    def reserve_data(
+        self, cache_name: str, encoded_key: str, ttl: Optional[float] = None
+    ) -> Tuple[bool, object]:
+        key_exists, response = self._retrieve_local(cache_name, encoded_key)
+        if key_exists and response is not _NOT_FOUND:
+            return True, response
+
+        # The L2 storage class decides whether the key can be reserved because it is
+        # shared with other processes.
+        key_exists, response = self.remote.reserve_data(cache_name, encoded_key, ttl)
+        if key_exists:
+            self._fill_local(cache_name, encoded_key, response)
+        return self._reserved_remote(cache_name, encoded_key, key_exists, response)
+
+    def wait_for_data(
+        self, cache_name: str, encoded_key: str, timeout: float
+    ) -> Tuple[bool, object]:
+        # The in-flight marker is only stored in L2
+        key_exists, response = self.remote.wait_for_data(
+            cache_name, encoded_key, timeout
+        )
+        if key_exists:
+            self._fill_local(cache_name, encoded_key, response)
+        return key_exists, response
+
+    async def await_for_data(
+        self, cache_name: str, encoded_key: str, timeout: float
+    ) -> Tuple[bool, object]:
+        key_exists, response = await self.remote.await_for_data(
+            cache_name, encoded_key, timeout
+        )
+        if key_exists:
+            await self._afill_local(cache_name, encoded_key, response)
+        return key_exists, response
+
+    def reserves_atomically(self, cache_name: str) -> bool:
+        # Keys are reserved by the L2 storage class
+        return self.remote.reserves_atomically(cache_name)
+
+    def delete_data(self, cache_name: str, encoded_key: str) -> None:
+        self.local.delete_data(cache_name, encoded_key)
+        self.remote.delete_data(cache_name, encoded_key)
+
+    # The asynchronous functions only use the asynchronous interface of the L2 storage
+    # class because the L1 storage class is held in memory.
+
+    async def aretrieve_data(
+        self, cache_name: str, encoded_key: str
+    ) -> Tuple[bool, object]:
+        key_exists, response = self._retrieve_local(cache_name, encoded_key)
+        if key_exists:
+            if response is _NOT_FOUND:
+                return False, None
+            return True, response
+
+        key_exists, response = await self.remote.aretrieve_data(cache_name, encoded_key)
+        if key_exists:
+            self.hits["l2"] += 1
+            await self._afill_local(cache_name, encoded_key, response)
+            return True, response
+
+        self.misses["l2"] += 1
+        if self.negative_ttl:
+            self.local.store_data(
+                cache_name, encoded_key, _NOT_FOUND, ttl=self.negative_ttl
+            )
+        return False, None
+
+    async def astore_data(
+        self,
+        cache_name: str,
+        encoded_key: str,
+        response: object,
+        ttl: Optional[float] = None,
+    ) -> None:
+        await self.remote.astore_data(cache_name, encoded_key, response, ttl)
+
+        if isinstance(response, InFlight):
+            self.local.delete_data(cache_name, encoded_key)
+        else:
+            self._store_local(cache_name, encoded_key, response, ttl)
+
+    async def areserve_data(
+        self, cache_name: str, encoded_key: str, ttl: Optional[float] = None
+    ) -> Tuple[bool, object]:
+        key_exists, response = self._retrieve_local(cache_name, encoded_key)
+        if key_exists and response is not _NOT_FOUND:
+            return True, response
+
+        key_exists, response = await self.remote.areserve_data(
+            cache_name, encoded_key, ttl
+        )
+        if key_exists:
+            await self._afill_local(cache_name, encoded_key, response)
+        return self._reserved_remote(cache_name, encoded_key, key_exists, response)
+
+    async def adelete_data(self, cache_name: str, encoded_key: str) -> None:
+        self.local.delete_data(cache_name, encoded_key)
+        await self.remote.adelete_data(cache_name, encoded_key)
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns the hits, misses and hit ratio of each tier.
+        """
+        stats = dict()
+        for tier in ("l1", "l2"):
+            hits, misses = self.hits[tier], self.misses[tier]
+            stats["{}_hits".format(tier)] = hits
+            stats["{}_misses".format(tier)] = misses
+            stats["{}_hit_ratio".format(tier)] = (
+                hits / (hits + misses) if hits + misses else 0.0
+            )
+        return stats
+
+    @staticmethod
+    def validate_storage(name: str):
+        utils.get_storage_tiered_l2_class().validate_storage(name)
+
+
+# Stored by RedisKeyStorage in place of a serialized InFlight object. This never
+# matches the data written by any of the serializers.
+IN_FLIGHT_MARKER = b"F"
+
+# Published by RedisKeyStorage when a response has been stored, the waiting requests
+# then retrieve the response themselves. A deleted key is published as an empty message.
+STORED_MESSAGE = b"S"
+
+# Stores the in-flight marker unless the key already exists, in which case the stored
+# value is returned.
+# KEYS[1]: the key, ARGV[1]: the in-flight marker, ARGV[2]: the TTL in milliseconds or
+# 0 if the marker does not expire.
+_RESERVE_SCRIPT = """
+local reserved
+if tonumber(ARGV[2]) > 0 then
+    reserved = redis.call("SET", KEYS[1], ARGV[1], "NX", "PX", ARGV[2])
+else
+    reserved = redis.call("SET", KEYS[1], ARGV[1], "NX")
+end
+if reserved then
+    return false
+end
+return redis.call("GET", KEYS[1])
+"""
+
+
+class RedisKeyStorage(IdempotencyKeyStorage):
+    """
+    Stores responses directly in Redis rather than through django's cache framework.
+    Each operation is a single Redis command, reserving a key uses a Lua script so that
+    checking for a response and storing the in-flight marker happen atomically.
+    The server is given by the STORAGE.LOCATION setting which defaults to the
+    LOCK.LOCATION setting used by MultiProcessRedisLock. Cache names are used as part of
+    the Redis keys.
+    """
+
+    def __init__(self):
+        location = utils.get_storage_location()
+        if location is None or location == "":
+            raise ValueError("Redis server location must be set in the settings file.")
+
+        self.redis_obj = connections.get_redis(location)
+        # Used by wait_for_data, see get_connection_pool
+        self.subscribe_redis_obj = connections.get_redis(location, subscribe=True)
+        self.key_prefix = utils.get_storage_key_prefix()
+        self.serializer = utils.get_storage_serializer_class()()
+        self.reserve_script = self.redis_obj.register_script(_RESERVE_SCRIPT)
+
+    def make_key(self, cache_name: str, encoded_key: str) -> str:
+        return "{}:{}:{}".format(self.key_prefix, cache_name, encoded_key)
+
+    @staticmethod
+    def _milliseconds(ttl):
+        return 0 if ttl is None else max(int(ttl * 1000), 1)
+
+    def _dumps(self, response):
+        if isinstance(response, InFlight):
+            return IN_FLIGHT_MARKER
+        return self.serializer.dumps(response)
+
+    def _loads(self, data):
+        if data == IN_FLIGHT_MARKER:
+            return InFlight()
+        return self.serializer.loads(data)
+
+    def store_data(
+        self,
+        cache_name: str,
+        encoded_key: str,
+        response: object,
+        ttl: Optional[float] = None,
+    ) -> None:
+        key = self.make_key(cache_name, encoded_key)
+        data = self._dumps(response)
+        px = self._milliseconds(ttl) or None
+        if isinstance(response, InFlight):
+            self.redis_obj.set(key, data, px=px)
+            return
+
+        # Tell the requests waiting for the response that it has been stored in the
+        # same round trip, see wait_for_data. The response itself is not published so
+        # that a large response is not sent to every subscriber.
+        pipeline = self.redis_obj.pipeline(transaction=False)
+        pipeline.set(key, data, px=px)
+        pipeline.publish(key, STORED_MESSAGE)
+        pipeline.execute()
+
+    def retrieve_data(self, cache_name: str, encoded_key: str) -> Tuple[bool, object]:
+        data = self.redis_obj.get(self.make_key(cache_name, encoded_key))
+        if data is None:
+            return False, None
+        return True, self._loads(data)
+
+    def retrieve_many(
+        self, cache_name: str, encoded_keys: Iterable[str]
+    ) -> Dict[str, object]:
+        encoded_keys = list(encoded_keys)
+        if not encoded_keys:
+            return dict()
+
+        values = self.redis_obj.mget(
+            [self.make_key(cache_name, encoded_key) for encoded_key in encoded_keys]
+        )
+        return {
+            encoded_key: self._loads(data)
+            for encoded_key, data in zip(encoded_keys, values)
+            if data is not None
+        }
+
+    def reserve_data(
+        self, cache_name: str, encoded_key: str, ttl: Optional[float] = None
+    ) -> Tuple[bool, object]:
+        data = self.reserve_script(
+            keys=[self.make_key(cache_name, encoded_key)],
+            args=[IN_FLIGHT_MARKER, self._milliseconds(ttl)],
+        )
+        if data is None:
+            return False, None
+        return True, self._loads(data)
+
+    def reserves_atomically(self, cache_name: str) -> bool:
+        return True
+
+    def get_ttl(self, cache_name: str, encoded_key: str) -> Optional[float]:
+        # PTTL returns -2 if the key does not exist and -1 if it does not expire
+        milliseconds = self.redis_obj.pttl(self.make_key(cache_name, encoded_key))
+        if milliseconds == -1:
+            return None
+        return max(milliseconds, 0) / 1000
+
+    def delete_data(self, cache_name: str, encoded_key: str) -> None:
+        key = self.make_key(cache_name, encoded_key)
+        pipeline = self.redis_obj.pipeline(transaction=False)
+        pipeline.delete(key)
+        # An empty message tells waiting requests that the key has been removed
+        pipeline.publish(key, b"")
+        pipeline.execute()
+
+    def wait_for_data(
+        self, cache_name: str, encoded_key: str, timeout: float
+    ) -> Tuple[bool, object]:
+        # Each key has a channel of the same name that store_data and delete_data
+        # publish to, so waiting requests wake up as soon as the response is stored.
+        key = self.make_key(cache_name, encoded_key)
+        deadline = time.monotonic() + timeout
+        pubsub = self.subscribe_redis_obj.pubsub(ignore_subscribe_messages=True)
+        try:
+            pubsub.subscribe(key)
+            # Checked after subscribing so that a response stored in between is not
+            # missed.
+            key_exists, response = self.retrieve_data(cache_name, encoded_key)
+            while isinstance(response, InFlight):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                message = pubsub.get_message(timeout=remaining)
+                if message is not None:
+                    if not message["data"]:
+                        return False, None
+                    key_exists, response = self.retrieve_data(cache_name, encoded_key)
+            return key_exists, response
+        finally:
+            pubsub.close()
+
+    @staticmethod
+    def validate_storage(name: str):
+        # Cache names are only used as part of the keys so any name is valid.
+        pass
+
+
+class DatabaseKeyStorage(IdempotencyKeyStorage):
+    """
+    Stores responses in the database using the IdempotencyKey model so that no other
+    service is needed. idempotency_key must be added to INSTALLED_APPS and its
+    migrations applied. The database is given by the STORAGE.DATABASE setting.
+    A key is reserved by inserting the in-flight marker, relying on the primary key to
+    reject concurrent requests. When the STORAGE.ATOMIC setting is True each request
+    with an unsafe HTTP method is handled in a transaction so that the marker, the
+    changes made by the view function and the response are committed together.
+    """
+
+    def __init__(self):
+        # The model is imported here so that the app only needs to be installed when
+        # this storage class is used.
+        from idempotency_key.models import IdempotencyKey
+
+        self.model = IdempotencyKey
+        self.using = utils.get_storage_database()
+        self.atomic_requests = utils.get_storage_atomic()
+        self.serializer = utils.get_storage_serializer_class()()
+
+    @staticmethod
+    def make_key(cache_name: str, encoded_key: str) -> str:
+        return "{}:{}".format(cache_name, encoded_key)
+
+    @staticmethod
+    def _expires(now, ttl):
+        return None if ttl is None else now + timedelta(seconds=ttl)
+
+    def _objects(self):
+        return self.model.objects.using(self.using)
+
+    def _unexpired(self):
+        return self._objects().exclude(expires__lte=timezone.now())
+
+    def _loads(self, status, data):
+        if status == self.model.STATUS_IN_FLIGHT:
+            return InFlight()
+        # Some database drivers return a memoryview for binary fields
+        return self.serializer.loads(bytes(data))
+
+    def store_data(
+        self,
+        cache_name: str,
+        encoded_key: str,
+        response: object,
+        ttl: Optional[float] = None,
+    ) -> None:
+        if isinstance(response, InFlight):
+            status, data = self.model.STATUS_IN_FLIGHT, None
+        else:
+            status, data = self.model.STATUS_STORED, self.serializer.dumps(response)
+
+        now = timezone.now()
+        self._objects().update_or_create(
+            key=self.make_key(cache_name, encoded_key),
+            defaults={
+                "cache_name": cache_name,
+                "status": status,
+                "response": data,
+                "created": now,
+                "expires": self._expires(now, ttl),
+            },
+        )
+
+    def retrieve_data(self, cache_name: str, encoded_key: str) -> Tuple[bool, object]:
+        row = (
+            self._unexpired()
+            .filter(key=self.make_key(cache_name, encoded_key))
+            .values_list("status", "response")
+            .first()
+        )
+        if row is None:
+            return False, None
+        return True, self._loads(*row)
+
+    def retrieve_many(
+        self, cache_name: str, encoded_keys: Iterable[str]
+    ) -> Dict[str, object]:
+        keys = {self.make_key(cache_name, key): key for key in encoded_keys}
+        if not keys:
+            return dict()
+
+        rows = self._unexpired().filter(key__in=list(keys))
+        return {
+            keys[key]: self._loads(status, data)
+            for key, status, data in rows.values_list("key", "status", "response")
+        }
+
+    def reserve_data(
+        self, cache_name: str, encoded_key: str, ttl: Optional[float] = None
+    ) -> Tuple[bool, object]:
+        key = self.make_key(cache_name, encoded_key)
+        now = timezone.now()
+        expires = self._expires(now, ttl)
+        try:
+            # The savepoint lets the transaction carry on if the key already exists.
+            with transaction.atomic(using=self.using):
+                self._objects().create(
+                    key=key,
+                    cache_name=cache_name,
+                    status=self.model.STATUS_IN_FLIGHT,
+                    created=now,
+                    expires=expires,
+                )
+            return False, None
+        except IntegrityError:
+            pass
+
+        # Take over a key whose data has expired unless another request has already
+        # done so.
+        taken_over = (
+            self._objects()
+            .filter(key=key, expires__lte=now)
+            .update(
+                status=self.model.STATUS_IN_FLIGHT,
+                response=None,
+                created=now,
+                expires=expires,
+            )
+        )
+        if taken_over:
+            return False, None
+
+        return self.retrieve_data(cache_name, encoded_key)
+
+    def reserves_atomically(self, cache_name: str) -> bool:
+        # The primary key stops more than one request inserting the marker
+        return True
+
+    async def await_for_data(
+        self, cache_name: str, encoded_key: str, timeout: float
+    ) -> Tuple[bool, object]:
+        # Poll from the event loop so that the database is only queried from the
+        # thread django uses for synchronous code and no connection is opened in a
+        # thread of its own.
+        return await self._apoll_for_data(cache_name, encoded_key, timeout)
+
+    def get_ttl(self, cache_name: str, encoded_key: str) -> Optional[float]:
+        now = timezone.now()
+        row = (
+            self._unexpired()
+            .filter(key=self.make_key(cache_name, encoded_key))
+            .values_list("expires", flat=True)
+        )
+        if not row:
+            return 0
+        expires = row[0]
+        return None if expires is None else max((expires - now).total_seconds(), 0)
+
+    def delete_data(self, cache_name: str, encoded_key: str) -> None:
+        self._objects().filter(key=self.make_key(cache_name, encoded_key)).delete()
+
+    def _expired(self, cache_name, expired_before):
+        if expired_before is None:
+            expired_before = timezone.now()
+        expired = self._objects().filter(expires__lte=expired_before)
+        if cache_name is not None:
+            expired = expired.filter(cache_name=cache_name)
+        return expired
+
+    def count_expired(
+        self,
+        cache_name: Optional[str] = None,
+        expired_before: Optional[datetime] = None,
+    ) -> int:
+        """
+        Returns the number of responses that have expired, see delete_expired.
+        """
+        return self._expired(cache_name, expired_before).count()
+
+    def delete_expired(
+        self,
+        cache_name: Optional[str] = None,
+        batch_size: Optional[int] = None,
+        expired_before: Optional[datetime] = None,
+    ) -> int:
+        """
+        Delete the responses that have expired.
+        :param cache_name: Only delete the responses stored under this cache name
+        :param batch_size: The maximum number of responses to delete. All of the
+                           expired responses are deleted with a single query if None.
+        :param expired_before: Delete the responses that expired at or before this
+                               time. Defaults to now.
+        :return: the number of responses deleted
+        """
+        expired = self._expired(cache_name, expired_before)
+        if batch_size is not None:
+            # The oldest keys are found using the index on expires and deleted by
+            # primary key so that each query only locks the rows it deletes.
+            keys = expired.order_by("expires").values_list("key", flat=True)
+            expired = self._objects().filter(key__in=list(keys[:batch_size]))
+        return expired.delete()[0]
+
+    def atomic(self):
+        if not self.atomic_requests:
+            return contextlib.nullcontext()
+        return transaction.atomic(using=self.using)
+
+    def set_rollback(self) -> None:
+        if self.atomic_requests:
+            transaction.set_rollback(True, using=self.using)
+
+    @staticmethod
+    def validate_storage(name: str):
+        # Cache names are only stored alongside the keys so any name is valid.
+        pass
@@ -0,0 +1,323 @@
+"""
+Storage of streaming responses (StreamingHttpResponse and FileResponse).
+
+The content of a streaming response is written to the storage class in chunks of
+STORAGE.STREAM_CHUNK_BYTES while it is sent to the client so that the whole response is
+never held in memory. Once the stream has been sent a ChunkedResponse is stored against
+the encoded key, if the stream fails or the client disconnects the chunks are deleted
+instead. A replayed response is streamed from the storage class one chunk at a time.
+"""
+
+import hashlib
+import logging
+from typing import Optional, Tuple
+
+from django.http import StreamingHttpResponse
+
+from idempotency_key import metrics, utils
+from idempotency_key.compat import ASYNC_STREAMING_CONTENT
+from idempotency_key.exceptions import ChunkExpiredError
+from idempotency_key.storage import (
+    ChunkedResponse,
+    ProcessedResponse,
+    get_stored_headers,
+)
+
+logger = logging.getLogger("django-idempotency-key.idempotency_key.streaming")
+
+# The operations returned by _StreamRecorder and performed by its subclasses.
+_STORE = "store"
+_DELETE = "delete"
+
+
+class _StreamRecorder(object):
+    """
+    Splits the content of a stream into chunks. The functions of this class return the
+    storage operations to perform so that they can be performed either synchronously
+    or asynchronously.
+    """
+
+    def __init__(self, storage, metrics_obj, request, response):
+        self.storage = storage
+        self.metrics = metrics_obj
+        self.request = request
+        self.cache_name = request.idempotency_key_cache_name
+        self.encoded_key = request.idempotency_key_encoded_key
+        self.ttl = request.idempotency_key_ttl
+        self.reserved = getattr(request, "idempotency_key_reserved", False)
+        self.max_bytes = request.idempotency_key_max_response_bytes
+        self.oversize = request.idempotency_key_oversize
+        self.chunk_size = utils.get_settings().storage_stream_chunk_bytes
+
+        self.manifest = ChunkedResponse(
+            response.status_code,
+            get_stored_headers(response),
+            0,
+            key_prefix=ChunkedResponse.new_key_prefix(self.encoded_key),
+            streaming=True,
+        )
+        self.digest = (
+            hashlib.sha256()
+            if self.max_bytes is not None and self.oversize == utils.OVERSIZE_MARKER
+            else None
+        )
+        self.buffer = bytearray()
+        self.size = 0
+        self.oversized = False
+        self.store_chunks = True
+        self.done = False
+
+    def _store_chunk(self, chunk):
+        key = self.manifest.get_chunk_key(
+            self.manifest.key_prefix, self.manifest.chunk_count
+        )
+        self.manifest.chunk_count += 1
+        return _STORE, key, chunk
+
+    def _delete_chunks(self):
+        operations = [
+            (_DELETE, key, None)
+            for key in self.manifest.get_chunk_keys(self.encoded_key)
+        ]
+        self.manifest.chunk_count = 0
+        return operations
+
+    def _release(self):
+        # Remove the in-flight marker stored by the request
+        return [(_DELETE, self.encoded_key, None)] if self.reserved else []
+
+    def add(self, part: bytes) -> list:
+        self.size += len(part)
+        if self.digest is not None:
+            self.digest.update(part)
+
+        operations = []
+        if self.max_bytes is not None and self.size > self.max_bytes:
+            if not self.oversized:
+                self.oversized = True
+                self.metrics.count(
+                    self.request, metrics.OVERSIZED, action=self.oversize
+                )
+                # The stream is always stored in chunks. Otherwise only the digest is
+                # kept ("marker") or nothing is stored ("skip").
+                if self.oversize != utils.OVERSIZE_CHUNK:
+                    self.store_chunks = False
+                    self.buffer = bytearray()
+                    operations = self._delete_chunks()
+
+        if not self.store_chunks:
+            return operations
+
+        self.buffer += part
+        while len(self.buffer) >= self.chunk_size:
+            operations.append(self._store_chunk(bytes(self.buffer[: self.chunk_size])))
+            del self.buffer[: self.chunk_size]
+        return operations
+
+    def complete(self) -> list:
+        """
+        Returns the operations that store the response once the stream has ended.
+        """
+        self.done = True
+        self.metrics.record(self.request, metrics.STORED_RESPONSE_BYTES, self.size)
+        if self.digest is not None and self.oversized:
+            data = ProcessedResponse.from_digest(self.manifest.status_code, self.digest)
+            return [(_STORE, self.encoded_key, data)]
+        if not self.store_chunks:
+            return self._release()
+
+        operations = []
+        if self.buffer:
+            operations.append(self._store_chunk(bytes(self.buffer)))
+            self.buffer = bytearray()
+        # The chunks are stored first so that they exist once the response can be
+        # retrieved.
+        operations.append((_STORE, self.encoded_key, self.manifest))
+        return operations
+
+    def discard(self) -> list:
+        """
+        Returns the operations that remove everything that was stored when the stream
+        did not end.
+        """
+        self.done = True
+        self.buffer = bytearray()
+        logger.debug(
+            "Streaming response was not stored because it did not complete: %s",
+            self.request.path,
+        )
+        return self._delete_chunks() + self._release()
+
+    def _get_store_kwargs(self):
+        # The TTL is only passed when it has been set, see
+        # IdempotencyKeyMiddleware._store_data
+        return {} if self.ttl is None else {"ttl": self.ttl}
+
+    def perform(self, operations):
+        for operation, key, data in operations:
+            if operation == _STORE:
+                with self.metrics.timer(
+                    self.request, metrics.STORAGE_SECONDS, operation="store"
+                ):
+                    self.storage.store_data(
+                        self.cache_name, key, data, **self._get_store_kwargs()
+                    )
+            else:
+                self.storage.delete_data(self.cache_name, key)
+
+    def close(self):
+        """
+        Called by the server once the response has been sent or the client has
+        disconnected. Nothing is stored unless the whole stream was sent.
+        """
+        if not self.done:
+            self.perform(self.discard())
+
+
+class StreamRecorder(_StreamRecorder):
+    """
+    Wraps the iterator of a streaming response and stores each chunk as it is sent.
+    """
+
+    def __init__(self, storage, metrics_obj, request, response):
+        super().__init__(storage, metrics_obj, request, response)
+        self.iterator = iter(response.streaming_content)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.done:
+            raise StopIteration
+        try:
+            part = next(self.iterator)
+        except StopIteration:
+            self.perform(self.complete())
+            raise
+        except Exception:
+            self.perform(self.discard())
+            raise
+        self.perform(self.add(part))
+        return part
+
+
+class AsyncStreamRecorder(_StreamRecorder):
+    """
+    Wraps the asynchronous iterator of a streaming response and stores each chunk as it
+    is sent.
+    """
+
+    def __init__(self, storage, metrics_obj, request, response):
+        super().__init__(storage, metrics_obj, request, response)
+        self.iterator = response.streaming_content.__aiter__()
+
+    async def aperform(self, operations):
+        for operation, key, data in operations:
+            if operation == _STORE:
+                with self.metrics.timer(
+                    self.request, metrics.STORAGE_SECONDS, operation="store"
+                ):
+                    await self.storage.astore_data(self.cache_name, key, data, self.ttl)
+            else:
+                await self.storage.adelete_data(self.cache_name, key)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.done:
+            raise StopAsyncIteration
+        try:
+            part = await self.iterator.__anext__()
+        except StopAsyncIteration:
+            await self.aperform(self.complete())
+            raise
+        except Exception:
+            await self.aperform(self.discard())
+            raise
+        await self.aperform(self.add(part))
+        return part
+
+
+def record_stream(storage, metrics_obj, request, response) -> None:
+    """
+    Replace the content of a streaming response with a recorder that stores it. The
+    recorder also replaces or removes the request's in-flight marker.
+    """
+    if getattr(response, "is_async", False):
+        recorder = AsyncStreamRecorder(storage, metrics_obj, request, response)
+    else:
+        recorder = StreamRecorder(storage, metrics_obj, request, response)
+    response.streaming_content = recorder
+    request.idempotency_key_reserved = False
+
+
+def _chunk_expired(cache_name, key):
+    logger.error("Stored streaming response chunk has expired: %s:%s", cache_name, key)
+    return ChunkExpiredError(key)
+
+
+def _iter_chunks(storage, cache_name, encoded_key, chunk_keys, first_chunk):
+    yield first_chunk
+    for key in chunk_keys[1:]:
+        key_exists, chunk = storage.retrieve_data(cache_name, key)
+        if not key_exists:
+            # The next request with the key runs the view function again
+            storage.delete_data(cache_name, encoded_key)
+            raise _chunk_expired(cache_name, key)
+        yield chunk
+
+
+async def _aiter_chunks(storage, cache_name, encoded_key, chunk_keys, first_chunk):
+    yield first_chunk
+    for key in chunk_keys[1:]:
+        key_exists, chunk = await storage.aretrieve_data(cache_name, key)
+        if not key_exists:
+            await storage.adelete_data(cache_name, encoded_key)
+            raise _chunk_expired(cache_name, key)
+        yield chunk
+
+
+def load_stream(
+    storage, cache_name: str, encoded_key: str, manifest: ChunkedResponse
+) -> Tuple[bool, Optional[StreamingHttpResponse]]:
+    """
+    Returns a response that streams the chunks of a stored streaming response. The
+    first chunk is retrieved straight away so that a response whose chunks have
+    expired is treated as missing. Chunks are stored in order so the later chunks
+    expire after it.
+    """
+    chunk_keys = manifest.get_chunk_keys(encoded_key)
+    first_chunk = b""
+    if chunk_keys:
+        key_exists, first_chunk = storage.retrieve_data(cache_name, chunk_keys[0])
+        if not key_exists:
+            return False, None
+
+    streaming_content = _iter_chunks(
+        storage, cache_name, encoded_key, chunk_keys, first_chunk
+    )
+    return True, manifest.to_streaming_response(streaming_content)
+
+
+async def aload_stream(
+    storage, cache_name: str, encoded_key: str, manifest: ChunkedResponse
+) -> Tuple[bool, Optional[StreamingHttpResponse]]:
+    """
+    Asynchronous version of load_stream. The later chunks are retrieved synchronously
+    when the version of django does not support asynchronous streaming responses.
+    """
+    chunk_keys = manifest.get_chunk_keys(encoded_key)
+    first_chunk = b""
+    if chunk_keys:
+        key_exists, first_chunk = await storage.aretrieve_data(
+            cache_name, chunk_keys[0]
+        )
+        if not key_exists:
+            return False, None
+
+    iter_chunks = _aiter_chunks if ASYNC_STREAMING_CONTENT else _iter_chunks
+    streaming_content = iter_chunks(
+        storage, cache_name, encoded_key, chunk_keys, first_chunk
+    )
+    return True, manifest.to_streaming_response(streaming_content)
@@ -1,8 +1,45 @@
+from dataclasses import dataclass
+from typing import FrozenSet, Optional, Tuple
+
 from django.conf import settings
+from django.core.signals import setting_changed
 from django.utils import module_loading
 
 from idempotency_key import status
 
+# Lock modes.
+# "global": one lock is shared by every request.
+# "cache_name": one lock is used per storage cache name.
+# "key": one lock is used per cache name and encoded idempotency key.
+LOCK_MODE_GLOBAL = "global"
+LOCK_MODE_CACHE_NAME = "cache_name"
+LOCK_MODE_KEY = "key"
+LOCK_MODES = (LOCK_MODE_GLOBAL, LOCK_MODE_CACHE_NAME, LOCK_MODE_KEY)
+
+# Encoded key output formats.
+# "hex": the hexadecimal digest.
+# "base64": the URL safe base64 digest without padding.
+ENCODER_OUTPUT_HEX = "hex"
+ENCODER_OUTPUT_BASE64 = "base64"
+ENCODER_OUTPUTS = (ENCODER_OUTPUT_HEX, ENCODER_OUTPUT_BASE64)
+
+# What is stored for a response larger than STORAGE.MAX_RESPONSE_BYTES.
+# "skip": nothing is stored.
+# "marker": the status code and a hash of the content are stored so that a repeated
+#           request is told that the original request was processed.
+# "chunk": the content is split across several keys.
+OVERSIZE_SKIP = "skip"
+OVERSIZE_MARKER = "marker"
+OVERSIZE_CHUNK = "chunk"
+OVERSIZE_ACTIONS = (OVERSIZE_SKIP, OVERSIZE_MARKER, OVERSIZE_CHUNK)
+
+# The algorithms that the serializers can compress stored responses with. "zstd" and
+# "lz4" require the zstandard and lz4 packages to be installed.
+COMPRESSION_ZLIB = "zlib"
+COMPRESSION_ZSTD = "zstd"
+COMPRESSION_LZ4 = "lz4"
+COMPRESSIONS = (COMPRESSION_ZLIB, COMPRESSION_ZSTD, COMPRESSION_LZ4)
+
 
 def idempotency_key_exists(request):
     return getattr(request, "idempotency_key_exists", False)
@@ -30,6 +67,42 @@ def get_conflict_code():
     )
 
 
+def get_metrics_class():
+    return module_loading.import_string(
+        get_idempotency_key_settings().get(
+            "METRICS_CLASS", "idempotency_key.metrics.NullMetrics"
+        )
+    )
+
+
+def get_warm_policies():
+    return get_idempotency_key_settings().get("WARM_POLICIES", False)
+
+
+def get_encoder_settings():
+    return get_idempotency_key_settings().get("ENCODER", dict())
+
+
+def get_encoder_chunk_size():
+    return get_encoder_settings().get("CHUNK_SIZE", 64 * 1024)
+
+
+def get_encoder_body_limit():
+    return get_encoder_settings().get("BODY_LIMIT", None)
+
+
+def get_encoder_hash_algorithm():
+    return get_encoder_settings().get("HASH_ALGORITHM", "sha256")
+
+
+def get_encoder_digest_size():
+    return get_encoder_settings().get("DIGEST_SIZE", None)
+
+
+def get_encoder_output():
+    return get_encoder_settings().get("OUTPUT", ENCODER_OUTPUT_HEX)
+
+
 def get_storage_settings():
     return get_idempotency_key_settings().get("STORAGE", dict())
 
@@ -40,10 +113,114 @@ def get_storage_class():
     )
 
 
+def get_storage_serializer_class():
+    return module_loading.import_string(
+        get_storage_settings().get(
+            "SERIALIZER_CLASS", "idempotency_key.serializers.CompactSerializer"
+        )
+    )
+
+
+def get_storage_compression():
+    return get_storage_settings().get("COMPRESSION", None)
+
+
+def get_storage_compression_min_bytes():
+    return get_storage_settings().get("COMPRESSION_MIN_BYTES", 1024)
+
+
+def get_storage_compression_level():
+    return get_storage_settings().get("COMPRESSION_LEVEL", None)
+
+
+def get_storage_store_headers():
+    return get_storage_settings().get(
+        "STORE_HEADERS",
+        [
+            "Content-Type",
+            "Content-Language",
+            "Content-Disposition",
+            "Location",
+            "ETag",
+            "Last-Modified",
+            "Vary",
+        ],
+    )
+
+
+def get_storage_tiered_settings():
+    return get_storage_settings().get("TIERED", dict())
+
+
+def get_storage_tiered_l2_class():
+    return module_loading.import_string(
+        get_storage_tiered_settings().get(
+            "L2_CLASS", "idempotency_key.storage.CacheKeyStorage"
+        )
+    )
+
+
+def get_storage_tiered_l1_max_entries():
+    return get_storage_tiered_settings().get("L1_MAX_ENTRIES", 1000)
+
+
+def get_storage_tiered_l1_max_bytes():
+    return get_storage_tiered_settings().get("L1_MAX_BYTES", 16 * 1024 * 1024)
+
+
+def get_storage_tiered_l1_ttl():
+    return get_storage_tiered_settings().get("L1_TTL", 60)
+
+
+def get_storage_tiered_negative_ttl():
+    return get_storage_tiered_settings().get("NEGATIVE_TTL", None)
+
+
 def get_storage_cache_name():
     return get_storage_settings().get("CACHE_NAME", "default")
 
 
+def get_storage_location():
+    # The Redis server used by RedisKeyStorage is the lock's server unless specified.
+    return get_storage_settings().get("LOCATION", get_lock_location())
+
+
+def get_storage_key_prefix():
+    return get_storage_settings().get("KEY_PREFIX", "idempotency_key")
+
+
+def get_storage_database():
+    return get_storage_settings().get("DATABASE", "default")
+
+
+def get_storage_atomic():
+    return get_storage_settings().get("ATOMIC", False)
+
+
+def get_storage_max_entries():
+    return get_storage_settings().get("MAX_ENTRIES", None)
+
+
+def get_storage_max_bytes():
+    return get_storage_settings().get("MAX_BYTES", None)
+
+
+def get_storage_ttl():
+    return get_storage_settings().get("TTL", None)
+
+
+def get_storage_max_response_bytes():
+    return get_storage_settings().get("MAX_RESPONSE_BYTES", None)
+
+
+def get_storage_oversize():
+    return get_storage_settings().get("OVERSIZE", OVERSIZE_SKIP)
+
+
+def get_storage_stream_chunk_bytes():
+    return get_storage_settings().get("STREAM_CHUNK_BYTES", 64 * 1024)
+
+
 def get_storage_store_on_statuses():
     return get_storage_settings().get(
         "STORE_ON_STATUSES",
@@ -70,6 +247,19 @@ def get_lock_class():
     )
 
 
+def get_async_lock_class():
+    # If the async lock class is not specified then use the one that matches the lock
+    # class.
+    async_class = get_lock_settings().get("ASYNC_CLASS")
+    if async_class is None:
+        async_class = getattr(
+            get_lock_class(),
+            "async_class",
+            "idempotency_key.locks.basic.SyncToAsyncLock",
+        )
+    return module_loading.import_string(async_class)
+
+
 def get_lock_location():
     return get_lock_settings().get("LOCATION", "redis://localhost:6379/1")
 
@@ -82,6 +272,10 @@ def get_lock_enable():
     return get_lock_settings().get("ENABLE", True)
 
 
+def get_lock_mode():
+    return get_lock_settings().get("MODE", LOCK_MODE_GLOBAL)
+
+
 def get_lock_time_to_live():
     return get_lock_settings().get("TTL", 300)  # default to 5 minutes
 
@@ -90,5 +284,131 @@ def get_lock_name():
     return get_lock_settings().get("NAME", "MyLock")
 
 
+def get_redis_settings():
+    return get_idempotency_key_settings().get("REDIS", dict())
+
+
+def get_redis_max_connections():
+    return get_redis_settings().get("MAX_CONNECTIONS", None)
+
+
+def get_redis_pool_timeout():
+    return get_redis_settings().get("POOL_TIMEOUT", 20)
+
+
+def get_redis_socket_timeout():
+    return get_redis_settings().get("SOCKET_TIMEOUT", None)
+
+
+def get_redis_socket_connect_timeout():
+    return get_redis_settings().get("SOCKET_CONNECT_TIMEOUT", None)
+
+
+def get_redis_health_check_interval():
+    return get_redis_settings().get("HEALTH_CHECK_INTERVAL", 30)
+
+
+def get_reservation_settings():
+    return get_idempotency_key_settings().get("RESERVATION", dict())
+
+
+def get_reservation_enable():
+    return get_reservation_settings().get("ENABLE", False)
+
+
+def get_reservation_wait_timeout():
+    return get_reservation_settings().get("WAIT_TIMEOUT", 0)
+
+
+def get_reservation_poll_interval():
+    return get_reservation_settings().get("POLL_INTERVAL", 0.05)  # default to 50ms
+
+
+def get_reservation_ttl():
+    # Default to 5 minutes so that a reservation made by a process that died is not
+    # kept forever.
+    return get_reservation_settings().get("TTL", 300)
+
+
+def get_reservation_status_code():
+    return get_reservation_settings().get("STATUS_CODE", status.HTTP_409_CONFLICT)
+
+
 def get_header_name():
     return get_idempotency_key_settings().get("HEADER", "HTTP_IDEMPOTENCY_KEY")
+
+
+@dataclass(frozen=True)
+class IdempotencyKeySettings:
+    """
+    The settings used while handling each request, read from the IDEMPOTENCY_KEY
+    setting once so that the middleware only needs attribute lookups. See
+    get_settings.
+    """
+
+    header_name: str
+    conflict_code: Optional[int]
+    storage_cache_name: str
+    storage_ttl: Optional[float]
+    storage_store_on_statuses: FrozenSet[int]
+    storage_store_headers: Tuple[str, ...]
+    storage_max_response_bytes: Optional[int]
+    storage_oversize: str
+    storage_stream_chunk_bytes: int
+    lock_enable: bool
+    lock_mode: str
+    lock_timeout: float
+    lock_ttl: float
+    lock_name: str
+    reservation_enable: bool
+    reservation_wait_timeout: float
+    reservation_poll_interval: float
+    reservation_ttl: Optional[float]
+    reservation_status_code: int
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            header_name=get_header_name(),
+            conflict_code=get_conflict_code(),
+            storage_cache_name=get_storage_cache_name(),
+            storage_ttl=get_storage_ttl(),
+            storage_store_on_statuses=frozenset(get_storage_store_on_statuses()),
+            storage_store_headers=tuple(get_storage_store_headers()),
+            storage_max_response_bytes=get_storage_max_response_bytes(),
+            storage_oversize=get_storage_oversize(),
+            storage_stream_chunk_bytes=get_storage_stream_chunk_bytes(),
+            lock_enable=get_lock_enable(),
+            lock_mode=get_lock_mode(),
+            lock_timeout=get_lock_timeout(),
+            lock_ttl=get_lock_time_to_live(),
+            lock_name=get_lock_name(),
+            reservation_enable=get_reservation_enable(),
+            reservation_wait_timeout=get_reservation_wait_timeout(),
+            reservation_poll_interval=get_reservation_poll_interval(),
+            reservation_ttl=get_reservation_ttl(),
+            reservation_status_code=get_reservation_status_code(),
+        )
+
+
+_settings = None
+
+
+def get_settings() -> IdempotencyKeySettings:
+    """
+    Returns the compiled settings. These are built the first time this function is
+    called and rebuilt after the IDEMPOTENCY_KEY setting is changed.
+    """
+    global _settings
+    if _settings is None:
+        _settings = IdempotencyKeySettings.from_settings()
+    return _settings
+
+
+def reload_settings(*args, **kwargs):
+    global _settings
+    if kwargs.get("setting") == "IDEMPOTENCY_KEY":
+        _settings = None
+
+
+setting_changed.connect(reload_settings)
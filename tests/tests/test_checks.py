@@ -0,0 +1,140 @@
+from django.core.checks import run_checks
+from django.test import modify_settings, override_settings
+from django.urls import path
+
+from idempotency_key import checks, policies
+from idempotency_key.middleware import (
+    ExemptIdempotencyKeyMiddleware,
+    IdempotencyKeyMiddleware,
+)
+from tests import views
+from tests.viewsets import MyViewSet
+
+urlpatterns = [
+    path("views/create/", views.create),
+    path("views/create-with-my-cache/", views.create_with_my_cache),
+    path("viewsets/create/", MyViewSet.as_view({"post": "create"})),
+]
+
+set_middleware = modify_settings(
+    MIDDLEWARE={
+        "append": [
+            "idempotency_key.middleware.IdempotencyKeyMiddleware",
+            "idempotency_key.middleware.ExemptIdempotencyKeyMiddleware",
+        ]
+    }
+)
+
+
+def error_ids(errors):
+    return sorted(
+        error.id for error in errors if error.id.startswith("idempotency_key.")
+    )
+
+
+@set_middleware
+def test_checks_registered():
+    assert "idempotency_key.E005" in error_ids(run_checks())
+
+
+@override_settings(MIDDLEWARE=[])
+def test_get_middleware_classes_not_installed():
+    assert checks.get_middleware_classes() == []
+
+
+@set_middleware
+def test_get_middleware_classes():
+    assert checks.get_middleware_classes() == [
+        IdempotencyKeyMiddleware,
+        ExemptIdempotencyKeyMiddleware,
+    ]
+
+
+@set_middleware
+@override_settings(ROOT_URLCONF=__name__)
+def test_check_views():
+    policies.get_registry(IdempotencyKeyMiddleware).clear()
+    assert checks.check_views(None) == []
+    # The policies have been resolved ready for the first requests
+    registry = policies.get_registry(IdempotencyKeyMiddleware)
+    assert (views.create, "POST") in registry.policies
+
+
+@set_middleware
+def test_check_views_mutually_exclusive_decorators():
+    errors = checks.check_views(None)
+    assert {error.id for error in errors} == {"idempotency_key.E005"}
+    objects = [error.obj for error in errors]
+    for view in [
+        views.create_exempt_test_1,
+        views.create_exempt_test_2,
+        views.create_manual_exempt_1,
+        views.create_manual_exempt_2,
+    ]:
+        # Reported once even though it is found by both middleware classes
+        assert objects.count(view) == 1
+
+
+@set_middleware
+@override_settings(
+    ROOT_URLCONF=__name__,
+    IDEMPOTENCY_KEY={"STORAGE": {"CLASS": "idempotency_key.storage.CacheKeyStorage"}},
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+)
+def test_check_views_cache_name():
+    errors = checks.check_views(None)
+    assert error_ids(errors) == ["idempotency_key.E003"]
+    assert errors[0].obj is views.create_with_my_cache
+
+
+@override_settings(IDEMPOTENCY_KEY={"LOCK": {"MODE": "invalid"}})
+def test_check_settings_lock_mode():
+    assert error_ids(checks.check_settings(None)) == ["idempotency_key.E001"]
+
+
+@override_settings(IDEMPOTENCY_KEY={"STORAGE": {"OVERSIZE": "invalid"}})
+def test_check_settings_oversize():
+    assert error_ids(checks.check_settings(None)) == ["idempotency_key.E006"]
+
+
+@override_settings(
+    IDEMPOTENCY_KEY={
+        "ENCODER_CLASS": "idempotency_key.encoders.MissingEncoder",
+        "LOCK": {"ASYNC_CLASS": "idempotency_key.locks.basic.MissingLock"},
+    }
+)
+def test_check_settings_import_error():
+    assert error_ids(checks.check_settings(None)) == [
+        "idempotency_key.E002",
+        "idempotency_key.E002",
+    ]
+
+
+@override_settings(
+    IDEMPOTENCY_KEY={
+        "ENCODER": {"OUTPUT": "binary"},
+        "STORAGE": {"COMPRESSION": "brotli"},
+        "LOCK": {
+            "CLASS": "idempotency_key.locks.redis.MultiProcessRedisLock",
+            "LOCATION": "",
+        },
+    }
+)
+def test_check_settings_misconfigured_objects():
+    assert error_ids(checks.check_settings(None)) == [
+        "idempotency_key.E004",
+        "idempotency_key.E004",
+        "idempotency_key.E004",
+    ]
+
+
+@override_settings(
+    IDEMPOTENCY_KEY={
+        "STORAGE": {
+            "CLASS": "idempotency_key.storage.CacheKeyStorage",
+            "CACHE_NAME": "missing",
+        }
+    }
+)
+def test_check_settings_cache_name():
+    assert error_ids(checks.check_settings(None)) == ["idempotency_key.E003"]
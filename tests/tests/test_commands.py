@@ -0,0 +1,93 @@
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+from django.core.management import CommandError, call_command
+from django.test import override_settings
+from django.utils import timezone
+
+from idempotency_key.models import IdempotencyKey
+from idempotency_key.storage import DatabaseKeyStorage
+
+pytestmark = pytest.mark.django_db
+
+database_storage_settings = override_settings(
+    IDEMPOTENCY_KEY={"STORAGE": {"CLASS": "idempotency_key.storage.DatabaseKeyStorage"}}
+)
+
+
+def store_expired(count, cache_name="default"):
+    storage = DatabaseKeyStorage()
+    for i in range(count):
+        storage.store_data(cache_name, "expired{}".format(i), "value", ttl=60)
+    IdempotencyKey.objects.filter(cache_name=cache_name).update(
+        expires=timezone.now() - timedelta(seconds=1)
+    )
+    storage.store_data(cache_name, "live", "value", ttl=60)
+
+
+def purge(*args):
+    out = StringIO()
+    call_command("purge_idempotency_keys", *args, stdout=out)
+    return out.getvalue()
+
+
+@database_storage_settings
+def test_purge_idempotency_keys_in_batches(mocker):
+    store_expired(5)
+    sleep = mocker.patch("time.sleep")
+    output = purge("--batch-size", "2")
+    assert output.splitlines() == [
+        "Deleted 2 of 5 expired idempotency keys.",
+        "Deleted 4 of 5 expired idempotency keys.",
+        "Deleted 5 of 5 expired idempotency keys.",
+        "Deleted 5 expired idempotency keys.",
+    ]
+    assert list(IdempotencyKey.objects.values_list("key", flat=True)) == [
+        "default:live"
+    ]
+    # There is no rate limit by default
+    assert sleep.call_count == 0
+
+
+@database_storage_settings
+def test_purge_idempotency_keys_rate(mocker):
+    store_expired(4)
+    sleep = mocker.patch("time.sleep")
+    purge("--batch-size", "2", "--rate", "1")
+    # Two keys per batch at one key per second
+    assert sleep.call_count == 2
+    assert 1 < sleep.call_args[0][0] <= 2
+
+
+@database_storage_settings
+def test_purge_idempotency_keys_dry_run():
+    store_expired(3)
+    assert purge("--dry-run") == "3 expired idempotency keys would be deleted.\n"
+    assert IdempotencyKey.objects.count() == 4
+
+
+@database_storage_settings
+def test_purge_idempotency_keys_cache_name():
+    store_expired(2)
+    store_expired(3, cache_name="other")
+    purge("--cache-name", "other")
+    assert IdempotencyKey.objects.filter(cache_name="other").count() == 1
+    assert IdempotencyKey.objects.filter(cache_name="default").count() == 3
+
+
+@database_storage_settings
+def test_purge_idempotency_keys_nothing_expired():
+    assert purge() == "Deleted 0 expired idempotency keys.\n"
+
+
+def test_purge_idempotency_keys_storage_without_expiry():
+    with pytest.raises(CommandError, match="MemoryKeyStorage"):
+        purge()
+
+
+@database_storage_settings
+@pytest.mark.parametrize("args", [["--batch-size", "0"], ["--rate", "0"]])
+def test_purge_idempotency_keys_invalid_arguments(args):
+    with pytest.raises(CommandError):
+        purge(*args)
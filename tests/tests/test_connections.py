@@ -0,0 +1,114 @@
+import pytest
+from django.test import override_settings
+from redis import BlockingConnectionPool, ConnectionPool
+
+from idempotency_key import connections
+from idempotency_key.locks.redis import (
+    AsyncMultiProcessRedisLock,
+    MultiProcessRedisLock,
+)
+from idempotency_key.storage import RedisKeyStorage
+from tests.tests.utils import aclose_redis, async_to_sync, requires_async
+
+location = "redis://localhost:6379/1"
+
+
+@pytest.fixture(autouse=True)
+def close_pools():
+    connections.close_connection_pools()
+    yield
+    connections.close_connection_pools()
+
+
+def test_connection_pool_shared_per_location():
+    pool = connections.get_connection_pool(location)
+    assert type(pool) is ConnectionPool
+    assert connections.get_connection_pool(location) is pool
+    assert connections.get_connection_pool("redis://localhost:6379/2") is not pool
+
+
+@override_settings(IDEMPOTENCY_KEY={"LOCK": {"LOCATION": location}})
+def test_connection_pool_shared_by_lock_and_storage():
+    lock = MultiProcessRedisLock()
+    other_lock = MultiProcessRedisLock()
+    storage = RedisKeyStorage()
+    pool = lock.redis_obj.connection_pool
+    assert other_lock.redis_obj.connection_pool is pool
+    assert storage.redis_obj.connection_pool is pool
+
+    assert lock.acquire() is True
+    storage.store_data("default", "key", "value")
+    lock.release()
+    # Connections are returned to the pool after each command
+    assert len(pool._available_connections) == 1
+
+
+def test_connection_pool_created_again_after_fork(mocker):
+    pool = connections.get_connection_pool(location)
+    mocker.patch("os.getpid", return_value=-1)
+    assert connections.get_connection_pool(location) is not pool
+
+
+@override_settings(
+    IDEMPOTENCY_KEY={
+        "REDIS": {
+            "MAX_CONNECTIONS": 5,
+            "POOL_TIMEOUT": 2,
+            "SOCKET_TIMEOUT": 3,
+            "SOCKET_CONNECT_TIMEOUT": 4,
+            "HEALTH_CHECK_INTERVAL": 10,
+        }
+    }
+)
+def test_connection_pool_settings():
+    pool = connections.get_connection_pool(location)
+    assert isinstance(pool, BlockingConnectionPool)
+    assert pool.max_connections == 5
+    assert pool.timeout == 2
+    assert pool.connection_kwargs["socket_timeout"] == 3
+    assert pool.connection_kwargs["socket_connect_timeout"] == 4
+    assert pool.connection_kwargs["health_check_interval"] == 10
+
+
+@override_settings(IDEMPOTENCY_KEY={"REDIS": {"MAX_CONNECTIONS": 5}})
+def test_connection_pool_subscribe():
+    pool = connections.get_connection_pool(location, subscribe=True)
+    # Subscriptions do not take connections from the bounded shared pool
+    assert type(pool) is ConnectionPool
+    assert pool is not connections.get_connection_pool(location)
+    assert connections.get_connection_pool(location, subscribe=True) is pool
+
+
+def test_connection_pool_settings_changed():
+    pool = connections.get_connection_pool(location)
+    assert pool.connection_kwargs["health_check_interval"] == 30
+    with override_settings(IDEMPOTENCY_KEY={"REDIS": {"HEALTH_CHECK_INTERVAL": 0}}):
+        assert connections.get_connection_pool(location) is not pool
+
+
+def test_close_connection_pools(mocker):
+    pool = connections.get_connection_pool(location)
+    disconnect = mocker.spy(pool, "disconnect")
+    connections.close_connection_pools()
+    assert disconnect.call_count == 1
+    assert connections.get_connection_pool(location) is not pool
+
+
+@override_settings(
+    IDEMPOTENCY_KEY={
+        "LOCK": {"LOCATION": location},
+        "REDIS": {"MAX_CONNECTIONS": 5, "SOCKET_TIMEOUT": 3},
+    }
+)
+@requires_async
+def test_async_lock_uses_redis_settings():
+    async def run():
+        obj = AsyncMultiProcessRedisLock()
+        pool = obj.redis_obj.connection_pool
+        assert pool.max_connections == 5
+        assert pool.connection_kwargs["socket_timeout"] == 3
+        assert await obj.acquire() is True
+        await obj.release()
+        await aclose_redis(obj.redis_obj)
+
+    async_to_sync(run)()
@@ -1,7 +1,13 @@
+import base64
+import hashlib
+import io
+
 import pytest
+from django.core.exceptions import ImproperlyConfigured
+from django.test import override_settings
 from django.test.client import RequestFactory
 
-from idempotency_key.encoders import BasicKeyEncoder
+from idempotency_key.encoders import BasicKeyEncoder, StreamingKeyEncoder
 from idempotency_key.exceptions import MissingIdempotencyKeyError
 
 
@@ -42,3 +48,153 @@ def test_basic_encoder_uses_authorization_header():
     key1 = encoder.encode_key(request1, "test-idempotency-key")
     key2 = encoder.encode_key(request2, "test-idempotency-key")
     assert key1 != key2
+
+
+def test_streaming_encoder_same_key_as_basic_encoder():
+    request1 = RequestFactory().post(
+        "/myURL/path/", {"key": "value"}, "application/json"
+    )
+    request2 = RequestFactory().post(
+        "/myURL/path/", {"key": "value"}, "application/json"
+    )
+    key1 = BasicKeyEncoder().encode_key(request1, "MyKey")
+    key2 = StreamingKeyEncoder().encode_key(request2, "MyKey")
+    assert key1 == key2
+
+
+@override_settings(IDEMPOTENCY_KEY={"ENCODER": {"CHUNK_SIZE": 3}})
+def test_streaming_encoder_body_can_be_read_again():
+    request = RequestFactory().post("/myURL/path/", {"key": "value", "other": "1"})
+    StreamingKeyEncoder().encode_key(request, "MyKey")
+    # The body is not loaded into memory by the encoder
+    assert not hasattr(request, "_body")
+    assert request.POST["key"] == "value"
+    assert request.POST["other"] == "1"
+
+
+@override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=10)
+def test_streaming_encoder_spools_large_body():
+    body = b"x" * 1000
+    request = RequestFactory().post("/myURL/path/", body, "application/octet-stream")
+    StreamingKeyEncoder().encode_key(request, "MyKey")
+    assert request._stream._rolled is True
+    assert request.body == body
+
+
+def test_streaming_encoder_body_already_read():
+    request1 = RequestFactory().post(
+        "/myURL/path/", {"key": "value"}, "application/json"
+    )
+    request2 = RequestFactory().post(
+        "/myURL/path/", {"key": "value"}, "application/json"
+    )
+    request1.body
+    key1 = StreamingKeyEncoder().encode_key(request1, "MyKey")
+    key2 = StreamingKeyEncoder().encode_key(request2, "MyKey")
+    assert key1 == key2
+
+
+def test_streaming_encoder_seekable_stream():
+    request1 = RequestFactory().post(
+        "/myURL/path/", {"key": "value"}, "application/json"
+    )
+    request2 = RequestFactory().post(
+        "/myURL/path/", {"key": "value"}, "application/json"
+    )
+    # ASGI requests use the spooled request body as the stream.
+    stream = request1._stream = io.BytesIO(request1.read())
+    request1._read_started = False
+    key1 = StreamingKeyEncoder().encode_key(request1, "MyKey")
+    key2 = StreamingKeyEncoder().encode_key(request2, "MyKey")
+    assert key1 == key2
+    assert request1._stream is stream
+    assert request1.body == b'{"key": "value"}'
+
+
+@override_settings(IDEMPOTENCY_KEY={"ENCODER": {"BODY_LIMIT": 4, "CHUNK_SIZE": 3}})
+def test_streaming_encoder_body_limit():
+    def encode(body):
+        request = RequestFactory().post(
+            "/myURL/path/", body, "application/octet-stream"
+        )
+        return request, StreamingKeyEncoder().encode_key(request, "MyKey")
+
+    request, key1 = encode(b"abcdefgh")
+    assert request.body == b"abcdefgh"
+
+    # The rest of the body is not read by the encoder
+    request, _ = encode(b"abcdefgh")
+    assert request.META["wsgi.input"].read() == b"efgh"
+
+    # Only the start of the body and its length are used
+    assert encode(b"abcdxxxx")[1] == key1
+    assert encode(b"abcdefghi")[1] != key1
+    assert encode(b"xbcdefgh")[1] != key1
+
+    request, key2 = encode(b"abcdefgh")
+    request.body
+    assert StreamingKeyEncoder().encode_key(request, "MyKey") == key1
+
+
+@override_settings(IDEMPOTENCY_KEY={"ENCODER": {"BODY_LIMIT": 10, "CHUNK_SIZE": 3}})
+def test_streaming_encoder_body_limit_post_can_be_read():
+    request = RequestFactory().post("/myURL/path/", {"key": "value", "other": "1"})
+    StreamingKeyEncoder().encode_key(request, "MyKey")
+    assert request.POST["key"] == "value"
+    assert request.POST["other"] == "1"
+
+
+def encode_with_settings(encoder_class=BasicKeyEncoder, **encoder_settings):
+    request = RequestFactory().post(
+        "/myURL/path/", {"key": "value"}, "application/json"
+    )
+    with override_settings(IDEMPOTENCY_KEY={"ENCODER": encoder_settings}):
+        return encoder_class().encode_key(request, "MyKey")
+
+
+def test_encoder_hash_algorithm():
+    enc_key = encode_with_settings(HASH_ALGORITHM="blake2b", DIGEST_SIZE=16)
+    assert (
+        enc_key
+        == hashlib.blake2b(
+            b'MyKey/myURL/path/POST{"key": "value"}', digest_size=16
+        ).hexdigest()
+    )
+    assert enc_key == encode_with_settings(
+        StreamingKeyEncoder, HASH_ALGORITHM="blake2b", DIGEST_SIZE=16
+    )
+
+
+def test_encoder_hash_algorithm_not_guaranteed_by_hashlib(mocker):
+    new = mocker.spy(hashlib, "new")
+    mocker.patch.object(hashlib, "algorithms_guaranteed", set())
+    enc_key = encode_with_settings(HASH_ALGORITHM="sha256")
+    assert enc_key == encode_with_settings()
+    assert new.call_args[0] == ("sha256",)
+
+
+def test_encoder_hash_algorithm_dotted_path():
+    enc_key = encode_with_settings(HASH_ALGORITHM="hashlib.md5")
+    assert len(enc_key) == 32
+
+
+def test_encoder_hash_algorithm_invalid():
+    with pytest.raises(ImproperlyConfigured):
+        encode_with_settings(HASH_ALGORITHM="not-an-algorithm")
+
+
+def test_encoder_digest_size_not_supported():
+    with pytest.raises(ImproperlyConfigured):
+        encode_with_settings(HASH_ALGORITHM="sha256", DIGEST_SIZE=16)
+
+
+def test_encoder_base64_output():
+    enc_key = encode_with_settings(OUTPUT="base64")
+    assert len(enc_key) == 43
+    digest = base64.urlsafe_b64decode(enc_key + "=")
+    assert digest.hex() == encode_with_settings()
+
+
+def test_encoder_invalid_output():
+    with pytest.raises(ImproperlyConfigured):
+        encode_with_settings(OUTPUT="binary")
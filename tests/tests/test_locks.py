@@ -2,6 +2,7 @@ import pytest
 from django.test import override_settings
 
 from idempotency_key.locks import basic, redis
+from tests.tests.utils import aclose_redis, async_to_sync, requires_async
 
 
 def test_single_thread_lock():
@@ -43,3 +44,106 @@ def test_multi_process_lock_empty_string_must_be_set():
 def test_multi_process_lock_null_must_be_set():
     with pytest.raises(ValueError):
         redis.MultiProcessRedisLock()
+
+
+def test_single_thread_lock_named_locks_do_not_contend():
+    obj = basic.ThreadLock()
+    assert obj.acquire("key1") is True
+    assert obj.acquire("key2") is True
+    assert obj.acquire("key1") is False
+    obj.release("key1")
+    obj.release("key2")
+    assert obj.acquire("key1") is True
+    obj.release("key1")
+
+
+def test_single_thread_lock_named_locks_do_not_contend_with_global_lock():
+    obj = basic.ThreadLock()
+    assert obj.acquire() is True
+    assert obj.acquire("key1") is True
+    obj.release("key1")
+    obj.release()
+
+
+def test_single_thread_lock_named_locks_are_discarded_when_released():
+    obj = basic.ThreadLock()
+    assert obj.acquire("key1") is True
+    assert obj.acquire("key1") is False
+    assert "key1" in obj.named_locks
+    obj.release("key1")
+    assert "key1" not in obj.named_locks
+
+
+@override_settings(IDEMPOTENCY_KEY={"LOCK": {"LOCATION": "redis://localhost:6379/1"}})
+def test_multi_process_lock_named_locks_do_not_contend():
+    obj = redis.MultiProcessRedisLock()
+    assert obj.acquire("key1") is True
+    assert obj.acquire("key2") is True
+    assert obj.acquire("key1") is False
+    obj.release("key1")
+    obj.release("key2")
+    assert obj.acquire("key1") is True
+    obj.release("key1")
+
+
+@requires_async
+def test_asyncio_lock():
+    async def run():
+        obj = basic.AsyncioLock()
+        assert await obj.acquire() is True
+        assert await obj.acquire() is False
+        await obj.release()
+        assert await obj.acquire() is True
+        await obj.release()
+
+    async_to_sync(run)()
+
+
+@requires_async
+def test_asyncio_lock_named_locks_do_not_contend():
+    async def run():
+        obj = basic.AsyncioLock()
+        assert await obj.acquire("key1") is True
+        assert await obj.acquire("key2") is True
+        assert await obj.acquire("key1") is False
+        await obj.release("key1")
+        await obj.release("key2")
+        assert obj.named_locks == {}
+
+    async_to_sync(run)()
+
+
+@requires_async
+def test_sync_to_async_lock():
+    async def run():
+        obj = basic.SyncToAsyncLock()
+        assert isinstance(obj.lock, basic.ThreadLock)
+        assert await obj.acquire("key1") is True
+        assert await obj.acquire("key1") is False
+        await obj.release("key1")
+
+    async_to_sync(run)()
+
+
+@override_settings(IDEMPOTENCY_KEY={"LOCK": {"LOCATION": "redis://localhost:6379/1"}})
+@requires_async
+def test_async_multi_process_lock():
+    async def run():
+        obj = redis.AsyncMultiProcessRedisLock()
+        assert await obj.acquire() is True
+        assert await obj.acquire() is False
+        await obj.release()
+        assert await obj.acquire("key1") is True
+        assert await obj.acquire("key2") is True
+        assert await obj.acquire("key1") is False
+        await obj.release("key1")
+        await obj.release("key2")
+        await aclose_redis(obj.redis_obj)
+
+    async_to_sync(run)()
+
+
+@override_settings(IDEMPOTENCY_KEY={"LOCK": {"LOCATION": ""}})
+def test_async_multi_process_lock_must_be_set():
+    with pytest.raises(ValueError):
+        redis.AsyncMultiProcessRedisLock()
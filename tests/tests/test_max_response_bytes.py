@@ -0,0 +1,190 @@
+import base64
+import hashlib
+
+import pytest
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.test import override_settings
+
+from idempotency_key import metrics, status
+from idempotency_key.decorators import idempotency_key
+from idempotency_key.middleware import IdempotencyKeyMiddleware
+from idempotency_key.storage import ChunkedResponse, ProcessedResponse
+from tests.tests.utils import (
+    CountingView,
+    acall_middleware,
+    async_get_response,
+    async_to_sync,
+    call_middleware,
+    requires_async,
+)
+
+content = b'{"items": ["' + b"x" * 100 + b'"]}'
+
+
+def oversize_settings(oversize, **storage):
+    storage.update(MAX_RESPONSE_BYTES=50, OVERSIZE=oversize)
+    return override_settings(IDEMPOTENCY_KEY={"STORAGE": storage})
+
+
+@oversize_settings("skip")
+def test_response_under_limit_is_stored():
+    middleware = IdempotencyKeyMiddleware()
+    view = CountingView(b"small")
+    call_middleware(middleware, view)
+    request, response = call_middleware(middleware, view)
+    assert view.calls == 1
+    assert request.idempotency_key_exists
+    assert response.content == b"small"
+
+
+@oversize_settings("skip")
+def test_oversize_skip():
+    middleware = IdempotencyKeyMiddleware()
+    view = CountingView(content)
+    call_middleware(middleware, view)
+    request, response = call_middleware(middleware, view)
+    # Nothing was stored so the view function is run again
+    assert view.calls == 2
+    assert not request.idempotency_key_exists
+    assert response.status_code == status.HTTP_201_CREATED
+
+
+@override_settings(
+    IDEMPOTENCY_KEY={
+        "STORAGE": {"MAX_RESPONSE_BYTES": 50},
+        "RESERVATION": {"ENABLE": True},
+    }
+)
+def test_oversize_skip_releases_reservation():
+    middleware = IdempotencyKeyMiddleware()
+    view = CountingView(content)
+    call_middleware(middleware, view)
+    assert call_middleware(middleware, view)[1].status_code == status.HTTP_201_CREATED
+    assert view.calls == 2
+
+
+@oversize_settings("marker")
+def test_oversize_marker():
+    middleware = IdempotencyKeyMiddleware()
+    view = CountingView(content)
+    call_middleware(middleware, view)
+    request, response = call_middleware(middleware, view)
+    assert view.calls == 1
+    assert request.idempotency_key_exists
+    assert response.status_code == status.HTTP_409_CONFLICT
+    assert response.content == b""
+    digest = base64.b64encode(hashlib.sha256(content).digest()).decode()
+    assert response[ProcessedResponse.DIGEST_HEADER] == "sha-256=:{}:".format(digest)
+
+
+@override_settings(
+    IDEMPOTENCY_KEY={
+        "CONFLICT_STATUS_CODE": None,
+        "STORAGE": {"MAX_RESPONSE_BYTES": 50, "OVERSIZE": "marker"},
+    }
+)
+def test_oversize_marker_original_status_code():
+    middleware = IdempotencyKeyMiddleware()
+    call_middleware(middleware, CountingView(content))
+    assert call_middleware(middleware, CountingView(content))[1].status_code == 201
+
+
+@pytest.mark.parametrize(
+    "storage",
+    [
+        {"CLASS": "idempotency_key.storage.MemoryKeyStorage"},
+        {"CLASS": "idempotency_key.storage.CacheKeyStorage"},
+    ],
+)
+def test_oversize_chunk(storage):
+    with oversize_settings("chunk", **storage):
+        caches["default"].clear()
+        middleware = IdempotencyKeyMiddleware()
+        view = CountingView(content)
+        request, _ = call_middleware(middleware, view)
+        cache_name = request.idempotency_key_cache_name
+        encoded_key = request.idempotency_key_encoded_key
+
+        key_exists, manifest = middleware.storage.retrieve_data(cache_name, encoded_key)
+        assert isinstance(manifest, ChunkedResponse)
+        assert manifest.chunk_count == 3
+        chunks = middleware.storage.retrieve_many(
+            cache_name, manifest.get_chunk_keys(encoded_key)
+        )
+        assert all(len(chunk) <= 50 for chunk in chunks.values())
+
+        request, response = call_middleware(middleware, view)
+        assert view.calls == 1
+        assert request.idempotency_key_exists
+        assert response.status_code == status.HTTP_409_CONFLICT
+        assert response.content == content
+        assert response["Content-Type"] == "application/json"
+
+
+def test_oversize_chunk_keys_unique():
+    # Two requests with the same key store their chunks under different keys
+    first, first_chunks = ChunkedResponse.split(HttpResponse(content), "key", 50)
+    _, second_chunks = ChunkedResponse.split(HttpResponse(b"y" * 120), "key", 50)
+    assert not set(first_chunks) & set(second_chunks)
+    assert first.to_response("key", {**first_chunks, **second_chunks}).content == (
+        content
+    )
+
+
+@oversize_settings(
+    "chunk",
+    CLASS="idempotency_key.storage.CacheKeyStorage",
+)
+def test_oversize_chunk_expired():
+    caches["default"].clear()
+    middleware = IdempotencyKeyMiddleware()
+    view = CountingView(content)
+    request, _ = call_middleware(middleware, view)
+    encoded_key = request.idempotency_key_encoded_key
+    manifest = middleware.storage.retrieve_data("default", encoded_key)[1]
+    caches["default"].delete(manifest.get_chunk_keys(encoded_key)[1])
+    # A response that cannot be rebuilt is treated as missing
+    request, response = call_middleware(middleware, view)
+    assert view.calls == 2
+    assert not request.idempotency_key_exists
+
+
+@oversize_settings("chunk")
+@requires_async
+def test_oversize_chunk_async():
+    async def run():
+        middleware = IdempotencyKeyMiddleware(async_get_response)
+        view = CountingView(content)
+        await acall_middleware(middleware, view)
+        response = (await acall_middleware(middleware, view))[1]
+        assert view.calls == 1
+        assert response.content == content
+
+    async_to_sync(run)()
+
+
+@override_settings(
+    IDEMPOTENCY_KEY={"METRICS_CLASS": "idempotency_key.metrics.InMemoryMetrics"}
+)
+def test_oversize_decorator():
+    view = idempotency_key(max_response_bytes=50, oversize="marker")(
+        CountingView(content)
+    )
+    middleware = IdempotencyKeyMiddleware()
+    policy = middleware.resolve_policy(view, "POST")
+    assert policy.max_response_bytes == 50
+    assert policy.oversize == "marker"
+
+    call_middleware(middleware, view)
+    response = call_middleware(middleware, view)[1]
+    assert response.content == b""
+    assert middleware.metrics.get_count(metrics.OVERSIZED, action="marker") == 1
+    assert middleware.metrics.get_values(metrics.STORED_RESPONSE_BYTES) == [
+        len(content)
+    ]
+
+
+def test_oversize_decorator_invalid():
+    with pytest.raises(ValueError):
+        idempotency_key(oversize="invalid")
@@ -0,0 +1,93 @@
+from django.test import override_settings
+from django.test.client import RequestFactory
+
+from idempotency_key import metrics, status
+from idempotency_key.metrics import InMemoryMetrics, NullMetrics
+from idempotency_key.middleware import IdempotencyKeyMiddleware
+from tests.tests.utils import call_middleware, create_view, the_key
+
+metrics_settings = override_settings(
+    IDEMPOTENCY_KEY={"METRICS_CLASS": "idempotency_key.metrics.InMemoryMetrics"}
+)
+
+
+def test_metrics_disabled_by_default():
+    middleware = IdempotencyKeyMiddleware()
+    assert isinstance(middleware.metrics, NullMetrics)
+    assert middleware.metrics.enabled is False
+    # The same context manager is returned every time so nothing is created
+    assert middleware.metrics.timer(None, metrics.ENCODE_SECONDS) is (
+        middleware.metrics.timer(None, metrics.STORAGE_SECONDS)
+    )
+
+
+@metrics_settings
+def test_metrics_recorded():
+    middleware = IdempotencyKeyMiddleware()
+    recorded = middleware.metrics
+    assert isinstance(recorded, InMemoryMetrics)
+
+    call_middleware(middleware, create_view)
+    labels = {"cache_name": "default", "view": "create_view"}
+    assert recorded.get_count(metrics.MISSES, **labels) == 1
+    assert recorded.get_count(metrics.HITS) == 0
+    assert len(recorded.get_values(metrics.ENCODE_SECONDS, **labels)) == 1
+    assert len(recorded.get_values(metrics.LOCK_WAIT_SECONDS, **labels)) == 1
+    assert len(recorded.get_values(metrics.STORAGE_SECONDS, operation="retrieve")) == 1
+    assert len(recorded.get_values(metrics.STORAGE_SECONDS, operation="store")) == 1
+    assert recorded.get_values(metrics.STORED_RESPONSE_BYTES, **labels) == [7]
+
+    response = call_middleware(middleware, create_view)[1]
+    assert response.status_code == status.HTTP_409_CONFLICT
+    assert recorded.get_count(metrics.HITS, **labels) == 1
+    assert recorded.get_count(metrics.MISSES, **labels) == 1
+    assert len(recorded.get_values(metrics.STORAGE_SECONDS, operation="store")) == 1
+
+
+@metrics_settings
+def test_metrics_rejected_request():
+    middleware = IdempotencyKeyMiddleware()
+    response = call_middleware(middleware, create_view, key=None)[1]
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert middleware.metrics.get_count(metrics.REJECTED, view="create_view") == 1
+
+
+@metrics_settings
+def test_metrics_lock_timeout(mocker):
+    middleware = IdempotencyKeyMiddleware()
+    mocker.patch.object(middleware.storage_lock, "acquire", return_value=False)
+    response = call_middleware(middleware, create_view)[1]
+    assert response.status_code == status.HTTP_423_LOCKED
+    assert middleware.metrics.get_count(metrics.LOCK_TIMEOUTS) == 1
+
+
+@override_settings(
+    IDEMPOTENCY_KEY={
+        "METRICS_CLASS": "idempotency_key.metrics.InMemoryMetrics",
+        "RESERVATION": {"ENABLE": True},
+    }
+)
+def test_metrics_reservation():
+    middleware = IdempotencyKeyMiddleware()
+    request = RequestFactory().post("/views/create/", HTTP_IDEMPOTENCY_KEY=the_key)
+    middleware.process_request(request)
+    middleware.process_view(request, create_view, (), {})
+
+    call_middleware(middleware, create_view)
+    recorded = middleware.metrics
+    assert len(recorded.get_values(metrics.STORAGE_SECONDS, operation="reserve")) == 2
+    assert recorded.get_count(metrics.IN_FLIGHT) == 1
+
+
+def test_in_memory_metrics():
+    recorded = InMemoryMetrics()
+    recorded.increment(metrics.HITS, {"cache_name": "default", "view": "a"})
+    recorded.increment(metrics.HITS, {"cache_name": "other", "view": "a"})
+    recorded.observe(metrics.ENCODE_SECONDS, 0.5, {"cache_name": "default"})
+    assert recorded.get_count(metrics.HITS) == 2
+    assert recorded.get_count(metrics.HITS, cache_name="other") == 1
+    assert recorded.get_count(metrics.MISSES) == 0
+    assert recorded.get_values(metrics.ENCODE_SECONDS) == [0.5]
+
+    recorded.clear()
+    assert recorded.get_count(metrics.HITS) == 0
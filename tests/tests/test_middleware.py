@@ -58,6 +58,7 @@ class TestMiddlewareInclusive:
             "create-manual-exempt-1",
             "create-manual-exempt-2",
             "create-with-my-cache",
+            "create-with-ttl",
             "create-custom-header",
         ]
     }
@@ -599,6 +600,42 @@ class TestMiddlewareInclusive:
         )
         assert request.idempotency_key_cache_name == "FiveMinuteCache"
 
+    def test_middleware_ttl_not_set(self, client, mocker):
+        store_data = mocker.patch("idempotency_key.storage.MemoryKeyStorage.store_data")
+        response = client.post(
+            self.urls["create"], {}, secure=True, HTTP_IDEMPOTENCY_KEY=self.the_key
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.wsgi_request.idempotency_key_ttl is None
+        # The TTL is not passed to the storage class when it is not set
+        assert "ttl" not in store_data.call_args[1]
+
+    @override_settings(IDEMPOTENCY_KEY={"STORAGE": {"TTL": 24 * 60 * 60}})
+    def test_middleware_ttl_setting(self, client, mocker):
+        store_data = mocker.patch("idempotency_key.storage.MemoryKeyStorage.store_data")
+        response = client.post(
+            self.urls["create"], {}, secure=True, HTTP_IDEMPOTENCY_KEY=self.the_key
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.wsgi_request.idempotency_key_ttl == 24 * 60 * 60
+        assert store_data.call_args[1]["ttl"] == 24 * 60 * 60
+
+    @override_settings(IDEMPOTENCY_KEY={"STORAGE": {"TTL": 24 * 60 * 60}})
+    def test_middleware_ttl_on_decorator(self, client, mocker):
+        """
+        Tests @idempotency_key(ttl=60) decorator overrides the TTL setting
+        """
+        store_data = mocker.patch("idempotency_key.storage.MemoryKeyStorage.store_data")
+        response = client.post(
+            self.urls["create-with-ttl"],
+            {},
+            secure=True,
+            HTTP_IDEMPOTENCY_KEY=self.the_key,
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.wsgi_request.idempotency_key_ttl == 60
+        assert store_data.call_args[1]["ttl"] == 60
+
     @override_settings(IDEMPOTENCY_KEY={"HEADER": "HTTP_MY_CUSTOM_IDEMPOTENCY_KEY"})
     def test_post_custom_header_pass(self, client):
         response = client.post(
@@ -0,0 +1,210 @@
+import asyncio
+
+import django
+import pytest
+
+pytest.importorskip("asgiref")
+if django.VERSION < (4, 0):
+    pytest.skip("AsyncClient requires django 4.0 or later", allow_module_level=True)
+
+from asgiref.sync import async_to_sync  # noqa: E402
+from django.test import AsyncClient, modify_settings, override_settings  # noqa: E402
+
+from idempotency_key import status  # noqa: E402
+from idempotency_key.compat import iscoroutinefunction  # noqa: E402
+from idempotency_key.locks.basic import AsyncioLock, ThreadLock  # noqa: E402
+from idempotency_key.middleware import IdempotencyKeyMiddleware  # noqa: E402
+from tests.tests.utils import (  # noqa: E402
+    AsyncBlockingView,
+    acall_middleware,
+    async_get_response,
+    the_key,
+)
+
+
+def test_middleware_sync_mode():
+    middleware = IdempotencyKeyMiddleware(lambda request: None)
+    assert middleware.async_mode is False
+    assert iscoroutinefunction(middleware) is False
+    assert iscoroutinefunction(middleware.process_view) is False
+    assert isinstance(middleware.storage_lock, ThreadLock)
+
+
+def test_middleware_async_mode():
+    middleware = IdempotencyKeyMiddleware(async_get_response)
+    assert middleware.async_mode is True
+    assert iscoroutinefunction(middleware) is True
+    assert iscoroutinefunction(middleware.process_view) is True
+    assert isinstance(middleware.storage_lock, AsyncioLock)
+
+
+@override_settings(
+    IDEMPOTENCY_KEY={"LOCK": {"ASYNC_CLASS": "idempotency_key.locks.basic.AsyncioLock"}}
+)
+def test_middleware_async_lock_class_setting():
+    middleware = IdempotencyKeyMiddleware(async_get_response)
+    assert isinstance(middleware.storage_lock, AsyncioLock)
+
+
+def test_middleware_async_duplicate_request():
+    async def run():
+        middleware = IdempotencyKeyMiddleware(async_get_response)
+        view = AsyncBlockingView()
+        view.finish.set()
+
+        _, response = await acall_middleware(middleware, view)
+        assert response.status_code == status.HTTP_201_CREATED
+
+        request, response2 = await acall_middleware(middleware, view)
+        assert response2.status_code == status.HTTP_409_CONFLICT
+        assert request.idempotency_key_exists is True
+        assert request.idempotency_key_response is response
+        assert view.calls == 1
+
+    async_to_sync(run)()
+
+
+@override_settings(IDEMPOTENCY_KEY={"RESERVATION": {"ENABLE": True}})
+def test_middleware_async_reservation_rejects_concurrent_duplicate():
+    async def run():
+        middleware = IdempotencyKeyMiddleware(async_get_response)
+        view = AsyncBlockingView()
+        first = asyncio.ensure_future(acall_middleware(middleware, view))
+        await view.started.wait()
+
+        request, response = await acall_middleware(middleware, view)
+        assert response.status_code == status.HTTP_409_CONFLICT
+        assert request.idempotency_key_in_flight is True
+
+        view.finish.set()
+        _, response = await first
+        assert response.status_code == status.HTTP_201_CREATED
+        assert view.calls == 1
+
+    async_to_sync(run)()
+
+
+@override_settings(
+    IDEMPOTENCY_KEY={
+        "CONFLICT_STATUS_CODE": None,
+        "RESERVATION": {"ENABLE": True, "WAIT_TIMEOUT": 5, "POLL_INTERVAL": 0.01},
+    }
+)
+def test_middleware_async_reservation_waits_for_stored_response():
+    async def run():
+        middleware = IdempotencyKeyMiddleware(async_get_response)
+        view = AsyncBlockingView()
+        first = asyncio.ensure_future(acall_middleware(middleware, view))
+        await view.started.wait()
+
+        asyncio.get_running_loop().call_later(0.1, view.finish.set)
+        request, response = await acall_middleware(middleware, view)
+        _, first_response = await first
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert request.idempotency_key_response is first_response
+        assert view.calls == 1
+
+    async_to_sync(run)()
+
+
+@modify_settings(
+    MIDDLEWARE={
+        "append": ["idempotency_key.middleware.IdempotencyKeyMiddleware"],
+        "remove": ["idempotency_key.middleware.ExemptIdempotencyKeyMiddleware"],
+    }
+)
+def test_middleware_async_client_duplicate_request():
+    async def run():
+        client = AsyncClient()
+        headers = {"Idempotency-Key": the_key}
+        response = await client.post("/views/create/", {}, headers=headers)
+        assert response.status_code == status.HTTP_201_CREATED
+
+        response2 = await client.post("/views/create/", {}, headers=headers)
+        assert response2.status_code == status.HTTP_409_CONFLICT
+        assert response2.asgi_request.idempotency_key_exists is True
+
+        response3 = await client.post("/views/create/", {})
+        assert response3.status_code == status.HTTP_400_BAD_REQUEST
+
+    async_to_sync(run)()
+
+
+@modify_settings(
+    MIDDLEWARE={
+        "append": ["idempotency_key.middleware.IdempotencyKeyMiddleware"],
+        "remove": ["idempotency_key.middleware.ExemptIdempotencyKeyMiddleware"],
+    }
+)
+def test_middleware_async_client_async_view():
+    async def run():
+        client = AsyncClient()
+        headers = {"Idempotency-Key": the_key}
+        response = await client.post("/views/create-async/", {}, headers=headers)
+        assert response.status_code == status.HTTP_201_CREATED
+
+        response2 = await client.post("/views/create-async/", {}, headers=headers)
+        assert response2.status_code == status.HTTP_409_CONFLICT
+
+    async_to_sync(run)()
+
+
+@modify_settings(
+    MIDDLEWARE={
+        "append": ["idempotency_key.middleware.IdempotencyKeyMiddleware"],
+        "remove": ["idempotency_key.middleware.ExemptIdempotencyKeyMiddleware"],
+    }
+)
+def test_middleware_async_client_async_view_exempt():
+    async def run():
+        client = AsyncClient()
+        response = await client.post("/views/create-exempt-async/", {})
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.json() == {"idempotency_key_exempt": True}
+
+    async_to_sync(run)()
+
+
+@modify_settings(
+    MIDDLEWARE={
+        "append": ["idempotency_key.middleware.IdempotencyKeyMiddleware"],
+        "remove": ["idempotency_key.middleware.ExemptIdempotencyKeyMiddleware"],
+    }
+)
+def test_middleware_async_client_async_view_manual():
+    async def run():
+        client = AsyncClient()
+        headers = {"Idempotency-Key": the_key}
+        url = "/views/create-manual-async/"
+        response = await client.post(url, {}, headers=headers)
+        assert response.status_code == status.HTTP_201_CREATED
+
+        response2 = await client.post(url, {}, headers=headers)
+        assert response2.status_code == status.HTTP_200_OK
+        assert response2.asgi_request.idempotency_key_exists is True
+
+    async_to_sync(run)()
+
+
+@modify_settings(
+    MIDDLEWARE={
+        "append": ["idempotency_key.middleware.ExemptIdempotencyKeyMiddleware"],
+        "remove": ["idempotency_key.middleware.IdempotencyKeyMiddleware"],
+    }
+)
+def test_middleware_async_client_async_view_opt_in():
+    # An asynchronous view function opts in when the middleware exempts by default
+    async def run():
+        client = AsyncClient()
+        headers = {"Idempotency-Key": the_key}
+        response = await client.post("/views/create-async/", {}, headers=headers)
+        assert response.status_code == status.HTTP_201_CREATED
+
+        response2 = await client.post("/views/create-async/", {}, headers=headers)
+        assert response2.status_code == status.HTTP_409_CONFLICT
+
+        response3 = await client.post("/views/create-exempt-async/", {})
+        assert response3.json() == {"idempotency_key_exempt": True}
+
+    async_to_sync(run)()
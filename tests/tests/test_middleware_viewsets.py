@@ -61,6 +61,7 @@ class TestMiddlewareInclusive:
             "create-nested-decorator",
             "create-nested-decorator-exempt",
             "create-with-my-cache",
+            "create-with-ttl",
         ]
     }
 
@@ -629,3 +630,29 @@ class TestMiddlewareInclusive:
             request, self.the_key
         )
         assert request.idempotency_key_cache_name == "FiveMinuteCache"
+
+    def test_middleware_ttl_not_set(self, client, mocker):
+        store_data = mocker.patch("idempotency_key.storage.MemoryKeyStorage.store_data")
+        response = client.post(
+            self.urls["create"], {}, secure=True, HTTP_IDEMPOTENCY_KEY=self.the_key
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.wsgi_request.idempotency_key_ttl is None
+        # The TTL is not passed to the storage class when it is not set
+        assert "ttl" not in store_data.call_args[1]
+
+    @override_settings(IDEMPOTENCY_KEY={"STORAGE": {"TTL": 24 * 60 * 60}})
+    def test_middleware_ttl_on_decorator(self, client, mocker):
+        """
+        Tests @idempotency_key(ttl=60) decorator overrides the TTL setting
+        """
+        store_data = mocker.patch("idempotency_key.storage.MemoryKeyStorage.store_data")
+        response = client.post(
+            self.urls["create-with-ttl"],
+            {},
+            secure=True,
+            HTTP_IDEMPOTENCY_KEY=self.the_key,
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.wsgi_request.idempotency_key_ttl == 60
+        assert store_data.call_args[1]["ttl"] == 60
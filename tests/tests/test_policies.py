@@ -0,0 +1,108 @@
+import pytest
+from django.test import override_settings
+from django.urls import include, path
+
+from idempotency_key import policies
+from idempotency_key.exceptions import DecoratorsMutuallyExclusiveError
+from idempotency_key.middleware import (
+    ExemptIdempotencyKeyMiddleware,
+    IdempotencyKeyMiddleware,
+)
+from idempotency_key.policies import ViewPolicy
+from tests import views
+from tests.viewsets import MyViewSet
+
+create_viewset = MyViewSet.as_view({"post": "create", "put": "create_with_ttl"})
+
+# URLconf without any misconfigured view functions
+urlpatterns = [
+    path("views/create/", views.create),
+    path("views/", include([path("create-with-ttl/", views.create_with_ttl)])),
+    path("viewsets/create/", create_viewset),
+]
+
+
+def test_resolve_policy():
+    middleware = IdempotencyKeyMiddleware()
+    assert middleware.resolve_policy(views.create_with_ttl, "POST") == ViewPolicy(
+        optional=False,
+        exempt=False,
+        manual=False,
+        cache_name="default",
+        ttl=60,
+        view_name="create_with_ttl",
+    )
+    assert middleware.resolve_policy(create_viewset, "PUT").ttl == 60
+    assert middleware.resolve_policy(create_viewset, "POST").ttl is None
+    assert (
+        middleware.resolve_policy(create_viewset, "PUT").view_name
+        == "MyViewSet.create_with_ttl"
+    )
+
+
+def test_resolve_policy_exempt_middleware():
+    middleware = ExemptIdempotencyKeyMiddleware()
+    assert middleware.resolve_policy(views.create_no_decorators, "POST").exempt
+    assert not middleware.resolve_policy(views.create, "POST").exempt
+
+
+def test_get_policy_is_resolved_once(mocker):
+    policies.get_registry(IdempotencyKeyMiddleware).clear()
+    resolve_policy = mocker.spy(IdempotencyKeyMiddleware, "resolve_policy")
+    policy = IdempotencyKeyMiddleware().get_policy(create_viewset, "POST")
+    # The policies are shared by every instance of the middleware class
+    assert IdempotencyKeyMiddleware().get_policy(create_viewset, "POST") is policy
+    assert IdempotencyKeyMiddleware.get_policy(create_viewset, "PUT") is not policy
+    assert resolve_policy.call_count == 2
+
+
+def test_get_policy_per_middleware_class():
+    policy = IdempotencyKeyMiddleware.get_policy(views.create_no_decorators, "POST")
+    assert policy.exempt is False
+    policy = ExemptIdempotencyKeyMiddleware.get_policy(
+        views.create_no_decorators, "POST"
+    )
+    assert policy.exempt is True
+
+
+def test_get_policy_resolved_again_when_settings_change():
+    middleware = IdempotencyKeyMiddleware()
+    assert middleware.get_policy(views.create, "POST").cache_name == "default"
+    with override_settings(IDEMPOTENCY_KEY={"STORAGE": {"CACHE_NAME": "other"}}):
+        assert middleware.get_policy(views.create, "POST").cache_name == "other"
+
+
+def test_warm_policies():
+    registry = policies.get_registry(IdempotencyKeyMiddleware)
+    registry.clear()
+    IdempotencyKeyMiddleware.warm_policies(urlconf=__name__)
+    assert set(registry.policies) == {
+        (views.create, "POST"),
+        (views.create, "PUT"),
+        (views.create, "PATCH"),
+        (views.create, "DELETE"),
+        (views.create_with_ttl, "POST"),
+        (views.create_with_ttl, "PUT"),
+        (views.create_with_ttl, "PATCH"),
+        (views.create_with_ttl, "DELETE"),
+        (create_viewset, "POST"),
+        (create_viewset, "PUT"),
+    }
+
+
+def test_warm_policies_finds_misconfigured_view_functions():
+    with pytest.raises(DecoratorsMutuallyExclusiveError):
+        IdempotencyKeyMiddleware.warm_policies()
+
+
+@override_settings(IDEMPOTENCY_KEY={"WARM_POLICIES": True}, ROOT_URLCONF=__name__)
+def test_warm_policies_setting():
+    registry = policies.get_registry(IdempotencyKeyMiddleware)
+    registry.clear()
+    IdempotencyKeyMiddleware()
+    assert (views.create, "POST") in registry.policies
+
+
+def test_get_callback_methods():
+    assert policies.get_callback_methods(views.create) == policies.WARM_METHODS
+    assert policies.get_callback_methods(create_viewset) == ["POST", "PUT"]
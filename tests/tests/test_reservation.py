@@ -0,0 +1,238 @@
+import threading
+import time
+
+from django.test import override_settings
+
+from idempotency_key import status
+from idempotency_key.middleware import IdempotencyKeyMiddleware
+from idempotency_key.storage import InFlight
+from tests.tests.utils import BlockingView, call_middleware
+
+
+def run_in_thread(middleware, view):
+    result = {}
+
+    def target():
+        result["request"], result["response"] = call_middleware(middleware, view)
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    return thread, result
+
+
+@override_settings(IDEMPOTENCY_KEY={"RESERVATION": {"ENABLE": True}})
+def test_reservation_rejects_concurrent_duplicate():
+    middleware = IdempotencyKeyMiddleware()
+    view = BlockingView()
+    thread, result = run_in_thread(middleware, view)
+    assert view.started.wait(5)
+
+    request, response = call_middleware(middleware, view)
+    assert response.status_code == status.HTTP_409_CONFLICT
+    assert request.idempotency_key_in_flight is True
+
+    view.finish.set()
+    thread.join()
+    assert result["response"].status_code == status.HTTP_201_CREATED
+    assert view.calls == 1
+
+    # The in-flight marker has been replaced by the response
+    request, response = call_middleware(middleware, view)
+    assert response.status_code == status.HTTP_409_CONFLICT
+    assert request.idempotency_key_exists is True
+    assert request.idempotency_key_response is result["response"]
+    assert view.calls == 1
+
+
+@override_settings(
+    IDEMPOTENCY_KEY={
+        "RESERVATION": {"ENABLE": True, "STATUS_CODE": status.HTTP_423_LOCKED}
+    }
+)
+def test_reservation_rejects_concurrent_duplicate_custom_status_code():
+    middleware = IdempotencyKeyMiddleware()
+    view = BlockingView()
+    thread, result = run_in_thread(middleware, view)
+    assert view.started.wait(5)
+
+    _, response = call_middleware(middleware, view)
+    assert response.status_code == status.HTTP_423_LOCKED
+
+    view.finish.set()
+    thread.join()
+    assert view.calls == 1
+
+
+@override_settings(
+    IDEMPOTENCY_KEY={
+        "CONFLICT_STATUS_CODE": None,
+        "RESERVATION": {"ENABLE": True, "WAIT_TIMEOUT": 5, "POLL_INTERVAL": 0.01},
+    }
+)
+def test_reservation_waits_for_stored_response():
+    middleware = IdempotencyKeyMiddleware()
+    view = BlockingView()
+    thread, result = run_in_thread(middleware, view)
+    assert view.started.wait(5)
+
+    # Release the first request shortly after the duplicate starts waiting
+    threading.Timer(0.1, view.finish.set).start()
+    request, response = call_middleware(middleware, view)
+    thread.join()
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert request.idempotency_key_exists is True
+    assert request.idempotency_key_response is result["response"]
+    assert view.calls == 1
+
+
+@override_settings(IDEMPOTENCY_KEY={"RESERVATION": {"ENABLE": True}})
+def test_reservation_is_removed_when_response_is_not_stored():
+    middleware = IdempotencyKeyMiddleware()
+    view = BlockingView(status_code=status.HTTP_400_BAD_REQUEST)
+    view.finish.set()
+
+    request, response = call_middleware(middleware, view)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    key_exists, _ = middleware.storage.retrieve_data(
+        "default", request.idempotency_key_encoded_key
+    )
+    assert key_exists is False
+
+    # The view function can be run again with the same key
+    _, response = call_middleware(middleware, view)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert view.calls == 2
+
+
+@override_settings(IDEMPOTENCY_KEY={"RESERVATION": {"ENABLE": True}})
+def test_reservation_stores_in_flight_marker():
+    middleware = IdempotencyKeyMiddleware()
+    view = BlockingView()
+    thread, result = run_in_thread(middleware, view)
+    assert view.started.wait(5)
+
+    cache_data = middleware.storage.idempotency_key_cache_data["default"]
+    assert list(cache_data.values()) == [InFlight()]
+
+    view.finish.set()
+    thread.join()
+    assert list(cache_data.values()) == [result["response"]]
+
+
+def test_reservation_disabled_by_default():
+    middleware = IdempotencyKeyMiddleware()
+    view = BlockingView()
+    view.finish.set()
+
+    request, _ = call_middleware(middleware, view)
+    assert getattr(request, "idempotency_key_reserved", False) is False
+
+
+@override_settings(IDEMPOTENCY_KEY={"RESERVATION": {"ENABLE": True}})
+def test_reservation_ttl_default(mocker):
+    middleware = IdempotencyKeyMiddleware()
+    store_data = mocker.spy(middleware.storage, "store_data")
+    view = BlockingView()
+    view.finish.set()
+
+    call_middleware(middleware, view)
+    # The in-flight marker expires even though the response is kept forever
+    marker_call, response_call = store_data.call_args_list
+    assert marker_call[1]["ttl"] == 300
+    assert "ttl" not in response_call[1]
+
+
+@override_settings(IDEMPOTENCY_KEY={"RESERVATION": {"ENABLE": True, "TTL": 30}})
+def test_reservation_ttl(mocker):
+    middleware = IdempotencyKeyMiddleware()
+    store_data = mocker.spy(middleware.storage, "store_data")
+    view = BlockingView()
+    view.finish.set()
+
+    call_middleware(middleware, view)
+    marker_call, response_call = store_data.call_args_list
+    assert marker_call[0][2] == InFlight()
+    assert marker_call[1]["ttl"] == 30
+    assert "ttl" not in response_call[1]
+
+
+@override_settings(IDEMPOTENCY_KEY={"RESERVATION": {"ENABLE": True}})
+def test_reservation_skips_lock_when_storage_reserves_atomically(mocker):
+    middleware = IdempotencyKeyMiddleware()
+    acquire = mocker.spy(middleware.storage_lock, "acquire")
+    view = BlockingView()
+    view.finish.set()
+
+    _, response = call_middleware(middleware, view)
+    assert response.status_code == status.HTTP_201_CREATED
+    assert acquire.call_count == 0
+
+
+@override_settings(IDEMPOTENCY_KEY={"RESERVATION": {"ENABLE": True}})
+def test_reservation_uses_lock_when_storage_does_not_reserve_atomically(mocker):
+    middleware = IdempotencyKeyMiddleware()
+    mocker.patch.object(middleware.storage, "reserves_atomically", return_value=False)
+    acquire = mocker.spy(middleware.storage_lock, "acquire")
+    view = BlockingView()
+    view.finish.set()
+
+    call_middleware(middleware, view)
+    assert acquire.call_count == 1
+
+
+def test_lock_used_when_reservation_disabled(mocker):
+    middleware = IdempotencyKeyMiddleware()
+    acquire = mocker.spy(middleware.storage_lock, "acquire")
+    view = BlockingView()
+    view.finish.set()
+
+    call_middleware(middleware, view)
+    assert acquire.call_count == 1
+
+
+@override_settings(
+    IDEMPOTENCY_KEY={
+        "CONFLICT_STATUS_CODE": None,
+        # Polling would not finish before the view function is released
+        "RESERVATION": {"ENABLE": True, "WAIT_TIMEOUT": 5, "POLL_INTERVAL": 60},
+    }
+)
+def test_reservation_coalesces_concurrent_duplicates():
+    middleware = IdempotencyKeyMiddleware()
+    view = BlockingView()
+    thread, result = run_in_thread(middleware, view)
+    assert view.started.wait(5)
+
+    duplicates = [run_in_thread(middleware, view) for _ in range(5)]
+    time.sleep(0.1)
+    view.finish.set()
+    thread.join()
+    for duplicate_thread, duplicate_result in duplicates:
+        duplicate_thread.join(5)
+        assert duplicate_result["response"].status_code == status.HTTP_201_CREATED
+        assert duplicate_result["request"].idempotency_key_exists is True
+
+    assert view.calls == 1
+
+
+@override_settings(
+    IDEMPOTENCY_KEY={
+        "RESERVATION": {"ENABLE": True, "WAIT_TIMEOUT": 5, "POLL_INTERVAL": 60}
+    }
+)
+def test_reservation_waiters_woken_when_response_is_not_stored():
+    middleware = IdempotencyKeyMiddleware()
+    view = BlockingView(status_code=status.HTTP_400_BAD_REQUEST)
+    thread, result = run_in_thread(middleware, view)
+    assert view.started.wait(5)
+
+    threading.Timer(0.1, view.finish.set).start()
+    started = time.monotonic()
+    request, response = call_middleware(middleware, view)
+    thread.join()
+
+    assert time.monotonic() - started < 5
+    assert response.status_code == status.HTTP_409_CONFLICT
+    assert request.idempotency_key_in_flight is True
+    assert view.calls == 1
@@ -0,0 +1,175 @@
+import os
+import pickle
+
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse, JsonResponse
+from django.test import override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from idempotency_key import serializers
+from idempotency_key.storage import InFlight
+
+
+def rendered_drf_response():
+    response = Response(status=201, data={"id": 1, "name": "myvoucher0"})
+    response.accepted_renderer = JSONRenderer()
+    response.accepted_media_type = "application/json"
+    response.renderer_context = {}
+    response["Location"] = "/vouchers/1/"
+    return response.render()
+
+
+all_serializers = pytest.mark.parametrize(
+    "serializer_class",
+    [
+        serializers.PickleSerializer,
+        serializers.CompactSerializer,
+        serializers.MsgpackSerializer,
+    ],
+)
+
+
+@all_serializers
+def test_serializer_round_trip(serializer_class):
+    if serializer_class is serializers.MsgpackSerializer:
+        pytest.importorskip("msgpack")
+
+    original = rendered_drf_response()
+    obj = serializer_class()
+    response = obj.loads(obj.dumps(original))
+    assert response.status_code == 201
+    assert response.content == original.content
+    assert response["Content-Type"] == original["Content-Type"]
+    assert response["Location"] == "/vouchers/1/"
+
+
+@all_serializers
+def test_serializer_round_trip_objects(serializer_class):
+    if serializer_class is serializers.MsgpackSerializer:
+        pytest.importorskip("msgpack")
+
+    obj = serializer_class()
+    assert obj.loads(obj.dumps(InFlight())) == InFlight()
+    assert obj.loads(obj.dumps("value")) == "value"
+
+
+def test_compact_serializer_format():
+    data = serializers.CompactSerializer().dumps(JsonResponse({"key": "value"}))
+    assert data[:1] == serializers.COMPACT_FORMAT
+    assert data.endswith(b'{"key": "value"}')
+
+
+def test_compact_serializer_is_smaller_than_pickle():
+    original = rendered_drf_response()
+    compact = serializers.CompactSerializer().dumps(original)
+    assert len(compact) < len(pickle.dumps(original))
+
+
+def test_compact_serializer_objects_are_pickled():
+    assert serializers.CompactSerializer().dumps("value") == pickle.dumps("value")
+
+
+@override_settings(IDEMPOTENCY_KEY={"STORAGE": {"STORE_HEADERS": ["X-Custom"]}})
+def test_compact_serializer_stores_selected_headers_only():
+    original = HttpResponse(b"content", status=200, content_type="text/plain")
+    original["X-Custom"] = "custom"
+    original["X-Other"] = "other"
+
+    obj = serializers.CompactSerializer()
+    response = obj.loads(obj.dumps(original))
+    assert response["X-Custom"] == "custom"
+    assert not response.has_header("X-Other")
+    # Content-Type was not selected so the default content type is used
+    assert response["Content-Type"] != "text/plain"
+
+
+def test_serializers_can_load_each_others_data():
+    pytest.importorskip("msgpack")
+    original = rendered_drf_response()
+    for writer in (
+        serializers.PickleSerializer(),
+        serializers.CompactSerializer(),
+        serializers.MsgpackSerializer(),
+    ):
+        data = writer.dumps(original)
+        for reader in (serializers.PickleSerializer(), serializers.CompactSerializer()):
+            assert reader.loads(data).content == original.content
+
+
+def test_msgpack_serializer_requires_msgpack(mocker):
+    mocker.patch.object(serializers, "msgpack", None)
+    with pytest.raises(ImproperlyConfigured):
+        serializers.MsgpackSerializer()
+
+
+compression_settings = override_settings(
+    IDEMPOTENCY_KEY={"STORAGE": {"COMPRESSION": "zlib", "COMPRESSION_MIN_BYTES": 100}}
+)
+
+
+def large_response():
+    return JsonResponse(
+        [{"id": i, "name": "voucher{}".format(i)} for i in range(100)], safe=False
+    )
+
+
+@pytest.mark.parametrize(
+    "compression, package",
+    [("zlib", None), ("zstd", "zstandard"), ("lz4", "lz4.frame")],
+)
+def test_compression_round_trip(compression, package):
+    if package is not None:
+        pytest.importorskip(package)
+
+    original = large_response()
+    with override_settings(IDEMPOTENCY_KEY={"STORAGE": {"COMPRESSION": compression}}):
+        obj = serializers.CompactSerializer()
+    data = obj.dumps(original)
+    assert data[:1] == obj.codec.data_format
+    assert len(data) < len(original.content)
+
+    response = obj.loads(data)
+    assert response.content == original.content
+    assert response["Content-Type"] == "application/json"
+
+
+@compression_settings
+def test_compression_skipped_below_min_bytes():
+    obj = serializers.CompactSerializer()
+    assert obj.dumps(JsonResponse({"id": 1}))[:1] == serializers.COMPACT_FORMAT
+    assert obj.dumps(InFlight()) == pickle.dumps(InFlight())
+
+
+@compression_settings
+def test_compression_skipped_when_data_does_not_compress():
+    obj = serializers.PickleSerializer()
+    content = os.urandom(1024)
+    data = obj.dumps(HttpResponse(content))
+    assert obj.compress(content) == content
+    assert obj.loads(data).content == content
+
+
+def test_compressed_data_can_be_loaded_without_compression():
+    with compression_settings:
+        data = serializers.MsgpackSerializer().dumps(large_response())
+    assert data[:1] == serializers.ZLIB_FORMAT
+    response = serializers.CompactSerializer().loads(data)
+    assert response.content == large_response().content
+
+
+@override_settings(IDEMPOTENCY_KEY={"STORAGE": {"COMPRESSION": "brotli"}})
+def test_compression_invalid():
+    with pytest.raises(ImproperlyConfigured):
+        serializers.CompactSerializer()
+
+
+def test_compression_requires_package(mocker):
+    mocker.patch.object(serializers, "zstandard", None)
+    with override_settings(IDEMPOTENCY_KEY={"STORAGE": {"COMPRESSION": "zstd"}}):
+        with pytest.raises(ImproperlyConfigured):
+            serializers.CompactSerializer()
+
+    with pytest.raises(ImproperlyConfigured):
+        serializers.loads(serializers.ZSTD_FORMAT + b"data")
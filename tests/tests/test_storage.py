@@ -1,10 +1,21 @@
 import pickle
+import threading
+import time
 
 import pytest
 from django.core.cache import InvalidCacheBackendError, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.http import HttpResponse
 from django.test import override_settings
 
-from idempotency_key.storage import CacheKeyStorage, MemoryKeyStorage
+from idempotency_key import storage
+from idempotency_key.storage import (
+    CacheKeyStorage,
+    InFlight,
+    MemoryKeyStorage,
+    TieredKeyStorage,
+)
+from tests.tests.utils import async_to_sync, requires_async
 
 
 def test_memory_storage_store():
@@ -102,3 +113,670 @@ class TestNamedCache:
         cache = caches[cache_name]
         assert "key" in cache
         assert cache.get("key") == pickle.dumps("value")
+
+
+def test_memory_storage_retrieve_many():
+    cache_name = "default"
+    obj = MemoryKeyStorage()
+    obj.store_data(cache_name, "key1", "value1")
+    obj.store_data(cache_name, "key2", "value2")
+    assert obj.retrieve_many(cache_name, ["key1", "key2", "key3"]) == {
+        "key1": "value1",
+        "key2": "value2",
+    }
+
+
+locmem_cache_settings = override_settings(
+    CACHES={
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "0b6f8f9c-3f5e-4d1e-9f0d-2b0e4f1c6a51",
+        }
+    }
+)
+
+
+class TestCacheRetrieve:
+    @locmem_cache_settings
+    def test_cache_storage_retrieve(self):
+        obj = CacheKeyStorage()
+        obj.store_data("default", "key", "value")
+        key_exists, value = obj.retrieve_data("default", "key")
+        assert key_exists is True
+        assert value == "value"
+
+    @locmem_cache_settings
+    def test_cache_storage_retrieve_no_key(self):
+        obj = CacheKeyStorage()
+        key_exists, value = obj.retrieve_data("default", "missing")
+        assert key_exists is False
+        assert value is None
+
+    @locmem_cache_settings
+    def test_cache_storage_retrieve_uses_a_single_lookup(self, mocker):
+        obj = CacheKeyStorage()
+        obj.store_data("default", "key", "value")
+        cache = caches["default"]
+        has_key = mocker.spy(cache, "has_key")
+        get = mocker.spy(cache, "get")
+
+        assert obj.retrieve_data("default", "key") == (True, "value")
+        assert obj.retrieve_data("default", "missing") == (False, None)
+        assert has_key.call_count == 0
+        assert get.call_count == 2
+
+    @locmem_cache_settings
+    def test_cache_storage_retrieve_many(self, mocker):
+        obj = CacheKeyStorage()
+        obj.store_data("default", "key1", "value1")
+        obj.store_data("default", "key2", "value2")
+        get_many = mocker.spy(caches["default"], "get_many")
+
+        assert obj.retrieve_many("default", ["key1", "key2", "key3"]) == {
+            "key1": "value1",
+            "key2": "value2",
+        }
+        assert get_many.call_count == 1
+
+    @locmem_cache_settings
+    def test_cache_storage_delete(self):
+        obj = CacheKeyStorage()
+        obj.store_data("default", "key", "value")
+        obj.delete_data("default", "key")
+        assert obj.retrieve_data("default", "key") == (False, None)
+
+    @locmem_cache_settings
+    @requires_async
+    def test_cache_storage_async(self, mocker):
+        obj = CacheKeyStorage()
+        cache = caches["default"]
+        aget = mocker.spy(cache, "aget")
+        aset = mocker.spy(cache, "aset")
+
+        async def run():
+            await obj.astore_data("default", "key", "value", ttl=60)
+            assert await obj.aretrieve_data("default", "key") == (True, "value")
+            await obj.adelete_data("default", "key")
+            assert await obj.aretrieve_data("default", "key") == (False, None)
+
+        async_to_sync(run)()
+        assert aget.call_count == 2
+        assert aset.call_args[1]["timeout"] == 60
+
+
+@requires_async
+def test_memory_storage_async():
+    obj = MemoryKeyStorage()
+
+    async def run():
+        await obj.astore_data("default", "key", "value")
+        assert await obj.aretrieve_data("default", "key") == (True, "value")
+        await obj.adelete_data("default", "key")
+        assert await obj.aretrieve_data("default", "key") == (False, None)
+
+    async_to_sync(run)()
+
+
+@requires_async
+def test_storage_async_runs_sync_functions():
+    class SyncStorage(MemoryKeyStorage):
+        aretrieve_data = storage.IdempotencyKeyStorage.aretrieve_data
+        astore_data = storage.IdempotencyKeyStorage.astore_data
+        adelete_data = storage.IdempotencyKeyStorage.adelete_data
+
+        def store_data(self, cache_name, encoded_key, response):
+            super().store_data(cache_name, encoded_key, response)
+
+    obj = SyncStorage()
+
+    async def run():
+        # The ttl is not passed on when it is not set
+        await obj.astore_data("default", "key", "value")
+        assert await obj.aretrieve_data("default", "key") == (True, "value")
+        await obj.adelete_data("default", "key")
+        assert await obj.aretrieve_data("default", "key") == (False, None)
+
+    async_to_sync(run)()
+
+
+def test_memory_storage_reserve():
+    obj = MemoryKeyStorage()
+    assert obj.reserve_data("default", "key") == (False, None)
+    assert obj.retrieve_data("default", "key") == (True, InFlight())
+    assert obj.reserve_data("default", "key") == (True, InFlight())
+
+    obj.store_data("default", "key", "value")
+    assert obj.reserve_data("default", "key") == (True, "value")
+
+
+def test_memory_storage_wait_for_data():
+    obj = MemoryKeyStorage()
+    obj.store_data("default", "key", InFlight())
+    threading.Timer(0.05, obj.store_data, ("default", "key", "value")).start()
+    assert obj.wait_for_data("default", "key", 5) == (True, "value")
+    assert obj._conditions == {}
+
+    obj.store_data("default", "key", InFlight())
+    threading.Timer(0.05, obj.delete_data, ("default", "key")).start()
+    assert obj.wait_for_data("default", "key", 5) == (False, None)
+
+
+def test_memory_storage_wait_for_data_timeout():
+    obj = MemoryKeyStorage()
+    obj.store_data("default", "key", InFlight())
+    assert obj.wait_for_data("default", "key", 0.01) == (True, InFlight())
+    assert obj.wait_for_data("default", "other", 5) == (False, None)
+
+
+@requires_async
+def test_memory_storage_await_for_data():
+    obj = MemoryKeyStorage()
+    obj.store_data("default", "key", InFlight())
+
+    async def run():
+        threading.Timer(0.05, obj.store_data, ("default", "key", "value")).start()
+        assert await obj.await_for_data("default", "key", 5) == (True, "value")
+
+    async_to_sync(run)()
+
+
+@locmem_cache_settings
+@override_settings(IDEMPOTENCY_KEY={"RESERVATION": {"POLL_INTERVAL": 0.01}})
+@requires_async
+def test_cache_storage_wait_for_data_polls(mocker):
+    caches["default"].clear()
+    obj = CacheKeyStorage()
+    obj.store_data("default", "key", InFlight())
+    retrieve_data = mocker.spy(obj, "retrieve_data")
+    threading.Timer(0.05, obj.store_data, ("default", "key", "value")).start()
+    assert obj.wait_for_data("default", "key", 5) == (True, "value")
+    assert retrieve_data.call_count > 1
+    assert obj.wait_for_data("default", "key", 0) == (True, InFlight())
+
+    wait_for_data = mocker.spy(obj, "wait_for_data")
+
+    async def run():
+        obj.store_data("default", "key", InFlight())
+        assert await obj.await_for_data("default", "key", 0.03) == (True, InFlight())
+
+    async_to_sync(run)()
+    # The asynchronous cache API is polled instead of waiting in a thread
+    wait_for_data.assert_not_called()
+
+
+@locmem_cache_settings
+def test_cache_storage_reserve(mocker):
+    caches["default"].clear()
+    obj = CacheKeyStorage()
+    cache_add = mocker.spy(caches["default"], "add")
+    assert obj.reserve_data("default", "key", ttl=30) == (False, None)
+    assert cache_add.call_args[1]["timeout"] == 30
+    assert obj.retrieve_data("default", "key") == (True, InFlight())
+    assert obj.reserve_data("default", "key") == (True, InFlight())
+
+    obj.store_data("default", "key", "value")
+    assert obj.reserve_data("default", "key") == (True, "value")
+
+
+@locmem_cache_settings
+def test_cache_storage_reserve_key_removed_after_add(mocker):
+    caches["default"].clear()
+    obj = CacheKeyStorage()
+    # The key exists when add is called but has gone when it is read
+    mocker.patch.object(caches["default"], "add", side_effect=[False, True])
+    assert obj.reserve_data("default", "key") == (False, None)
+
+
+@locmem_cache_settings
+def test_cache_storage_reserve_cache_failing(mocker):
+    caches["default"].clear()
+    obj = CacheKeyStorage()
+    # i.e. django-redis with IGNORE_EXCEPTIONS while the server is down
+    cache_add = mocker.patch.object(caches["default"], "add", return_value=False)
+    mocker.patch.object(
+        caches["default"], "get", side_effect=lambda key, default: default
+    )
+    assert obj.reserve_data("default", "key") == (False, None)
+    assert cache_add.call_count == 2
+
+
+@locmem_cache_settings
+@requires_async
+def test_cache_storage_reserve_cache_failing_async(mocker):
+    caches["default"].clear()
+    obj = CacheKeyStorage()
+    cache_add = mocker.patch.object(caches["default"], "aadd", return_value=False)
+
+    async def aget(key, default):
+        return default
+
+    mocker.patch.object(caches["default"], "aget", side_effect=aget)
+
+    async def run():
+        assert await obj.areserve_data("default", "key") == (False, None)
+
+    async_to_sync(run)()
+    assert cache_add.call_count == 2
+
+
+@locmem_cache_settings
+@requires_async
+def test_cache_storage_reserve_async():
+    caches["default"].clear()
+    obj = CacheKeyStorage()
+
+    async def run():
+        assert await obj.areserve_data("default", "key") == (False, None)
+        assert await obj.areserve_data("default", "key") == (True, InFlight())
+
+    async_to_sync(run)()
+
+
+@override_settings(
+    CACHES={
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+        "files": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": "/tmp/idempotency_key_tests",
+        },
+        "redis": {
+            "BACKEND": "django_redis.cache.RedisCache",
+            "LOCATION": "redis://localhost:6379/1",
+        },
+    }
+)
+def test_storage_reserves_atomically():
+    obj = CacheKeyStorage()
+    assert obj.reserves_atomically("default") is True
+    assert obj.reserves_atomically("redis") is True
+    # The file based cache checks for the key and then writes it
+    assert obj.reserves_atomically("files") is False
+
+    assert MemoryKeyStorage().reserves_atomically("default") is True
+    tiered = TieredKeyStorage()
+    assert tiered.reserves_atomically("default") is True
+    assert tiered.reserves_atomically("files") is False
+
+
+@requires_async
+def test_memory_storage_reserve_async():
+    obj = MemoryKeyStorage()
+
+    async def run():
+        assert await obj.areserve_data("default", "key") == (False, None)
+        assert await obj.areserve_data("default", "key") == (True, InFlight())
+
+    async_to_sync(run)()
+
+
+@locmem_cache_settings
+def test_cache_storage_stores_compact_response():
+    obj = CacheKeyStorage()
+    obj.store_data("default", "key", HttpResponse(b"content", status=201))
+    assert caches["default"].get("key")[:1] == b"C"
+
+    key_exists, response = obj.retrieve_data("default", "key")
+    assert key_exists is True
+    assert response.status_code == 201
+    assert response.content == b"content"
+
+
+@locmem_cache_settings
+def test_cache_storage_reads_pickled_response():
+    """Responses stored before the serializer was introduced can still be read"""
+    caches["default"].set("key", pickle.dumps(HttpResponse(b"content", status=201)))
+
+    key_exists, response = CacheKeyStorage().retrieve_data("default", "key")
+    assert key_exists is True
+    assert response.status_code == 201
+    assert response.content == b"content"
+
+
+def test_memory_storage_ttl(mocker):
+    monotonic = mocker.patch.object(storage.time, "monotonic", return_value=100)
+    obj = MemoryKeyStorage()
+    obj.store_data("default", "key", "value", ttl=10)
+    obj.store_data("default", "forever", "value")
+
+    monotonic.return_value = 109
+    assert obj.retrieve_data("default", "key") == (True, "value")
+
+    monotonic.return_value = 110
+    assert obj.retrieve_data("default", "key") == (False, None)
+    assert "key" not in obj.idempotency_key_cache_data["default"]
+    assert obj.retrieve_data("default", "forever") == (True, "value")
+
+
+def test_memory_storage_store_without_ttl_removes_expiry(mocker):
+    monotonic = mocker.patch.object(storage.time, "monotonic", return_value=100)
+    obj = MemoryKeyStorage()
+    obj.store_data("default", "key", "value", ttl=10)
+    obj.store_data("default", "key", "value")
+
+    monotonic.return_value = 200
+    assert obj.retrieve_data("default", "key") == (True, "value")
+
+
+@locmem_cache_settings
+def test_cache_storage_ttl(mocker):
+    obj = CacheKeyStorage()
+    cache_set = mocker.spy(caches["default"], "set")
+    obj.store_data("default", "key", "value", ttl=10)
+    assert cache_set.call_args[1]["timeout"] == 10
+
+
+@locmem_cache_settings
+def test_cache_storage_ttl_not_set_uses_cache_default(mocker):
+    obj = CacheKeyStorage()
+    cache_set = mocker.spy(caches["default"], "set")
+    obj.store_data("default", "key", "value")
+    assert cache_set.call_args[1]["timeout"] is DEFAULT_TIMEOUT
+
+
+def test_memory_storage_max_entries_evicts_least_recently_used():
+    obj = MemoryKeyStorage(max_entries=2)
+    obj.store_data("default", "key1", "value1")
+    obj.store_data("default", "key2", "value2")
+    # Reading key1 makes key2 the least recently used entry
+    assert obj.retrieve_data("default", "key1") == (True, "value1")
+    obj.store_data("default", "key3", "value3")
+
+    assert obj.retrieve_data("default", "key2") == (False, None)
+    assert obj.retrieve_data("default", "key1") == (True, "value1")
+    assert obj.retrieve_data("default", "key3") == (True, "value3")
+    assert obj.stats("default") == {
+        "entries": 2,
+        "bytes": 0,
+        "evictions": 1,
+        "expirations": 0,
+    }
+
+
+def test_memory_storage_max_entries_keeps_in_flight_markers():
+    obj = MemoryKeyStorage(max_entries=2)
+    assert obj.reserve_data("default", "key1") == (False, None)
+    obj.store_data("default", "key2", "value2")
+    obj.store_data("default", "key3", "value3")
+
+    # The least recently used entry is a marker of a request that is still running
+    assert obj.reserve_data("default", "key1") == (True, InFlight())
+    assert obj.retrieve_data("default", "key2") == (False, None)
+    assert obj.stats("default")["evictions"] == 1
+
+    # Only markers are left to evict so the limit is exceeded until they are replaced
+    obj.store_data("default", "key4", InFlight())
+    obj.store_data("default", "key5", InFlight())
+    assert obj.stats("default")["entries"] == 3
+    assert obj.retrieve_data("default", "key1") == (True, InFlight())
+
+
+def test_memory_storage_max_entries_per_cache_name():
+    obj = MemoryKeyStorage(max_entries=1)
+    obj.store_data("default", "key", "value1")
+    obj.store_data("FiveMinuteCache", "key", "value2")
+    assert obj.retrieve_data("default", "key") == (True, "value1")
+    assert obj.retrieve_data("FiveMinuteCache", "key") == (True, "value2")
+
+
+def test_memory_storage_max_bytes():
+    obj = MemoryKeyStorage(max_bytes=10)
+    obj.store_data("default", "key1", HttpResponse(b"12345"))
+    obj.store_data("default", "key2", HttpResponse(b"12345"))
+    assert obj.stats("default")["bytes"] == 10
+
+    obj.store_data("default", "key3", HttpResponse(b"1"))
+    assert obj.retrieve_data("default", "key1") == (False, None)
+    assert obj.stats("default") == {
+        "entries": 2,
+        "bytes": 6,
+        "evictions": 1,
+        "expirations": 0,
+    }
+
+
+def test_memory_storage_max_bytes_replace_and_delete():
+    obj = MemoryKeyStorage(max_bytes=10)
+    obj.store_data("default", "key", HttpResponse(b"12345"))
+    obj.store_data("default", "key", HttpResponse(b"123"))
+    assert obj.stats("default")["bytes"] == 3
+    obj.delete_data("default", "key")
+    assert obj.stats("default")["bytes"] == 0
+    assert obj.stats("default")["entries"] == 0
+
+
+def test_memory_storage_expired_entries_removed_on_store(mocker):
+    monotonic = mocker.patch.object(storage.time, "monotonic", return_value=100)
+    obj = MemoryKeyStorage()
+    obj.store_data("default", "key1", "value1", ttl=10)
+
+    monotonic.return_value = 110
+    obj.store_data("default", "key2", "value2")
+    assert "key1" not in obj.idempotency_key_cache_data["default"]
+    assert obj.stats("default")["expirations"] == 1
+    assert obj.stats("default")["evictions"] == 0
+
+
+@override_settings(IDEMPOTENCY_KEY={"STORAGE": {"MAX_ENTRIES": 5, "MAX_BYTES": 100}})
+def test_memory_storage_limits_from_settings():
+    obj = MemoryKeyStorage()
+    assert obj.max_entries == 5
+    assert obj.max_bytes == 100
+
+
+def test_memory_storage_unbounded_by_default():
+    obj = MemoryKeyStorage()
+    assert obj.max_entries is None
+    assert obj.max_bytes is None
+    for i in range(100):
+        obj.store_data("default", "key{}".format(i), "value")
+    assert obj.stats("default")["entries"] == 100
+
+
+def test_memory_storage_get_ttl():
+    obj = MemoryKeyStorage()
+    obj.store_data("default", "key", "value", ttl=10)
+    obj.store_data("default", "forever", "value")
+    assert 9 < obj.get_ttl("default", "key") <= 10
+    assert obj.get_ttl("default", "forever") is None
+    assert obj.get_ttl("default", "missing") == 0
+
+
+def test_get_response_size():
+    assert storage.get_response_size(b"1234") == 4
+    assert storage.get_response_size(HttpResponse(b"123")) == 3
+    assert storage.get_response_size(InFlight()) > 0
+
+
+class TestTieredStorage:
+    @staticmethod
+    def tiered_storage():
+        caches["default"].clear()
+        return TieredKeyStorage()
+
+    @locmem_cache_settings
+    def test_tiered_storage_defaults(self):
+        obj = self.tiered_storage()
+        assert isinstance(obj.local, MemoryKeyStorage)
+        assert obj.local.max_entries == 1000
+        assert obj.local.max_bytes == 16 * 1024 * 1024
+        assert obj.local_ttl == 60
+        assert isinstance(obj.remote, CacheKeyStorage)
+        assert obj.negative_ttl is None
+
+    @locmem_cache_settings
+    def test_tiered_storage_write_through(self):
+        obj = self.tiered_storage()
+        obj.store_data("default", "key", "value")
+        assert obj.local.retrieve_data("default", "key") == (True, "value")
+        assert obj.remote.retrieve_data("default", "key") == (True, "value")
+
+    @locmem_cache_settings
+    def test_tiered_storage_read_through(self):
+        obj = self.tiered_storage()
+        obj.remote.store_data("default", "key", "value")
+
+        assert obj.retrieve_data("default", "key") == (True, "value")
+        assert obj.local.retrieve_data("default", "key") == (True, "value")
+        assert obj.retrieve_data("default", "key") == (True, "value")
+        assert obj.stats() == {
+            "l1_hits": 1,
+            "l1_misses": 1,
+            "l1_hit_ratio": 0.5,
+            "l2_hits": 1,
+            "l2_misses": 0,
+            "l2_hit_ratio": 1.0,
+        }
+
+    @locmem_cache_settings
+    def test_tiered_storage_miss(self):
+        obj = self.tiered_storage()
+        assert obj.retrieve_data("default", "key") == (False, None)
+        assert obj.retrieve_data("default", "key") == (False, None)
+        # Negative caching is off so every miss goes to L2
+        assert obj.stats()["l2_misses"] == 2
+        assert obj.stats()["l1_hits"] == 0
+
+    @locmem_cache_settings
+    @override_settings(IDEMPOTENCY_KEY={"STORAGE": {"TIERED": {"NEGATIVE_TTL": 5}}})
+    def test_tiered_storage_negative_caching(self):
+        obj = self.tiered_storage()
+        assert obj.retrieve_data("default", "key") == (False, None)
+        assert obj.retrieve_data("default", "key") == (False, None)
+        assert obj.stats()["l2_misses"] == 1
+        assert obj.stats()["l1_hits"] == 1
+
+        # Storing the key replaces the negative entry
+        obj.store_data("default", "key", "value")
+        assert obj.retrieve_data("default", "key") == (True, "value")
+
+    @locmem_cache_settings
+    def test_tiered_storage_in_flight_marker_not_stored_locally(self):
+        obj = self.tiered_storage()
+        obj.store_data("default", "key", "value")
+        obj.store_data("default", "key", InFlight())
+        assert obj.local.retrieve_data("default", "key") == (False, None)
+
+        assert obj.retrieve_data("default", "key") == (True, InFlight())
+        assert obj.local.retrieve_data("default", "key") == (False, None)
+
+    @locmem_cache_settings
+    @override_settings(IDEMPOTENCY_KEY={"STORAGE": {"TIERED": {"NEGATIVE_TTL": 5}}})
+    def test_tiered_storage_reserve(self):
+        obj = self.tiered_storage()
+        assert obj.retrieve_data("default", "key") == (False, None)
+
+        # The negative entry is ignored and then forgotten once the key is reserved
+        assert obj.reserve_data("default", "key") == (False, None)
+        assert obj.remote.retrieve_data("default", "key") == (True, InFlight())
+        assert obj.local.retrieve_data("default", "key") == (False, None)
+        assert obj.reserve_data("default", "key") == (True, InFlight())
+
+        # Responses found in L2 are stored locally
+        obj.remote.store_data("default", "key", "value")
+        assert obj.reserve_data("default", "key") == (True, "value")
+        assert obj.local.retrieve_data("default", "key") == (True, "value")
+
+    @locmem_cache_settings
+    @override_settings(IDEMPOTENCY_KEY={"RESERVATION": {"POLL_INTERVAL": 0.01}})
+    def test_tiered_storage_wait_for_data(self):
+        obj = self.tiered_storage()
+        obj.store_data("default", "key", InFlight())
+        threading.Timer(0.05, obj.remote.store_data, ("default", "key", "v")).start()
+        assert obj.wait_for_data("default", "key", 5) == (True, "v")
+        assert obj.local.retrieve_data("default", "key") == (True, "v")
+
+    @locmem_cache_settings
+    def test_tiered_storage_delete(self):
+        obj = self.tiered_storage()
+        obj.store_data("default", "key", "value")
+        obj.delete_data("default", "key")
+        assert obj.local.retrieve_data("default", "key") == (False, None)
+        assert obj.remote.retrieve_data("default", "key") == (False, None)
+
+    @locmem_cache_settings
+    @override_settings(IDEMPOTENCY_KEY={"STORAGE": {"TIERED": {"L1_TTL": 10}}})
+    def test_tiered_storage_local_ttl(self, mocker):
+        obj = self.tiered_storage()
+        local_store = mocker.spy(obj.local, "store_data")
+        remote_store = mocker.spy(obj.remote, "store_data")
+
+        obj.store_data("default", "key", "value", ttl=60)
+        assert local_store.call_args[1]["ttl"] == 10
+        assert remote_store.call_args[1]["ttl"] == 60
+
+        obj.store_data("default", "key", "value", ttl=5)
+        assert local_store.call_args[1]["ttl"] == 5
+
+    def test_tiered_storage_l2_expires_before_l1(self):
+        obj = TieredKeyStorage(local=MemoryKeyStorage(), remote=MemoryKeyStorage())
+        obj.remote.store_data("default", "key", "value", ttl=0.05)
+        assert obj.retrieve_data("default", "key") == (True, "value")
+        assert obj.local.retrieve_data("default", "key") == (True, "value")
+
+        # L1 does not keep the response for longer than L2
+        time.sleep(0.1)
+        assert obj.retrieve_data("default", "key") == (False, None)
+
+    @locmem_cache_settings
+    @override_settings(IDEMPOTENCY_KEY={"STORAGE": {"TTL": 5}})
+    def test_tiered_storage_local_ttl_storage_ttl(self, mocker):
+        obj = self.tiered_storage()
+        local_store = mocker.spy(obj.local, "store_data")
+        # The cache framework cannot tell when the key expires in L2
+        obj.remote.store_data("default", "key", "value", ttl=5)
+        obj.retrieve_data("default", "key")
+        assert local_store.call_args[1]["ttl"] == 5
+
+    @locmem_cache_settings
+    def test_tiered_storage_chunks_not_stored_locally(self):
+        obj = self.tiered_storage()
+        obj.store_data("default", "key:chunk:0", b"chunk")
+        assert obj.retrieve_data("default", "key:chunk:0") == (True, b"chunk")
+        assert obj.local.retrieve_data("default", "key:chunk:0") == (False, None)
+
+    @locmem_cache_settings
+    def test_tiered_storage_retrieve_many(self):
+        obj = self.tiered_storage()
+        obj.store_data("default", "key1", "value1")
+        obj.remote.store_data("default", "key2", "value2")
+        assert obj.retrieve_many("default", ["key1", "key2", "key3"]) == {
+            "key1": "value1",
+            "key2": "value2",
+        }
+        assert obj.local.retrieve_data("default", "key2") == (True, "value2")
+        stats = obj.stats()
+        assert (stats["l1_hits"], stats["l1_misses"]) == (1, 2)
+        assert (stats["l2_hits"], stats["l2_misses"]) == (1, 1)
+
+    def test_tiered_storage_custom_tiers(self):
+        local, remote = MemoryKeyStorage(), MemoryKeyStorage()
+        obj = TieredKeyStorage(local=local, remote=remote)
+        obj.store_data("default", "key", "value")
+        assert remote.retrieve_data("default", "key") == (True, "value")
+
+    @locmem_cache_settings
+    def test_tiered_storage_validation_uses_l2(self):
+        TieredKeyStorage.validate_storage("default")
+        with pytest.raises(InvalidCacheBackendError):
+            TieredKeyStorage.validate_storage("undefined_name")
+
+    @locmem_cache_settings
+    @requires_async
+    def test_tiered_storage_async(self):
+        obj = self.tiered_storage()
+
+        async def run():
+            await obj.astore_data("default", "key", "value")
+            assert obj.local.retrieve_data("default", "key") == (True, "value")
+            assert obj.remote.retrieve_data("default", "key") == (True, "value")
+
+            obj.local.delete_data("default", "key")
+            assert await obj.aretrieve_data("default", "key") == (True, "value")
+            assert obj.hits["l2"] == 1
+            assert await obj.aretrieve_data("default", "key") == (True, "value")
+            assert obj.hits["l1"] == 1
+
+            await obj.adelete_data("default", "key")
+            assert await obj.aretrieve_data("default", "key") == (False, None)
+
+        async_to_sync(run)()
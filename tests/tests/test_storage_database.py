@@ -0,0 +1,295 @@
+import contextlib
+from datetime import timedelta
+
+import pytest
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.test import override_settings
+from django.utils import timezone
+
+from idempotency_key import status
+from idempotency_key.decorators import idempotency_key_exempt
+from idempotency_key.models import IdempotencyKey
+from idempotency_key.storage import DatabaseKeyStorage, InFlight
+from tests.tests.utils import (
+    async_to_sync,
+    call_request_handler,
+    create_view,
+    requires_async,
+)
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def obj():
+    return DatabaseKeyStorage()
+
+
+def expire(obj, encoded_key, cache_name="default"):
+    IdempotencyKey.objects.filter(key=obj.make_key(cache_name, encoded_key)).update(
+        expires=timezone.now() - timedelta(seconds=1)
+    )
+
+
+def test_database_storage_store_and_retrieve(obj):
+    response = HttpResponse(b"content", status=status.HTTP_201_CREATED)
+    obj.store_data("default", "key", response)
+    key_exists, stored = obj.retrieve_data("default", "key")
+    assert key_exists is True
+    assert stored.status_code == status.HTTP_201_CREATED
+    assert stored.content == b"content"
+
+    row = IdempotencyKey.objects.get()
+    assert row.key == "default:key"
+    assert row.cache_name == "default"
+    assert row.status == IdempotencyKey.STATUS_STORED
+    assert row.expires is None
+
+
+def test_database_storage_retrieve_no_key(obj):
+    assert obj.retrieve_data("default", "key") == (False, None)
+
+
+def test_database_storage_cache_names_do_not_share_keys(obj):
+    obj.store_data("default", "key", "value")
+    assert obj.retrieve_data("other", "key") == (False, None)
+
+
+def test_database_storage_replace(obj):
+    obj.store_data("default", "key", InFlight())
+    assert obj.retrieve_data("default", "key") == (True, InFlight())
+    obj.store_data("default", "key", "value")
+    assert obj.retrieve_data("default", "key") == (True, "value")
+    assert IdempotencyKey.objects.count() == 1
+
+
+def test_database_storage_ttl(obj):
+    obj.store_data("default", "key", "value", ttl=60)
+    row = IdempotencyKey.objects.get()
+    assert row.expires - row.created == timedelta(seconds=60)
+
+    expire(obj, "key")
+    assert obj.retrieve_data("default", "key") == (False, None)
+
+
+def test_database_storage_get_ttl(obj):
+    obj.store_data("default", "key", "value", ttl=60)
+    obj.store_data("default", "forever", "value")
+    assert 59 < obj.get_ttl("default", "key") <= 60
+    assert obj.get_ttl("default", "forever") is None
+    assert obj.get_ttl("default", "missing") == 0
+
+    expire(obj, "key")
+    assert obj.get_ttl("default", "key") == 0
+
+
+def test_database_storage_retrieve_many(obj, django_assert_num_queries):
+    obj.store_data("default", "key1", "value1")
+    obj.store_data("default", "key2", InFlight())
+    obj.store_data("default", "key3", "value3")
+    expire(obj, "key3")
+    with django_assert_num_queries(1):
+        assert obj.retrieve_many("default", ["key1", "key2", "key3", "key4"]) == {
+            "key1": "value1",
+            "key2": InFlight(),
+        }
+    assert obj.retrieve_many("default", []) == {}
+
+
+def test_database_storage_delete(obj):
+    obj.store_data("default", "key", "value")
+    obj.delete_data("default", "key")
+    assert obj.retrieve_data("default", "key") == (False, None)
+
+
+def test_database_storage_reserve(obj):
+    assert obj.reserve_data("default", "key", ttl=30) == (False, None)
+    row = IdempotencyKey.objects.get()
+    assert row.status == IdempotencyKey.STATUS_IN_FLIGHT
+    assert row.expires - row.created == timedelta(seconds=30)
+
+    # The key is already reserved
+    assert obj.reserve_data("default", "key") == (True, InFlight())
+
+    obj.store_data("default", "key", "value")
+    assert obj.reserve_data("default", "key") == (True, "value")
+
+
+def test_database_storage_reserve_expired_key(obj):
+    obj.store_data("default", "key", "value", ttl=60)
+    expire(obj, "key")
+    assert obj.reserve_data("default", "key") == (False, None)
+    assert obj.retrieve_data("default", "key") == (True, InFlight())
+    assert IdempotencyKey.objects.get().expires is None
+
+
+def test_database_storage_reserve_in_transaction(obj):
+    obj.store_data("default", "key", "value")
+    with transaction.atomic():
+        # The failed insert does not break the surrounding transaction
+        assert obj.reserve_data("default", "key") == (True, "value")
+        assert obj.reserve_data("default", "other") == (False, None)
+    assert IdempotencyKey.objects.count() == 2
+
+
+def test_database_storage_delete_expired(obj):
+    obj.store_data("default", "key1", "value", ttl=60)
+    obj.store_data("default", "key2", "value")
+    obj.store_data("other", "key1", "value", ttl=60)
+    expire(obj, "key1")
+    expire(obj, "key1", cache_name="other")
+
+    assert obj.delete_expired(cache_name="other") == 1
+    assert obj.delete_expired() == 1
+    assert list(IdempotencyKey.objects.values_list("key", flat=True)) == [
+        "default:key2"
+    ]
+
+
+@requires_async
+def test_database_storage_async(obj):
+    async def run():
+        assert await obj.areserve_data("default", "key") == (False, None)
+        await obj.astore_data("default", "key", "value")
+        assert await obj.aretrieve_data("default", "key") == (True, "value")
+        await obj.adelete_data("default", "key")
+        assert await obj.aretrieve_data("default", "key") == (False, None)
+
+    async_to_sync(run)()
+
+
+@override_settings(IDEMPOTENCY_KEY={"RESERVATION": {"POLL_INTERVAL": 0.01}})
+@requires_async
+def test_database_storage_await_for_data_polls(obj, mocker):
+    obj.store_data("default", "key", InFlight())
+    wait_for_data = mocker.spy(obj, "wait_for_data")
+
+    async def run():
+        assert await obj.await_for_data("default", "key", 0.03) == (True, InFlight())
+        await obj.adelete_data("default", "key")
+        assert await obj.await_for_data("default", "key", 5) == (False, None)
+
+    async_to_sync(run)()
+    # The database is not queried from a thread of its own
+    wait_for_data.assert_not_called()
+
+
+@override_settings(IDEMPOTENCY_KEY={"STORAGE": {"DATABASE": "other"}})
+def test_database_storage_database_setting():
+    assert DatabaseKeyStorage().using == "other"
+
+
+def test_database_storage_not_atomic_by_default(obj):
+    assert isinstance(obj.atomic(), contextlib.nullcontext)
+
+
+def view(request):
+    IdempotencyKey.objects.create(key="view:write", cache_name="view")
+    return create_view(request)
+
+
+@pytest.mark.django_db(transaction=True)
+@override_settings(
+    IDEMPOTENCY_KEY={
+        "STORAGE": {
+            "CLASS": "idempotency_key.storage.DatabaseKeyStorage",
+            "ATOMIC": True,
+        },
+        "RESERVATION": {"ENABLE": True},
+    }
+)
+def test_database_storage_atomic_requests():
+    def atomic_view(request):
+        assert connection.in_atomic_block is True
+        return view(request)
+
+    response = call_request_handler(atomic_view)
+    assert response.status_code == status.HTTP_201_CREATED
+    assert connection.in_atomic_block is False
+    assert IdempotencyKey.objects.count() == 2
+    assert IdempotencyKey.objects.get(cache_name="default").status == (
+        IdempotencyKey.STATUS_STORED
+    )
+
+
+@pytest.mark.django_db(transaction=True)
+@override_settings(
+    IDEMPOTENCY_KEY={
+        "STORAGE": {
+            "CLASS": "idempotency_key.storage.DatabaseKeyStorage",
+            "ATOMIC": True,
+        },
+        "RESERVATION": {"ENABLE": True},
+    }
+)
+def test_database_storage_atomic_requests_rolled_back():
+    def failing_view(request):
+        view(request)
+        raise RuntimeError("view failed")
+
+    response = call_request_handler(failing_view)
+    assert response.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR
+
+    # The reservation is rolled back with the changes made by the view function
+    assert IdempotencyKey.objects.count() == 0
+
+
+@pytest.mark.django_db(transaction=True)
+@override_settings(
+    IDEMPOTENCY_KEY={
+        "STORAGE": {
+            "CLASS": "idempotency_key.storage.DatabaseKeyStorage",
+            "ATOMIC": True,
+        },
+    }
+)
+def test_database_storage_atomic_requests_response_not_stored():
+    def invalid_view(request):
+        view(request)
+        return HttpResponse(status=status.HTTP_400_BAD_REQUEST)
+
+    assert call_request_handler(invalid_view).status_code == status.HTTP_400_BAD_REQUEST
+    assert IdempotencyKey.objects.count() == 0
+
+
+@pytest.mark.django_db(transaction=True)
+@override_settings(
+    IDEMPOTENCY_KEY={
+        "STORAGE": {
+            "CLASS": "idempotency_key.storage.DatabaseKeyStorage",
+            "ATOMIC": True,
+            "MAX_RESPONSE_BYTES": 5,
+            "OVERSIZE": "skip",
+        },
+    }
+)
+def test_database_storage_atomic_requests_oversize_skipped():
+    def large_view(request):
+        view(request)
+        return HttpResponse(b"x" * 10, status=status.HTTP_201_CREATED)
+
+    assert call_request_handler(large_view).status_code == status.HTTP_201_CREATED
+    # The response is not stored so a retry would run the view function again
+    assert IdempotencyKey.objects.count() == 0
+
+
+@pytest.mark.django_db(transaction=True)
+@override_settings(
+    IDEMPOTENCY_KEY={
+        "STORAGE": {
+            "CLASS": "idempotency_key.storage.DatabaseKeyStorage",
+            "ATOMIC": True,
+        },
+    }
+)
+def test_database_storage_atomic_requests_exempt_not_rolled_back():
+    @idempotency_key_exempt
+    def failing_view(request):
+        view(request)
+        raise RuntimeError("view failed")
+
+    response = call_request_handler(failing_view, key=None)
+    assert response.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR
+    # Requests that do not use an idempotency key are not rolled back
+    assert IdempotencyKey.objects.filter(key="view:write").exists()
@@ -1,3 +1,7 @@
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+from django.test import override_settings
+
 from idempotency_key import status
 from idempotency_key.middleware import IdempotencyKeyMiddleware
 
@@ -21,3 +25,51 @@ def test_storage_when_locked_returns_423():
     # no key will exist in the cache
     response = obj.generate_response(request, "mykey", lock=True)
     assert response is None
+
+
+@override_settings(IDEMPOTENCY_KEY={"LOCK": {"MODE": "key"}})
+def test_storage_when_key_locked_returns_423_for_that_key_only():
+    class Request:
+        idempotency_key_manual = False
+        idempotency_key_cache_name = "default"
+
+    request = Request()
+    obj = IdempotencyKeyMiddleware()
+    assert obj.storage_lock.acquire("default:mykey") is True
+
+    response = obj.generate_response(request, "mykey", lock=True)
+    assert response.status_code == status.HTTP_423_LOCKED
+
+    # A different key uses a different lock so is not blocked
+    response = obj.generate_response(request, "otherkey", lock=True)
+    assert response is None
+
+    obj.storage_lock.release("default:mykey")
+    response = obj.generate_response(request, "mykey", lock=True)
+    assert response is None
+
+
+@override_settings(IDEMPOTENCY_KEY={"LOCK": {"MODE": "cache_name"}})
+def test_storage_when_cache_name_locked_returns_423_for_that_cache_only():
+    class Request:
+        idempotency_key_manual = False
+        idempotency_key_cache_name = "default"
+
+    request = Request()
+    obj = IdempotencyKeyMiddleware()
+    assert obj.storage_lock.acquire("default") is True
+
+    response = obj.generate_response(request, "mykey", lock=True)
+    assert response.status_code == status.HTTP_423_LOCKED
+
+    request.idempotency_key_cache_name = "FiveMinuteCache"
+    response = obj.generate_response(request, "mykey", lock=True)
+    assert response is None
+
+    obj.storage_lock.release("default")
+
+
+@override_settings(IDEMPOTENCY_KEY={"LOCK": {"MODE": "unknown"}})
+def test_invalid_lock_mode():
+    with pytest.raises(ImproperlyConfigured):
+        IdempotencyKeyMiddleware()
@@ -0,0 +1,247 @@
+import threading
+import time
+import uuid
+
+import pytest
+from django.http import HttpResponse
+from django.test import override_settings
+from django.test.client import RequestFactory
+
+from idempotency_key import status
+from idempotency_key.middleware import IdempotencyKeyMiddleware
+from idempotency_key.storage import (
+    IN_FLIGHT_MARKER,
+    STORED_MESSAGE,
+    InFlight,
+    RedisKeyStorage,
+)
+from tests.tests.utils import async_to_sync, create_view, requires_async
+
+
+@pytest.fixture
+def redis_settings():
+    # Use a different key prefix for each test so that they do not share data
+    with override_settings(
+        IDEMPOTENCY_KEY={
+            "STORAGE": {
+                "CLASS": "idempotency_key.storage.RedisKeyStorage",
+                "LOCATION": "redis://localhost:6379/1",
+                "KEY_PREFIX": "test-{}".format(uuid.uuid4()),
+            }
+        }
+    ):
+        yield
+
+
+@pytest.fixture
+def obj(redis_settings):
+    return RedisKeyStorage()
+
+
+def test_redis_storage_store_and_retrieve(obj):
+    response = HttpResponse(b"content", status=status.HTTP_201_CREATED)
+    obj.store_data("default", "key", response)
+    key_exists, stored = obj.retrieve_data("default", "key")
+    assert key_exists is True
+    assert stored.status_code == status.HTTP_201_CREATED
+    assert stored.content == b"content"
+    assert obj.redis_obj.pttl(obj.make_key("default", "key")) == -1
+
+
+def test_redis_storage_retrieve_no_key(obj):
+    assert obj.retrieve_data("default", "key") == (False, None)
+
+
+def test_redis_storage_cache_names_do_not_share_keys(obj):
+    obj.store_data("default", "key", "value")
+    assert obj.retrieve_data("other", "key") == (False, None)
+
+
+def test_redis_storage_ttl(obj):
+    obj.store_data("default", "key", "value", ttl=60)
+    assert 0 < obj.redis_obj.pttl(obj.make_key("default", "key")) <= 60000
+
+
+def test_redis_storage_get_ttl(obj):
+    obj.store_data("default", "key", "value", ttl=60)
+    obj.store_data("default", "forever", "value")
+    assert 59 < obj.get_ttl("default", "key") <= 60
+    assert obj.get_ttl("default", "forever") is None
+    assert obj.get_ttl("default", "missing") == 0
+
+
+def test_redis_storage_retrieve_many(obj, mocker):
+    obj.store_data("default", "key1", "value1")
+    obj.store_data("default", "key2", InFlight())
+    mget = mocker.spy(obj.redis_obj, "mget")
+    assert obj.retrieve_many("default", ["key1", "key2", "key3"]) == {
+        "key1": "value1",
+        "key2": InFlight(),
+    }
+    assert mget.call_count == 1
+    assert obj.retrieve_many("default", []) == {}
+
+
+def test_redis_storage_delete(obj):
+    obj.store_data("default", "key", "value")
+    obj.delete_data("default", "key")
+    assert obj.retrieve_data("default", "key") == (False, None)
+
+
+def test_redis_storage_in_flight_marker(obj):
+    obj.store_data("default", "key", InFlight())
+    assert obj.redis_obj.get(obj.make_key("default", "key")) == IN_FLIGHT_MARKER
+    assert obj.retrieve_data("default", "key") == (True, InFlight())
+
+
+def test_redis_storage_reserve(obj):
+    assert obj.reserve_data("default", "key", ttl=30) == (False, None)
+    assert obj.retrieve_data("default", "key") == (True, InFlight())
+    assert 0 < obj.redis_obj.pttl(obj.make_key("default", "key")) <= 30000
+
+    # The key is already reserved
+    assert obj.reserve_data("default", "key", ttl=30) == (True, InFlight())
+
+    # Storing the response replaces the marker and its TTL
+    obj.store_data("default", "key", "value")
+    assert obj.reserve_data("default", "key") == (True, "value")
+    assert obj.redis_obj.pttl(obj.make_key("default", "key")) == -1
+
+
+def test_redis_storage_reserve_without_ttl(obj):
+    assert obj.reserve_data("default", "key") == (False, None)
+    assert obj.redis_obj.pttl(obj.make_key("default", "key")) == -1
+
+
+def test_redis_storage_reserve_single_round_trip(obj, mocker):
+    # Load the script so that only the call itself is counted
+    obj.reserve_data("default", "other")
+    execute_command = mocker.spy(obj.redis_obj, "execute_command")
+    obj.reserve_data("default", "key")
+    obj.reserve_data("default", "key")
+    assert execute_command.call_count == 2
+
+
+def test_redis_storage_wait_for_data(obj):
+    obj.store_data("default", "key", InFlight())
+    threading.Timer(0.05, obj.store_data, ("default", "key", "value")).start()
+    assert obj.wait_for_data("default", "key", 5) == (True, "value")
+
+    obj.store_data("default", "key", InFlight())
+    threading.Timer(0.05, obj.delete_data, ("default", "key")).start()
+    assert obj.wait_for_data("default", "key", 5) == (False, None)
+
+
+def test_redis_storage_store_data_publishes_notification(obj):
+    pubsub = obj.redis_obj.pubsub()
+    pubsub.subscribe(obj.make_key("default", "key"))
+    try:
+        assert pubsub.get_message(timeout=5)["type"] == "subscribe"
+        obj.store_data("default", "key", "x" * 1000)
+        # Only a notification is published, not the response
+        assert pubsub.get_message(timeout=5)["data"] == STORED_MESSAGE
+    finally:
+        pubsub.close()
+
+
+def test_redis_storage_waiting_requests_do_not_use_shared_pool():
+    settings = {
+        "STORAGE": {
+            "CLASS": "idempotency_key.storage.RedisKeyStorage",
+            "LOCATION": "redis://localhost:6379/1",
+            "KEY_PREFIX": "test-{}".format(uuid.uuid4()),
+        },
+        "REDIS": {"MAX_CONNECTIONS": 2, "POOL_TIMEOUT": 1},
+    }
+    with override_settings(IDEMPOTENCY_KEY=settings):
+        obj = RedisKeyStorage()
+        obj.store_data("default", "key", InFlight())
+        results = []
+
+        def wait():
+            results.append(obj.wait_for_data("default", "key", 5))
+
+        threads = [threading.Thread(target=wait) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.2)
+
+        # More requests are waiting than the shared pool has connections
+        obj.store_data("default", "key", "value")
+        for thread in threads:
+            thread.join()
+        assert results == [(True, "value")] * 4
+
+
+def test_redis_storage_wait_for_data_timeout(obj):
+    obj.store_data("default", "key", InFlight())
+    assert obj.wait_for_data("default", "key", 0.05) == (True, InFlight())
+    assert obj.wait_for_data("default", "other", 5) == (False, None)
+
+    obj.store_data("default", "key", "value")
+    assert obj.wait_for_data("default", "key", 5) == (True, "value")
+
+
+@requires_async
+def test_redis_storage_await_for_data(obj):
+    obj.store_data("default", "key", InFlight())
+
+    async def run():
+        threading.Timer(0.05, obj.store_data, ("default", "key", "value")).start()
+        assert await obj.await_for_data("default", "key", 5) == (True, "value")
+
+    async_to_sync(run)()
+
+
+@override_settings(IDEMPOTENCY_KEY={"STORAGE": {"LOCATION": ""}})
+def test_redis_storage_location_must_be_set():
+    with pytest.raises(ValueError):
+        RedisKeyStorage()
+
+
+@override_settings(IDEMPOTENCY_KEY={"LOCK": {"LOCATION": "redis://lockhost:6379/2"}})
+def test_redis_storage_location_defaults_to_lock_location():
+    obj = RedisKeyStorage()
+    kwargs = obj.redis_obj.connection_pool.connection_kwargs
+    assert kwargs["host"] == "lockhost"
+    assert kwargs["db"] == 2
+
+
+def redis_reservation_settings():
+    return override_settings(
+        IDEMPOTENCY_KEY={
+            "STORAGE": {
+                "CLASS": "idempotency_key.storage.RedisKeyStorage",
+                "LOCATION": "redis://localhost:6379/1",
+                "KEY_PREFIX": "test-{}".format(uuid.uuid4()),
+            },
+            "RESERVATION": {"ENABLE": True},
+        }
+    )
+
+
+def make_request(middleware):
+    request = RequestFactory().post("/views/create/", HTTP_IDEMPOTENCY_KEY="key")
+    middleware.process_request(request)
+    return request
+
+
+def test_redis_storage_middleware_reservation():
+    with redis_reservation_settings():
+        middleware = IdempotencyKeyMiddleware()
+        request = make_request(middleware)
+        assert middleware.process_view(request, create_view, (), {}) is None
+        assert request.idempotency_key_reserved is True
+
+        # A concurrent request with the same key finds the in-flight marker
+        request2 = make_request(middleware)
+        response = middleware.process_view(request2, create_view, (), {})
+        assert response.status_code == status.HTTP_409_CONFLICT
+        assert request2.idempotency_key_in_flight is True
+
+        middleware.process_response(request, create_view(request))
+        key_exists, stored = middleware.storage.retrieve_data(
+            "default", request.idempotency_key_encoded_key
+        )
+        assert key_exists is True
+        assert stored.status_code == status.HTTP_201_CREATED
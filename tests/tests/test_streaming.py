@@ -0,0 +1,260 @@
+import io
+
+import pytest
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.test import override_settings
+
+from idempotency_key import metrics, status
+from idempotency_key.decorators import idempotency_key_manual
+from idempotency_key.exceptions import ChunkExpiredError
+from idempotency_key.middleware import IdempotencyKeyMiddleware
+from idempotency_key.storage import ChunkedResponse, ProcessedResponse
+from tests.tests.utils import (
+    StreamingView,
+    acall_middleware,
+    async_get_response,
+    async_to_sync,
+    call_middleware,
+    requires_async,
+)
+
+# Closing a response sends the request_finished signal which closes old database
+# connections.
+pytestmark = pytest.mark.django_db
+
+parts = [b"a" * 10, b"b" * 10, b"c" * 10, b"d" * 5]
+content = b"".join(parts)
+
+stream_settings = override_settings(
+    IDEMPOTENCY_KEY={
+        "STORAGE": {"STREAM_CHUNK_BYTES": 16},
+        "METRICS_CLASS": "idempotency_key.metrics.InMemoryMetrics",
+    }
+)
+
+
+def send(response):
+    """
+    Consume the response as a WSGI server does.
+    """
+    try:
+        return b"".join(response)
+    finally:
+        response.close()
+
+
+def stored_keys(middleware):
+    return set(middleware.storage.idempotency_key_cache_data["default"])
+
+
+@stream_settings
+def test_streaming_response_stored_in_chunks():
+    middleware = IdempotencyKeyMiddleware()
+    view = StreamingView(parts)
+    request, response = call_middleware(middleware, view)
+    encoded_key = request.idempotency_key_encoded_key
+    # Nothing is stored until the response has been sent
+    assert stored_keys(middleware) == set()
+    assert send(response) == content
+
+    key_exists, manifest = middleware.storage.retrieve_data("default", encoded_key)
+    assert key_exists
+    assert isinstance(manifest, ChunkedResponse)
+    assert manifest.streaming
+    assert manifest.chunk_count == 3
+    chunk_keys = manifest.get_chunk_keys(encoded_key)
+    assert stored_keys(middleware) == {encoded_key, *chunk_keys}
+    assert middleware.metrics.get_values(metrics.STORED_RESPONSE_BYTES) == [35]
+
+    request, response = call_middleware(middleware, view)
+    assert view.calls == 1
+    assert request.idempotency_key_exists
+    assert response.streaming
+    assert response.status_code == status.HTTP_409_CONFLICT
+    assert response["Content-Type"] == "text/csv"
+    assert send(response) == content
+
+
+@stream_settings
+def test_streaming_response_client_disconnected():
+    middleware = IdempotencyKeyMiddleware()
+    view = StreamingView(parts)
+    request, response = call_middleware(middleware, view)
+    iterator = iter(response)
+    assert next(iterator) + next(iterator) == content[:20]
+    assert len(stored_keys(middleware)) == 1
+    response.close()
+
+    # The chunks are deleted and the view function is run again
+    assert stored_keys(middleware) == set()
+    call_middleware(middleware, view)
+    assert view.calls == 2
+
+
+@override_settings(
+    IDEMPOTENCY_KEY={
+        "CONFLICT_STATUS_CODE": None,
+        "STORAGE": {"STREAM_CHUNK_BYTES": 16},
+    }
+)
+def test_streaming_response_replay_not_stored_again():
+    middleware = IdempotencyKeyMiddleware()
+    view = StreamingView(parts)
+    send(call_middleware(middleware, view)[1])
+    keys = stored_keys(middleware)
+    assert len(keys) == 4
+
+    for _ in range(3):
+        response = call_middleware(middleware, view)[1]
+        assert response.status_code == status.HTTP_201_CREATED
+        assert send(response) == content
+        assert stored_keys(middleware) == keys
+
+
+def test_manual_view_new_response_stored_again():
+    @idempotency_key_manual
+    def view(request):
+        content = b"second" if request.idempotency_key_exists else b"first"
+        return HttpResponse(content, status=status.HTTP_201_CREATED)
+
+    middleware = IdempotencyKeyMiddleware()
+    call_middleware(middleware, view)
+    request, response = call_middleware(middleware, view)
+    assert request.idempotency_key_exists
+    assert response.content == b"second"
+
+    # Only the response replayed by the middleware is not stored again
+    _, stored = middleware.storage.retrieve_data(
+        "default", request.idempotency_key_encoded_key
+    )
+    assert stored.content == b"second"
+
+
+@override_settings(
+    IDEMPOTENCY_KEY={
+        "STORAGE": {"STREAM_CHUNK_BYTES": 16},
+        "RESERVATION": {"ENABLE": True},
+    }
+)
+def test_streaming_response_failed():
+    middleware = IdempotencyKeyMiddleware()
+    request, response = call_middleware(middleware, StreamingView(parts, fail_after=3))
+    # The in-flight marker is kept until the stream has ended
+    assert not request.idempotency_key_reserved
+    assert len(stored_keys(middleware)) == 1
+    with pytest.raises(ValueError):
+        send(response)
+    assert stored_keys(middleware) == set()
+
+
+@override_settings(
+    IDEMPOTENCY_KEY={
+        "STORAGE": {"STREAM_CHUNK_BYTES": 16},
+        "RESERVATION": {"ENABLE": True},
+    }
+)
+def test_streaming_response_replaces_reservation():
+    middleware = IdempotencyKeyMiddleware()
+    view = StreamingView(parts)
+    _, response = call_middleware(middleware, view)
+    # A concurrent request is told that the first request is still in flight
+    assert call_middleware(middleware, view)[1].status_code == status.HTTP_409_CONFLICT
+    send(response)
+    assert send(call_middleware(middleware, view)[1]) == content
+    assert view.calls == 1
+
+
+@stream_settings
+def test_file_response_stored():
+    def view(request):
+        response = FileResponse(
+            io.BytesIO(content), as_attachment=True, filename="export.csv"
+        )
+        response.block_size = 8
+        return response
+
+    middleware = IdempotencyKeyMiddleware()
+    send(call_middleware(middleware, view)[1])
+    response = call_middleware(middleware, view)[1]
+    assert send(response) == content
+    assert response["Content-Disposition"] == 'attachment; filename="export.csv"'
+
+
+@pytest.mark.parametrize("oversize", ["skip", "marker", "chunk"])
+def test_streaming_response_oversize(oversize):
+    storage = {"STREAM_CHUNK_BYTES": 16, "MAX_RESPONSE_BYTES": 20, "OVERSIZE": oversize}
+    with override_settings(IDEMPOTENCY_KEY={"STORAGE": storage}):
+        middleware = IdempotencyKeyMiddleware()
+        view = StreamingView(parts)
+        request, response = call_middleware(middleware, view)
+        assert send(response) == content
+
+        key_exists, data = middleware.storage.retrieve_data(
+            "default", request.idempotency_key_encoded_key
+        )
+        if oversize == "skip":
+            assert not key_exists
+            assert stored_keys(middleware) == set()
+        elif oversize == "marker":
+            assert data == ProcessedResponse.from_response(
+                HttpResponse(content, status=201)
+            )
+            assert stored_keys(middleware) == {request.idempotency_key_encoded_key}
+        else:
+            assert data.chunk_count == 3
+
+
+@stream_settings
+def test_streaming_response_chunk_expired():
+    middleware = IdempotencyKeyMiddleware()
+    view = StreamingView(parts)
+    request, response = call_middleware(middleware, view)
+    send(response)
+    encoded_key = request.idempotency_key_encoded_key
+    manifest = middleware.storage.retrieve_data("default", encoded_key)[1]
+    chunk_keys = manifest.get_chunk_keys(encoded_key)
+
+    # Part of the response has been sent when the chunk is found to be missing
+    middleware.storage.delete_data("default", chunk_keys[1])
+    response = call_middleware(middleware, view)[1]
+    with pytest.raises(ChunkExpiredError):
+        send(response)
+    assert not middleware.storage.retrieve_data("default", encoded_key)[0]
+
+    # The first chunk is retrieved before the response is replayed
+    send(call_middleware(middleware, view)[1])
+    manifest = middleware.storage.retrieve_data("default", encoded_key)[1]
+    middleware.storage.delete_data("default", manifest.get_chunk_keys(encoded_key)[0])
+    request, response = call_middleware(middleware, view)
+    assert not request.idempotency_key_exists
+    assert view.calls == 3
+
+
+@stream_settings
+@requires_async
+def test_streaming_response_async():
+    async def aiter_parts():
+        for part in parts:
+            yield part
+
+    calls = []
+
+    def view(request):
+        calls.append(request)
+        return StreamingHttpResponse(aiter_parts(), status=status.HTTP_201_CREATED)
+
+    async def asend(response):
+        received = [part async for part in response.streaming_content]
+        response.close()
+        return b"".join(received)
+
+    async def run():
+        middleware = IdempotencyKeyMiddleware(async_get_response)
+        assert await asend((await acall_middleware(middleware, view))[1]) == content
+
+        response = (await acall_middleware(middleware, view))[1]
+        assert response.is_async
+        assert await asend(response) == content
+        assert len(calls) == 1
+
+    async_to_sync(run)()
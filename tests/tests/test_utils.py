@@ -1,7 +1,11 @@
+import dataclasses
+
+import pytest
 from django.test import override_settings
 
 from idempotency_key import status, storage, utils
-from idempotency_key.locks.basic import ThreadLock
+from idempotency_key.locks import redis
+from idempotency_key.locks.basic import AsyncioLock, SyncToAsyncLock, ThreadLock
 
 
 class Request(object):
@@ -62,6 +66,16 @@ def test_get_store_on_statuses_not_specified():
     ]
 
 
+@override_settings(IDEMPOTENCY_KEY={})
+def test_get_storage_ttl_default():
+    assert utils.get_storage_ttl() is None
+
+
+@override_settings(IDEMPOTENCY_KEY={"STORAGE": {"TTL": 60}})
+def test_get_storage_ttl():
+    assert utils.get_storage_ttl() == 60
+
+
 @override_settings(IDEMPOTENCY_KEY={})
 def test_get_lock_class_default():
     assert utils.get_lock_class() is ThreadLock
@@ -81,6 +95,36 @@ def test_get_lock_class_default_cache_storage():
     assert utils.get_lock_class() is storage.CacheKeyStorage
 
 
+@override_settings(IDEMPOTENCY_KEY={})
+def test_get_async_lock_class_default():
+    assert utils.get_async_lock_class() is AsyncioLock
+
+
+@override_settings(
+    IDEMPOTENCY_KEY={
+        "LOCK": {"CLASS": "idempotency_key.locks.redis.MultiProcessRedisLock"}
+    }
+)
+def test_get_async_lock_class_matches_lock_class():
+    assert utils.get_async_lock_class() is redis.AsyncMultiProcessRedisLock
+
+
+@override_settings(
+    IDEMPOTENCY_KEY={"LOCK": {"CLASS": "idempotency_key.storage.MemoryKeyStorage"}}
+)
+def test_get_async_lock_class_without_async_class():
+    assert utils.get_async_lock_class() is SyncToAsyncLock
+
+
+@override_settings(
+    IDEMPOTENCY_KEY={
+        "LOCK": {"ASYNC_CLASS": "idempotency_key.locks.basic.SyncToAsyncLock"}
+    }
+)
+def test_get_async_lock_class():
+    assert utils.get_async_lock_class() is SyncToAsyncLock
+
+
 @override_settings(IDEMPOTENCY_KEY={})
 def test_get_lock_timeout_default():
     assert utils.get_lock_timeout() == 0.1
@@ -101,6 +145,16 @@ def test_get_lock_enable_default_with_lock():
     assert utils.get_lock_enable() is False
 
 
+@override_settings(IDEMPOTENCY_KEY={})
+def test_get_lock_mode_default():
+    assert utils.get_lock_mode() == utils.LOCK_MODE_GLOBAL
+
+
+@override_settings(IDEMPOTENCY_KEY={"LOCK": {"MODE": "key"}})
+def test_get_lock_mode_with_lock():
+    assert utils.get_lock_mode() == utils.LOCK_MODE_KEY
+
+
 @override_settings(IDEMPOTENCY_KEY={})
 def test_get_lock_ttl_default():
     assert utils.get_lock_time_to_live() == 300
@@ -145,3 +199,52 @@ def test_get_default_header_name():
 @override_settings(IDEMPOTENCY_KEY={"HEADER": "HTTP_X_IDEMPOTENCY_KEY"})
 def test_get_custom_header_name_with_header():
     assert utils.get_header_name() == "HTTP_X_IDEMPOTENCY_KEY"
+
+
+@override_settings(IDEMPOTENCY_KEY={})
+def test_get_settings_default():
+    conf = utils.get_settings()
+    assert conf.header_name == "HTTP_IDEMPOTENCY_KEY"
+    assert conf.conflict_code == status.HTTP_409_CONFLICT
+    assert conf.storage_cache_name == "default"
+    assert conf.storage_store_on_statuses == frozenset(
+        utils.get_storage_store_on_statuses()
+    )
+    assert isinstance(conf.storage_store_on_statuses, frozenset)
+    assert conf.storage_store_headers == tuple(utils.get_storage_store_headers())
+    assert conf.lock_enable is True
+    assert conf.lock_ttl == 300
+    assert conf.lock_mode == utils.LOCK_MODE_GLOBAL
+    assert conf.reservation_enable is False
+
+
+@override_settings(IDEMPOTENCY_KEY={})
+def test_get_settings_is_built_once(mocker):
+    utils.reload_settings(setting="IDEMPOTENCY_KEY")
+    from_settings = mocker.spy(utils.IdempotencyKeySettings, "from_settings")
+    conf = utils.get_settings()
+    assert utils.get_settings() is conf
+    assert from_settings.call_count == 1
+
+
+def test_get_settings_reloaded_when_setting_changes():
+    with override_settings(IDEMPOTENCY_KEY={"HEADER": "HTTP_X_IDEMPOTENCY_KEY"}):
+        assert utils.get_settings().header_name == "HTTP_X_IDEMPOTENCY_KEY"
+        with override_settings(
+            IDEMPOTENCY_KEY={"STORAGE": {"STORE_ON_STATUSES": [status.HTTP_200_OK]}}
+        ):
+            conf = utils.get_settings()
+            assert conf.header_name == "HTTP_IDEMPOTENCY_KEY"
+            assert conf.storage_store_on_statuses == frozenset([status.HTTP_200_OK])
+        assert utils.get_settings().header_name == "HTTP_X_IDEMPOTENCY_KEY"
+
+
+def test_get_settings_not_reloaded_for_other_settings():
+    conf = utils.get_settings()
+    with override_settings(DEBUG=False):
+        assert utils.get_settings() is conf
+
+
+def test_get_settings_immutable():
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        utils.get_settings().lock_enable = False
@@ -1,6 +1,190 @@
+import asyncio
+import inspect
+import threading
 from functools import wraps
 
+import django
+import pytest
+from django.core.handlers.exception import convert_exception_to_response
+from django.http import HttpResponse, StreamingHttpResponse
 from django.test import modify_settings
+from django.test.client import RequestFactory
+
+from idempotency_key import status
+from idempotency_key.middleware import IdempotencyKeyMiddleware
+
+try:
+    from asgiref.sync import async_to_sync
+except ImportError:  # pragma: no cover - asgiref is not a dependency of Django < 3.0
+    async_to_sync = None
+
+# Marks the tests that run the asynchronous code. They need asgiref and django 4.0 or
+# later for the asynchronous cache API and AsyncClient.
+requires_async = pytest.mark.skipif(
+    async_to_sync is None or django.VERSION < (4, 0),
+    reason="requires asgiref and django 4.0 or later",
+)
+
+
+async def aclose_redis(client):
+    """
+    Close an asynchronous redis client. aclose() was added in redis-py 5.0.1 and
+    close() is deprecated since.
+    """
+    aclose = getattr(client, "aclose", None)
+    if aclose is None:
+        await client.close()
+    else:
+        await aclose()
+
+
+the_key = "7495e32b-709b-4fae-bfd4-2497094bf3fd"
+
+
+def _post(key):
+    headers = {} if key is None else {"HTTP_IDEMPOTENCY_KEY": key}
+    return RequestFactory().post("/views/create/", {}, **headers)
+
+
+def call_middleware(middleware, view, key=the_key):
+    """
+    Run a request through the middleware in the same order that the django request
+    handler would. The idempotency key header is not sent if key is None.
+    :return: the request and the response
+    """
+    request = _post(key)
+    middleware.process_request(request)
+    response = middleware.process_view(request, view, (), {})
+    if response is None:
+        response = view(request)
+    return request, middleware.process_response(request, response)
+
+
+def call_request_handler(view, key=the_key):
+    """
+    Run a request through a new middleware the way the django request handler would,
+    exceptions raised by the view function are turned into error responses.
+    :return: the response
+    """
+
+    def handler(request):
+        # django's request handler calls process_view before the view function
+        return middleware.process_view(request, view, (), {}) or view(request)
+
+    middleware = IdempotencyKeyMiddleware(convert_exception_to_response(handler))
+    return middleware(_post(key))
+
+
+async def acall_middleware(middleware, view, key=the_key):
+    """
+    Asynchronous version of call_middleware. The view function can be synchronous or
+    asynchronous.
+    """
+    request = _post(key)
+    middleware.process_request(request)
+    response = await middleware.process_view(request, view, (), {})
+    if response is None:
+        response = view(request)
+        if inspect.isawaitable(response):
+            response = await response
+    return request, await middleware.aprocess_response(request, response)
+
+
+async def async_get_response(request):
+    """
+    Makes the middleware run asynchronously.
+    """
+    return HttpResponse(status=status.HTTP_201_CREATED)
+
+
+def create_view(request):
+    return HttpResponse(b"created", status=status.HTTP_201_CREATED)
+
+
+class CountingView:
+    """
+    View function that counts the number of times it is called.
+    """
+
+    __name__ = "counting_view"
+
+    def __init__(self, body=b"created"):
+        self.body = body
+        self.calls = 0
+
+    def __call__(self, request):
+        self.calls += 1
+        response = HttpResponse(self.body, status=status.HTTP_201_CREATED)
+        response["Content-Type"] = "application/json"
+        return response
+
+
+class BlockingView:
+    """
+    View function that blocks until it is released so that concurrent requests can be
+    made while it is running.
+    """
+
+    __name__ = "blocking_view"
+
+    def __init__(self, status_code=status.HTTP_201_CREATED):
+        self.status_code = status_code
+        self.started = threading.Event()
+        self.finish = threading.Event()
+        self.calls = 0
+
+    def __call__(self, request):
+        self.calls += 1
+        self.started.set()
+        self.finish.wait(5)
+        return HttpResponse(status=self.status_code)
+
+
+class AsyncBlockingView:
+    """
+    Asynchronous version of BlockingView.
+    """
+
+    __name__ = "blocking_view"
+
+    def __init__(self):
+        self.started = asyncio.Event()
+        self.finish = asyncio.Event()
+        self.calls = 0
+
+    async def __call__(self, request):
+        self.calls += 1
+        self.started.set()
+        await self.finish.wait()
+        return HttpResponse(status=status.HTTP_201_CREATED)
+
+
+class StreamingView:
+    """
+    View function that streams the parts given, the stream fails with a ValueError
+    before the part at index fail_after is sent.
+    """
+
+    __name__ = "streaming_view"
+
+    def __init__(self, parts, fail_after=None):
+        self.parts = parts
+        self.fail_after = fail_after
+        self.calls = 0
+
+    def iter_parts(self):
+        for i, part in enumerate(self.parts):
+            if i == self.fail_after:
+                raise ValueError("The stream failed")
+            yield part
+
+    def __call__(self, request):
+        self.calls += 1
+        response = StreamingHttpResponse(
+            self.iter_parts(), status=status.HTTP_201_CREATED
+        )
+        response["Content-Type"] = "text/csv"
+        return response
 
 
 def for_all_methods(decorator):
@@ -33,7 +33,11 @@ urlpatterns = [
     path(r"views/create-manual-exempt-1/", views.create_manual_exempt_1),
     path(r"views/create-manual-exempt-2/", views.create_manual_exempt_2),
     path(r"views/create-with-my-cache/", views.create_with_my_cache),
+    path(r"views/create-with-ttl/", views.create_with_ttl),
     path(r"views/create-custom-header/", views.create_custom_header),
+    path(r"views/create-async/", views.create_async),
+    path(r"views/create-exempt-async/", views.create_exempt_async),
+    path(r"views/create-manual-async/", views.create_manual_async),
     path(r"viewsets/get/", MyViewSet.as_view({"get": "get"})),
     path(r"viewsets/create/", MyViewSet.as_view({"post": "create"})),
     path(
@@ -67,6 +71,10 @@ urlpatterns = [
         r"viewsets/create-with-my-cache/",
         MyViewSet.as_view({"post": "create_with_my_cache"}),
     ),
+    path(
+        r"viewsets/create-with-ttl/",
+        MyViewSet.as_view({"post": "create_with_ttl"}),
+    ),
     path(
         r"viewsets/create-nested-decorator/",
         MyViewSet2.as_view({"post": "create"}),
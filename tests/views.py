@@ -1,3 +1,4 @@
+from django.http import JsonResponse
 from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
@@ -86,7 +87,35 @@ def create_with_my_cache(request, *args, **kwargs):
     return Response(status=201, data={})
 
 
+@idempotency_key(ttl=60)
+@api_view(["POST"])
+def create_with_ttl(request, *args, **kwargs):
+    return Response(status=201, data={})
+
+
 @idempotency_key
 @api_view(["POST"])
 def create_custom_header(request, *args, **kwargs):
     return Response(status=201, data={})
+
+
+@idempotency_key
+async def create_async(request, *args, **kwargs):
+    return JsonResponse({}, status=status.HTTP_201_CREATED)
+
+
+@idempotency_key_exempt
+async def create_exempt_async(request, *args, **kwargs):
+    return JsonResponse(
+        {"idempotency_key_exempt": request.idempotency_key_exempt},
+        status=status.HTTP_201_CREATED,
+    )
+
+
+@idempotency_key_manual
+async def create_manual_async(request, *args, **kwargs):
+    if idempotency_key_exists(request):
+        response = request.idempotency_key_response
+        response.status_code = status.HTTP_200_OK
+        return response
+    return JsonResponse({}, status=status.HTTP_201_CREATED)
@@ -74,6 +74,10 @@ class MyViewSet(ViewSet):
     def create_with_my_cache(self, request, *args, **kwargs):
         return Response(status=201, data={})
 
+    @idempotency_key(ttl=60)
+    def create_with_ttl(self, request, *args, **kwargs):
+        return Response(status=201, data={})
+
 
 class MyModelViewSet(ViewSet):
     def create(self, request, *args, **kwargs):